@@ -6,20 +6,20 @@ from app.schemas.ai import AnswerSuggestion
 SUPPORT_SITE_URL = "https://kazaktele.com/"
 
 
-def generate_answer(
-    ticket_text: str,
-    language: str = "ru",
-    faq_snippet: str | None = None,
-    request_type: str | None = None,
-) -> AnswerSuggestion:
-    client = get_client()
-    if client is None:
-        # Простейший фолбэк
-        return AnswerSuggestion(
-            answer="Ваше обращение зарегистрировано. Специалист свяжется с вами в ближайшее время.",
-            answer_language=language,
-        )
+def _fallback_answer(language: str) -> AnswerSuggestion:
+    # Простейший фолбэк
+    return AnswerSuggestion(
+        answer="Ваше обращение зарегистрировано. Специалист свяжется с вами в ближайшее время.",
+        answer_language=language,
+    )
+
 
+def _build_messages(
+    ticket_text: str,
+    language: str,
+    faq_snippet: str | None,
+    request_type: str | None,
+) -> list[dict[str, str]]:
     if language == "ru":
         lang_instruction = (
             "Пиши ответ строго на русском языке. "
@@ -108,9 +108,37 @@ def generate_answer(
     if faq_snippet:
         user_content += f"\nПодсказка из базы знаний:\n{faq_snippet}\n"
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_content},
     ]
+
+
+def generate_answer(
+    ticket_text: str,
+    language: str = "ru",
+    faq_snippet: str | None = None,
+    request_type: str | None = None,
+) -> AnswerSuggestion:
+    client = get_client()
+    if client is None:
+        return _fallback_answer(language)
+
+    messages = _build_messages(ticket_text, language, faq_snippet, request_type)
     answer_text = client.chat(messages, temperature=0.1)
     return AnswerSuggestion(answer=answer_text.strip(), answer_language=language)
+
+
+async def generate_answer_async(
+    ticket_text: str,
+    language: str = "ru",
+    faq_snippet: str | None = None,
+    request_type: str | None = None,
+) -> AnswerSuggestion:
+    client = get_client()
+    if client is None:
+        return _fallback_answer(language)
+
+    messages = _build_messages(ticket_text, language, faq_snippet, request_type)
+    answer_text = await client.chat_async(messages, temperature=0.1)
+    return AnswerSuggestion(answer=answer_text.strip(), answer_language=language)
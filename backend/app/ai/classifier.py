@@ -1,30 +1,25 @@
 from __future__ import annotations
 
+import time
 from typing import Optional
 
 from app.ai.deepseek_client import get_client
 from app.schemas.ai import ClassificationResult
 
 
-def classify_text(text: str, request_type: str | None = None) -> ClassificationResult:
-    """Классификация тикета.
+def _fallback_classification() -> ClassificationResult:
+    # Простейшая эвристика: всё идёт в IT-SERVICE, приоритет P3
+    return ClassificationResult(
+        category_code="GENERAL",
+        department_code="IT-SERVICE",
+        priority="P3",
+        language="ru",
+        auto_resolvable=False,
+        confidence=0.5,
+    )
 
-    Если DeepSeek недоступен или ключ не указан, используем простую
-    эвристику, чтобы сервис оставался рабочим.
-    """
-
-    client = get_client()
-    if client is None:
-        # Простейшая эвристика: всё идёт в IT-SERVICE, приоритет P3
-        return ClassificationResult(
-            category_code="GENERAL",
-            department_code="IT-SERVICE",
-            priority="P3",
-            language="ru",
-            auto_resolvable=False,
-            confidence=0.5,
-        )
 
+def _build_messages(text: str, request_type: str | None) -> list[dict[str, str]]:
     base_prompt = (
         "Ты ИИ-ассистент для маршрутизации заявок в службу поддержки. "
         "По входному тексту определи: код категории, код департамента, "
@@ -60,10 +55,40 @@ def classify_text(text: str, request_type: str | None = None) -> ClassificationR
 
     system_prompt = base_prompt
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": text},
     ]
 
-    data = client.chat_json(messages)
-    return ClassificationResult(**data)
+
+def _with_latency(result: ClassificationResult, started: float) -> ClassificationResult:
+    result.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def classify_text(text: str, request_type: str | None = None) -> ClassificationResult:
+    """Классификация тикета.
+
+    Если DeepSeek недоступен или ключ не указан, используем простую
+    эвристику, чтобы сервис оставался рабочим.
+    """
+
+    client = get_client()
+    if client is None:
+        return _fallback_classification()
+
+    started = time.perf_counter()
+    data = client.chat_json(_build_messages(text, request_type))
+    return _with_latency(ClassificationResult(**data), started)
+
+
+async def classify_text_async(text: str, request_type: str | None = None) -> ClassificationResult:
+    """Асинхронный вариант classify_text для async-ручек API."""
+
+    client = get_client()
+    if client is None:
+        return _fallback_classification()
+
+    started = time.perf_counter()
+    data = await client.chat_json_async(_build_messages(text, request_type))
+    return _with_latency(ClassificationResult(**data), started)
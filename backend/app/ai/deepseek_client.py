@@ -38,14 +38,27 @@ class DeepSeekClient:
             "Content-Type": "application/json",
         }
 
-    def chat(self, messages: List[Dict[str, str]], **extra: Any) -> str:
-        """Базовый вызов chat-комплишена, возвращает текст первого ответа."""
-
-        payload: Dict[str, Any] = {
+    def _build_payload(self, messages: List[Dict[str, str]], **extra: Any) -> Dict[str, Any]:
+        return {
             "model": self.model,
             "messages": messages,
             "temperature": extra.get("temperature", 0.1),
         }
+
+    @staticmethod
+    def _parse_json(content: str) -> Dict[str, Any]:
+        # На всякий случай вырезаем обёртку ```json ... ```
+        content = content.strip()
+        if content.startswith("```"):
+            content = content.strip("`")
+            if content.lower().startswith("json"):
+                content = content[4:]
+        return json.loads(content)
+
+    def chat(self, messages: List[Dict[str, str]], **extra: Any) -> str:
+        """Базовый вызов chat-комплишена, возвращает текст первого ответа."""
+
+        payload = self._build_payload(messages, **extra)
         url = f"{self.base_url}/chat/completions"
 
         with httpx.Client(timeout=extra.get("timeout", 15.0)) as client:
@@ -56,17 +69,26 @@ class DeepSeekClient:
         # Ожидаемый OpenAI-совместимый формат
         return data["choices"][0]["message"]["content"]
 
+    async def chat_async(self, messages: List[Dict[str, str]], **extra: Any) -> str:
+        """Асинхронный вариант chat(): не блокирует event loop на время ответа модели."""
+
+        payload = self._build_payload(messages, **extra)
+        url = f"{self.base_url}/chat/completions"
+
+        async with httpx.AsyncClient(timeout=extra.get("timeout", 15.0)) as client:
+            response = await client.post(url, headers=self._get_headers(), json=payload)
+            response.raise_for_status()
+            data = response.json()
+
+        return data["choices"][0]["message"]["content"]
+
     def chat_json(self, messages: List[Dict[str, str]], **extra: Any) -> Dict[str, Any]:
         """Чат с требованием вернуть корректный JSON. Пытается распарсить ответ."""
 
-        content = self.chat(messages, **extra)
-        # На всякий случай вырезаем обёртку ```json ... ```
-        content = content.strip()
-        if content.startswith("```"):
-            content = content.strip("`")
-            if content.lower().startswith("json"):
-                content = content[4:]
-        return json.loads(content)
+        return self._parse_json(self.chat(messages, **extra))
+
+    async def chat_json_async(self, messages: List[Dict[str, str]], **extra: Any) -> Dict[str, Any]:
+        return self._parse_json(await self.chat_async(messages, **extra))
 
 
 def get_client() -> Optional[DeepSeekClient]:
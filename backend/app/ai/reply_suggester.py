@@ -2,18 +2,12 @@ from app.ai.deepseek_client import get_client
 from app.schemas.ai import ReplySuggestions
 
 
-def suggest_replies(
+def _build_messages(
     conversation_text: str,
-    language: str = "ru",
-    request_type: str | None = None,
-    max_suggestions: int = 3,
-) -> ReplySuggestions:
-    """Генерация нескольких вариантов ответа для оператора второй линии."""
-
-    client = get_client()
-    if client is None:
-        return ReplySuggestions(suggestions=[])
-
+    language: str,
+    request_type: str | None,
+    max_suggestions: int,
+) -> list[dict[str, str]]:
     if language == "ru":
         base_instruction = (
             "Ты помощник оператора второй линии поддержки. "
@@ -42,11 +36,40 @@ def suggest_replies(
     if request_type:
         base_instruction += f" Request type hint: {request_type}."
 
-    messages = [
+    return [
         {"role": "system", "content": base_instruction},
         {"role": "user", "content": conversation_text},
     ]
 
+
+def suggest_replies(
+    conversation_text: str,
+    language: str = "ru",
+    request_type: str | None = None,
+    max_suggestions: int = 3,
+) -> ReplySuggestions:
+    """Генерация нескольких вариантов ответа для оператора второй линии."""
+
+    client = get_client()
+    if client is None:
+        return ReplySuggestions(suggestions=[])
+
+    messages = _build_messages(conversation_text, language, request_type, max_suggestions)
     data = client.chat_json(messages)
     return ReplySuggestions(**data)
 
+
+async def suggest_replies_async(
+    conversation_text: str,
+    language: str = "ru",
+    request_type: str | None = None,
+    max_suggestions: int = 3,
+) -> ReplySuggestions:
+    client = get_client()
+    if client is None:
+        return ReplySuggestions(suggestions=[])
+
+    messages = _build_messages(conversation_text, language, request_type, max_suggestions)
+    data = await client.chat_json_async(messages)
+    return ReplySuggestions(**data)
+
@@ -2,21 +2,32 @@ from app.ai.deepseek_client import get_client
 from app.schemas.ai import SummaryResult
 
 
-def summarize_conversation(text: str, language: str = "ru") -> SummaryResult:
-    client = get_client()
-    if client is None:
-        # Фолбэк: обрезаем текст
-        short = text[:500]
-        return SummaryResult(summary=short)
-
+def _build_messages(text: str, language: str) -> list[dict[str, str]]:
     system_prompt = (
         "Ты помощник службы поддержки. Суммируй обращение пользователя "
         f"кратко и по сути на языке {language}. Не больше 3-4 предложений."
     )
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": text},
     ]
-    summary_text = client.chat(messages)
+
+
+def summarize_conversation(text: str, language: str = "ru") -> SummaryResult:
+    client = get_client()
+    if client is None:
+        # Фолбэк: обрезаем текст
+        short = text[:500]
+        return SummaryResult(summary=short)
+
+    summary_text = client.chat(_build_messages(text, language))
     return SummaryResult(summary=summary_text.strip())
 
+
+async def summarize_conversation_async(text: str, language: str = "ru") -> SummaryResult:
+    client = get_client()
+    if client is None:
+        return SummaryResult(summary=text[:500])
+
+    summary_text = await client.chat_async(_build_messages(text, language))
+    return SummaryResult(summary=summary_text.strip())
@@ -1,8 +1,22 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.db.async_session import get_async_db as _get_async_db
+from app.db.async_session import get_async_read_db as _get_async_read_db
 from app.db.session import get_db as _get_db
 
 
 def get_db() -> Session:
     yield from _get_db()
 
+
+async def get_async_db() -> AsyncSession:
+    async for db in _get_async_db():
+        yield db
+
+
+async def get_async_read_db() -> AsyncSession:
+    """Только для чтения: реплика (DATABASE_READ_URL) с откатом на основную БД."""
+
+    async for db in _get_async_read_db():
+        yield db
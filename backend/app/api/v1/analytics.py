@@ -1,14 +1,118 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Literal
 
-from app.api.deps import get_db
-from app.schemas.analytics import OverviewMetrics
-from app.services.analytics_service import get_overview_metrics
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_async_read_db
+from app.schemas.analytics import (
+    CalibrationResponse,
+    ConfusionMatrixResponse,
+    LatencyPercentilesResponse,
+    ModelStatsResponse,
+    OverviewMetrics,
+    TimeseriesResponse,
+)
+from app.services.analytics_service import get_cached_overview_metrics, get_model_stats_async
+from app.services.classification_stats_service import get_calibration_async, get_confusion_matrix_async
+from app.services.rollup_service import get_latency_percentiles_async, get_timeseries_async
+from app.services.routing_service import AUTO_CLOSE_CONFIDENCE_THRESHOLD
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
 @router.get("/overview", response_model=OverviewMetrics)
-def overview(db: Session = Depends(get_db)) -> OverviewMetrics:
-    return get_overview_metrics(db)
+async def overview() -> OverviewMetrics:
+    """Метрики дашборда; снимок кэшируется (ANALYTICS_OVERVIEW_CACHE_TTL_SECONDS), см. generated_at."""
+
+    return await get_cached_overview_metrics()
+
+
+@router.get("/timeseries", response_model=TimeseriesResponse)
+async def timeseries(
+    db: AsyncSession = Depends(get_async_read_db),
+    granularity: Literal["day", "hour"] = Query("day"),
+    date_from: datetime | None = Query(None, description="Начало (UTC), по умолчанию 30 дней / 48 часов назад"),
+    date_to: datetime | None = Query(None, description="Конец (UTC, не включительно), по умолчанию сейчас"),
+    group_by: Literal["channel", "department", "priority", "request_type", "status"] | None = Query(None),
+    channel: str | None = Query(None),
+    department_code: str | None = Query(None),
+    priority: str | None = Query(None),
+    request_type: str | None = Query(None),
+    status: str | None = Query(None),
+) -> TimeseriesResponse:
+    """Созданные/закрытые тикеты и среднее время решения по дням или часам (из ticket_rollups)."""
+
+    try:
+        return await get_timeseries_async(
+            db,
+            granularity=granularity,
+            date_from=date_from,
+            date_to=date_to,
+            group_by=group_by,
+            channel=channel,
+            department_code=department_code,
+            priority=priority,
+            request_type=request_type,
+            status=status,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/latency", response_model=LatencyPercentilesResponse)
+async def latency(
+    db: AsyncSession = Depends(get_async_read_db),
+    date_from: datetime | None = Query(None, description="Начало (UTC, по дням), по умолчанию 30 дней назад"),
+    date_to: datetime | None = Query(None, description="Конец (UTC, не включительно), по умолчанию сейчас"),
+    group_by: Literal["channel", "department", "priority"] | None = Query(None),
+    channel: str | None = Query(None),
+    department_code: str | None = Query(None),
+    priority: str | None = Query(None),
+) -> LatencyPercentilesResponse:
+    """p50/p90/p99 времени первого ответа оператора и решения (из дневных квантильных скетчей)."""
+
+    try:
+        return await get_latency_percentiles_async(
+            db,
+            date_from=date_from,
+            date_to=date_to,
+            group_by=group_by,
+            channel=channel,
+            department_code=department_code,
+            priority=priority,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/classification/confusion", response_model=ConfusionMatrixResponse)
+async def classification_confusion(
+    field: Literal["priority", "department", "category", "request_type"] = Query("department"),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> ConfusionMatrixResponse:
+    """Матрица ошибок классификации: предсказанная метка × метка после исправлений оператора."""
+
+    return await get_confusion_matrix_async(db, field)
+
+
+@router.get("/classification/calibration", response_model=CalibrationResponse)
+async def classification_calibration(db: AsyncSession = Depends(get_async_read_db)) -> CalibrationResponse:
+    """Калибровка уверенности модели по корзинам 0.1: доля неисправленных классификаций.
+
+    accuracy_at_or_above показывает, что дал бы AUTO_CLOSE_CONFIDENCE_THRESHOLD = confidence_from.
+    """
+
+    return await get_calibration_async(db, AUTO_CLOSE_CONFIDENCE_THRESHOLD)
+
+
+@router.get("/classification/model", response_model=ModelStatsResponse)
+async def classification_model_stats(
+    db: AsyncSession = Depends(get_async_read_db),
+    group_by: Literal["category", "department", "priority", "language"] = Query("category"),
+    date_from: datetime | None = Query(None, description="created_at >= date_from (UTC)"),
+    date_to: datetime | None = Query(None, description="created_at < date_to (UTC)"),
+) -> ModelStatsResponse:
+    """Классификации модели по предсказанной метке: объём, уверенность, исправления, время ответа."""
 
+    return await get_model_stats_async(db, group_by=group_by, date_from=date_from, date_to=date_to)
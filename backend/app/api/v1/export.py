@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import List, Literal
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from app.services.export_service import (
+    MESSAGE_COLUMNS,
+    TICKET_COLUMNS,
+    csv_chunks,
+    gzip_chunks,
+    message_export_queries,
+    ndjson_chunks,
+    stream_rows,
+    ticket_export_queries,
+)
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _export_response(
+    request: Request, name: str, columns, statements: List[Select], fmt: str
+) -> StreamingResponse:
+    formatter = csv_chunks if fmt == "csv" else ndjson_chunks
+    body = formatter(columns, stream_rows(statements))
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"', "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("/tickets")
+async def export_tickets(
+    request: Request,
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    date_from: datetime | None = Query(None, description="created_at >= date_from (UTC)"),
+    date_to: datetime | None = Query(None, description="created_at < date_to (UTC)"),
+    status: str | None = Query(None),
+    channel: str | None = Query(None),
+    priority: str | None = Query(None),
+    request_type: str | None = Query(None),
+    department_code: str | None = Query(None),
+    include_archived: bool = Query(False, description="Добавить тикеты из архива (после горячих)"),
+) -> StreamingResponse:
+    """Потоковая выгрузка тикетов в CSV или NDJSON для BI; память не зависит от числа строк.
+
+    При Accept-Encoding: gzip ответ сжимается на лету.
+    """
+
+    statements = ticket_export_queries(
+        include_archived,
+        date_from=date_from,
+        date_to=date_to,
+        status=status,
+        channel=channel,
+        priority=priority,
+        request_type=request_type,
+        department_code=department_code,
+    )
+    return _export_response(request, "tickets", TICKET_COLUMNS, statements, format)
+
+
+@router.get("/messages")
+async def export_messages(
+    request: Request,
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    date_from: datetime | None = Query(None, description="created_at >= date_from (UTC)"),
+    date_to: datetime | None = Query(None, description="created_at < date_to (UTC)"),
+    ticket_id: int | None = Query(None),
+    author_type: str | None = Query(None),
+    include_archived: bool = Query(False, description="Добавить сообщения из архива (после горячих)"),
+) -> StreamingResponse:
+    """Потоковая выгрузка сообщений в CSV или NDJSON (gzip при Accept-Encoding: gzip)."""
+
+    statements = message_export_queries(
+        include_archived, date_from=date_from, date_to=date_to, ticket_id=ticket_id, author_type=author_type
+    )
+    return _export_response(request, "messages", MESSAGE_COLUMNS, statements, format)
@@ -1,9 +1,9 @@
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
+from app.api.deps import get_async_db, get_async_read_db
 from app.schemas.faq import FAQCreate, FAQRead, FAQUpdate
 from app.services import faq_service
 
@@ -11,32 +11,32 @@ router = APIRouter(prefix="/faq", tags=["faq"])
 
 
 @router.get("", response_model=List[FAQRead])
-def list_faq(
-    db: Session = Depends(get_db),
+async def list_faq(
+    db: AsyncSession = Depends(get_async_read_db),
     language: Optional[str] = Query(None),
 ):
-    items = faq_service.list_faq(db, language=language)
+    items = await faq_service.list_faq_async(db, language=language)
     return [FAQRead.model_validate(f) for f in items]
 
 
 @router.post("", response_model=FAQRead)
-def create_faq(data: FAQCreate, db: Session = Depends(get_db)):
-    faq = faq_service.create_faq(db, data)
+async def create_faq(data: FAQCreate, db: AsyncSession = Depends(get_async_db)):
+    faq = await faq_service.create_faq_async(db, data)
     return FAQRead.model_validate(faq)
 
 
 @router.put("/{faq_id}", response_model=FAQRead)
-def update_faq(faq_id: int, data: FAQUpdate, db: Session = Depends(get_db)):
+async def update_faq(faq_id: int, data: FAQUpdate, db: AsyncSession = Depends(get_async_db)):
     try:
-        faq = faq_service.update_faq(db, faq_id, data)
+        faq = await faq_service.update_faq_async(db, faq_id, data)
     except ValueError:
         raise HTTPException(status_code=404, detail="FAQ not found")
     return FAQRead.model_validate(faq)
 
 
 @router.delete("/{faq_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_faq(faq_id: int, db: Session = Depends(get_db)):
+async def delete_faq(faq_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        faq_service.delete_faq(db, faq_id)
+        await faq_service.delete_faq_async(db, faq_id)
     except ValueError:
         raise HTTPException(status_code=404, detail="FAQ not found")
@@ -1,247 +1,417 @@
 from datetime import datetime
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-
-from app.api.deps import get_db
+from typing import AsyncIterator, List, Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_async_db, get_async_read_db, get_db
+from app.core.config import get_settings
+from app.core.sla import sla_deadlines
+from app.db.write_coordinator import execute_write_async
+from app.models.archive import ArchivedMessage, ArchivedTicket
 from app.models.message import AuthorType, Message
 from app.models.ticket import Ticket, TicketStatus
-from app.integrations.telegram_sender import send_text_message
-from app.ai.summarizer import summarize_conversation
-from app.ai.reply_suggester import suggest_replies
+from app.integrations.telegram_sender import send_text_message_async
+from app.ai.summarizer import summarize_conversation_async
+from app.ai.reply_suggester import suggest_replies_async
 from app.schemas.ai import SummaryResult, ReplySuggestions
 from app.schemas.ticket import (
+    BulkIngestResult,
     ExternalTicketCreate,
     MessageCreate,
+    MessagePage,
     MessageRead,
     TicketCreate,
     TicketDetails,
+    TicketBulkUpdate,
+    TicketBulkUpdateResult,
     TicketRead,
     TicketStatusUpdate,
 )
-from app.services.routing_service import create_ticket_from_external, process_new_ticket
+from app.services.bulk_ingest import DEFAULT_BATCH_SIZE, ingest_batch
+from app.services.idempotency_service import (
+    SCOPE_API,
+    SCOPE_API_EXTERNAL,
+    IdempotencyConflict,
+    run_idempotent_async,
+)
+from app.services.routing_service import (
+    create_deferred_ticket_async,
+    create_ticket_from_external_async,
+    process_new_ticket_async,
+)
+from app.services.sla_service import at_risk_tickets_query
+from app.services.ticket_service import (
+    SUPPORTED_STATUSES,
+    add_ticket_message_async,
+    apply_status_update,
+    bulk_update_tickets_async,
+    latest_ticket_messages_async,
+    list_ticket_messages_async,
+)
+
+settings = get_settings()
 
 router = APIRouter(prefix="/tickets", tags=["tickets"])
 
 
+async def _load_ticket(db: AsyncSession, ticket_id: int, *options) -> Ticket | None:
+    """Загрузка тикета с департаментом: в async-сессии ленивые связи недоступны."""
+
+    stmt = (
+        select(Ticket)
+        .options(selectinload(Ticket.department), *options)
+        .where(Ticket.id == ticket_id)
+        .execution_options(populate_existing=True)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+
+async def _load_archived_ticket(db: AsyncSession, ticket_id: int) -> ArchivedTicket | None:
+    result = await db.execute(
+        select(ArchivedTicket)
+        .options(selectinload(ArchivedTicket.department))
+        .where(ArchivedTicket.id == ticket_id)
+    )
+    return result.scalars().first()
+
+
+async def _get_ticket_or_404(db: AsyncSession, ticket_id: int, *options) -> Ticket:
+    ticket = await _load_ticket(db, ticket_id, *options)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return ticket
+
+
+async def _run_idempotent(db: AsyncSession, scope: str, key: str | None, action):
+    try:
+        return await run_idempotent_async(db, scope, key, action)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still being processed")
+
+
+async def _conversation_text(db: AsyncSession, ticket: Ticket) -> str:
+    result = await db.execute(
+        select(Message)
+        .where(Message.ticket_id == ticket.id)
+        .order_by(Message.created_at.asc())
+    )
+    messages = result.scalars().all()
+
+    if not messages:
+        return ticket.description or ""
+
+    parts: list[str] = []
+    for m in messages:
+        role = m.author_type
+        ts = m.created_at.strftime("%Y-%m-%d %H:%M")
+        parts.append(f"{role} ({ts}): {m.body}")
+    return "\n".join(parts)
+
+
 @router.post("", response_model=TicketRead)
-def create_ticket(data: TicketCreate, db: Session = Depends(get_db)):
-    ticket = process_new_ticket(db, data)
+async def create_ticket(
+    data: TicketCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    deferred: bool | None = Query(
+        None,
+        description="Сохранить тикет сразу (202) и выполнить AI‑обработку в фоне. "
+        "По умолчанию берётся из настройки TICKET_AI_DEFERRED.",
+    ),
+    idempotency_key: str | None = Header(
+        None,
+        alias="Idempotency-Key",
+        description="Повтор запроса с тем же ключом вернёт исходный тикет без повторной AI‑обработки",
+    ),
+):
+    if deferred is None:
+        deferred = settings.ticket_ai_deferred
+
+    async def _create() -> Ticket:
+        if deferred:
+            return await create_deferred_ticket_async(db, data)
+        return await process_new_ticket_async(db, data)
+
+    ticket_id, replayed = await _run_idempotent(db, SCOPE_API, idempotency_key, _create)
+    ticket = await _get_ticket_or_404(db, ticket_id)
+    if deferred and not replayed:
+        response.status_code = 202
     return _ticket_to_read(ticket)
 
 
 @router.get("", response_model=List[TicketRead])
-def list_tickets(
-    db: Session = Depends(get_db),
+async def list_tickets(
+    db: AsyncSession = Depends(get_async_read_db),
     status: str | None = Query(None),
     channel: str | None = Query(None),
+    include_archived: bool = Query(False, description="Добавить закрытые тикеты из архива"),
+    sort: Literal["created_at", "sla_due_at"] = Query(
+        "created_at", description="created_at — новые сверху, sla_due_at — ближайший срок SLA сверху"
+    ),
+):
+    def _filtered(model):
+        stmt = select(model).options(selectinload(model.department))
+        if status:
+            stmt = stmt.where(model.status == status)
+        if channel:
+            stmt = stmt.where(model.channel == channel)
+        if sort == "sla_due_at":
+            return stmt.order_by(model.sla_due_at.asc(), model.id.asc())
+        return stmt.order_by(model.created_at.desc())
+
+    result = await db.execute(_filtered(Ticket))
+    items = [_ticket_to_read(t) for t in result.scalars().all()]
+    if include_archived:
+        result = await db.execute(_filtered(ArchivedTicket))
+        items.extend(_ticket_to_read(t, archived=True) for t in result.scalars().all())
+        if sort == "sla_due_at":
+            items.sort(key=lambda t: (t.sla_due_at, t.id))
+        else:
+            items.sort(key=lambda t: t.created_at, reverse=True)
+    return items
+
+
+@router.get("/sla/at-risk", response_model=List[TicketRead])
+async def list_sla_at_risk(
+    db: AsyncSession = Depends(get_async_read_db),
+    within_minutes: int = Query(30, ge=1, le=7 * 24 * 60, description="Горизонт, мин"),
+    include_breached: bool = Query(False, description="Добавить уже просроченные"),
+    limit: int = Query(100, ge=1, le=1000),
 ):
-    query = db.query(Ticket)
-    if status:
-        query = query.filter(Ticket.status == status)
-    if channel:
-        query = query.filter(Ticket.channel == channel)
-    tickets = query.order_by(Ticket.created_at.desc()).all()
-    return [_ticket_to_read(t) for t in tickets]
+    """Открытые тикеты, у которых срок SLA истекает в ближайшие within_minutes, по возрастанию срока."""
+
+    stmt = at_risk_tickets_query(datetime.utcnow(), within_minutes, include_breached)
+    result = await db.execute(stmt.options(selectinload(Ticket.department)).limit(limit))
+    return [_ticket_to_read(t) for t in result.scalars().all()]
 
 
 @router.post("/external", response_model=TicketRead)
-def create_ticket_external(data: ExternalTicketCreate, db: Session = Depends(get_db)):
+async def create_ticket_external(
+    data: ExternalTicketCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
     """Создание тикета внешним источником (например, обработчиком почты Outlook).
 
     Здесь предполагается, что статус, приоритет и классификация уже определены внешней системой.
     """
 
-    ticket = create_ticket_from_external(db, data)
+    ticket_id, _ = await _run_idempotent(
+        db, SCOPE_API_EXTERNAL, idempotency_key, lambda: create_ticket_from_external_async(db, data)
+    )
+    ticket = await _get_ticket_or_404(db, ticket_id)
     return _ticket_to_read(ticket)
 
 
+async def _aiter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """Разбивает поток тела запроса на непустые строки NDJSON, не читая его целиком."""
+
+    line_no = 0
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line.decode("utf-8", errors="replace").strip()
+    if pending.strip():
+        yield line_no + 1, pending.decode("utf-8", errors="replace").strip()
+
+
+@router.post("/bulk", response_model=BulkIngestResult)
+async def bulk_ingest_tickets(
+    request: Request,
+    db: Session = Depends(get_db),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=50000),
+):
+    """Массовая загрузка тикетов из старого helpdesk (тело — NDJSON).
+
+    Каждая строка — объект ExternalTicketCreate с необязательными created_at/closed_at.
+    AI‑маршрутизация не вызывается. Строки с ошибками возвращаются в errors,
+    остальная пачка при этом загружается.
+    """
+
+    result = BulkIngestResult()
+    batch: list[tuple[int, str]] = []
+    async for item in _aiter_ndjson(request.stream()):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            await run_in_threadpool(ingest_batch, db, batch, result)
+            batch = []
+    if batch:
+        await run_in_threadpool(ingest_batch, db, batch, result)
+    return result
+
+
+@router.post("/bulk-update", response_model=TicketBulkUpdateResult)
+async def bulk_update_tickets(data: TicketBulkUpdate, db: AsyncSession = Depends(get_async_db)):
+    """Массовое изменение статуса/приоритета/категории/ai_disabled одним UPDATE в одной транзакции."""
+
+    if data.status is not None and data.status not in SUPPORTED_STATUSES:
+        raise HTTPException(status_code=400, detail="Unsupported ticket status")
+
+    updated = await bulk_update_tickets_async(db, data)
+    return TicketBulkUpdateResult(updated=updated)
+
+
 @router.get("/{ticket_id}", response_model=TicketDetails)
-def get_ticket(ticket_id: int, db: Session = Depends(get_db)):
-    ticket: Ticket | None = db.query(Ticket).get(ticket_id)
-    if not ticket:
+async def get_ticket(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    messages_limit: int | None = Query(
+        None,
+        ge=0,
+        le=500,
+        description="Сколько последних сообщений вернуть (по умолчанию TICKET_DETAILS_MESSAGES_LIMIT)",
+    ),
+):
+    ticket = await _load_ticket(db, ticket_id)
+    message_model = Message
+    archived = False
+    if ticket is None:
+        # Read-through: закрытые давно тикеты лежат в архиве
+        ticket = await _load_archived_ticket(db, ticket_id)
+        message_model = ArchivedMessage
+        archived = True
+    if ticket is None:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
+    if messages_limit is None:
+        messages_limit = settings.ticket_details_messages_limit
+    messages, has_more = await latest_ticket_messages_async(db, ticket_id, messages_limit, model=message_model)
+
     return TicketDetails(
-        **_ticket_to_read(ticket).dict(),
-        messages=[
-            MessageRead.from_orm(m) for m in sorted(ticket.messages, key=lambda mm: mm.created_at)
-        ],
+        **_ticket_to_read(ticket, archived=archived).dict(),
+        messages=[MessageRead.from_orm(m) for m in messages],
+        has_more_messages=has_more,
+    )
+
+
+@router.get("/{ticket_id}/messages", response_model=MessagePage)
+async def list_ticket_messages(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(50, ge=1, le=500),
+    order: Literal["asc", "desc"] = Query("desc", description="desc — сначала новые, asc — сначала старые"),
+    cursor: int | None = Query(None, description="next_cursor из предыдущей страницы"),
+    after_id: int | None = Query(
+        None,
+        description="Вернуть только сообщения новее указанного (по возрастанию), для опроса новых сообщений",
+    ),
+):
+    """История сообщений тикета с keyset‑пагинацией по (created_at, id)."""
+
+    message_model = Message
+    if await db.get(Ticket, ticket_id) is None:
+        if await db.get(ArchivedTicket, ticket_id) is None:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+        message_model = ArchivedMessage
+
+    if after_id is not None:
+        descending, cursor = False, after_id
+    else:
+        descending = order == "desc"
+
+    messages, has_more = await list_ticket_messages_async(
+        db, ticket_id, limit, descending=descending, cursor=cursor, model=message_model
+    )
+    return MessagePage(
+        items=[MessageRead.from_orm(m) for m in messages],
+        next_cursor=messages[-1].id if messages else cursor,
+        has_more=has_more,
     )
 
 
 @router.post("/{ticket_id}/messages", response_model=MessageRead)
-def add_message(ticket_id: int, data: MessageCreate, db: Session = Depends(get_db)):
-    ticket: Ticket | None = db.query(Ticket).get(ticket_id)
+async def add_message(ticket_id: int, data: MessageCreate, db: AsyncSession = Depends(get_async_db)):
+    ticket: Ticket | None = await db.get(Ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
+    # После записи через координатор сессия откатывается и объект тикета истекает
+    telegram_chat_id = ticket.external_user_id if ticket.channel == "telegram" else None
 
-    msg = Message(
-        ticket_id=ticket_id,
-        author_type=data.author_type or AuthorType.AGENT.value,
-        body=data.body,
-        language=data.language,
+    msg_id = await add_ticket_message_async(
+        db, ticket_id, data.author_type or AuthorType.AGENT.value, data.body, data.language
     )
-    db.add(msg)
-    db.commit()
-    db.refresh(msg)
-
-    # Если это ответ оператора по Telegram‑тикету — отправляем его в чат пользователю
-    if (
-        ticket.channel == "telegram"
-        and msg.author_type == AuthorType.AGENT.value
-        and ticket.external_user_id
-    ):
-        try:
-            send_text_message(ticket.external_user_id, msg.body)
-        except Exception:
-            # Не ломаем API, если отправка в Telegram не удалась
-            import logging
-
-            logging.getLogger(__name__).exception(
-                "Failed to deliver agent message to Telegram for ticket %s", ticket_id
-            )
+    msg: Message = await db.get(Message, msg_id, populate_existing=True)
+
+    # Если это ответ оператора по Telegram‑тикету — отправляем его в чат пользователю.
+    # Ошибки доставки логируются внутри и не ломают API.
+    if telegram_chat_id and msg.author_type == AuthorType.AGENT.value:
+        await send_text_message_async(telegram_chat_id, msg.body)
 
     return MessageRead.from_orm(msg)
 
 
 @router.put("/{ticket_id}/status", response_model=TicketRead)
-def update_ticket_status(
+async def update_ticket_status(
     ticket_id: int,
     data: TicketStatusUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновление статуса тикета вручную из интерфейса оператора."""
 
-    ticket: Ticket | None = db.query(Ticket).get(ticket_id)
-    if not ticket:
-        raise HTTPException(status_code=404, detail="Ticket not found")
+    await _get_ticket_or_404(db, ticket_id)
 
-    old_status = ticket.status
-
-    if data.status not in {
-        TicketStatus.NEW.value,
-        TicketStatus.IN_PROGRESS.value,
-        TicketStatus.CLOSED.value,
-        TicketStatus.AUTO_CLOSED.value,
-    }:
+    if data.status not in SUPPORTED_STATUSES:
         raise HTTPException(status_code=400, detail="Unsupported ticket status")
 
-    ticket.status = data.status
-
-    if data.status in {TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value}:
-        now = datetime.utcnow()
-        ticket.closed_at = now
-        ticket.status_updated_at = now
-    else:
-        ticket.closed_at = None
-
-    # Ручное изменение — считаем, что это не авто‑закрытие
-    if data.status != TicketStatus.AUTO_CLOSED.value:
-        ticket.auto_closed_by_ai = False
-
-    # Если статус изменился (например, NEW → IN_PROGRESS), фиксируем момент смены
-    if data.status != old_status and data.status not in {
-        TicketStatus.CLOSED.value,
-        TicketStatus.AUTO_CLOSED.value,
-    }:
-        ticket.status_updated_at = datetime.utcnow()
-
-    if data.priority is not None:
-        ticket.priority = data.priority
-
-    if data.request_type is not None:
-        ticket.request_type = data.request_type
-
-    if data.ai_disabled is not None:
-        ticket.ai_disabled = data.ai_disabled
-
-    db.add(ticket)
-    db.commit()
-    db.refresh(ticket)
+    await execute_write_async(db, lambda s: apply_status_update(s, ticket_id, data))
+    ticket = await _load_ticket(db, ticket_id)
     return _ticket_to_read(ticket)
 
 
 @router.get("/{ticket_id}/summary", response_model=SummaryResult)
-def get_ticket_summary(ticket_id: int, db: Session = Depends(get_db)) -> SummaryResult:
+async def get_ticket_summary(ticket_id: int, db: AsyncSession = Depends(get_async_db)) -> SummaryResult:
     """Краткое резюме диалога по тикету для второй линии."""
 
-    ticket: Ticket | None = db.query(Ticket).get(ticket_id)
+    ticket: Ticket | None = await db.get(Ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    messages = (
-        db.query(Message)
-        .filter(Message.ticket_id == ticket_id)
-        .order_by(Message.created_at.asc())
-        .all()
-    )
-
-    if messages:
-        parts: list[str] = []
-        for m in messages:
-            role = m.author_type
-            ts = m.created_at.strftime("%Y-%m-%d %H:%M")
-            parts.append(f"{role} ({ts}): {m.body}")
-        text = "\n".join(parts)
-    else:
-        text = ticket.description or ""
-
+    text = await _conversation_text(db, ticket)
     language = ticket.language or "ru"
-    return summarize_conversation(text, language=language)
+    return await summarize_conversation_async(text, language=language)
 
 
 @router.get("/{ticket_id}/reply_suggestions", response_model=ReplySuggestions)
-def get_ticket_reply_suggestions(
-    ticket_id: int, db: Session = Depends(get_db)
+async def get_ticket_reply_suggestions(
+    ticket_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> ReplySuggestions:
     """Сгенерировать несколько вариантов ответа для оператора."""
 
-    ticket: Ticket | None = db.query(Ticket).get(ticket_id)
+    ticket: Ticket | None = await db.get(Ticket, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket not found")
 
-    messages = (
-        db.query(Message)
-        .filter(Message.ticket_id == ticket_id)
-        .order_by(Message.created_at.asc())
-        .all()
-    )
-
-    if messages:
-        parts: list[str] = []
-        for m in messages:
-            role = m.author_type
-            ts = m.created_at.strftime("%Y-%m-%d %H:%M")
-            parts.append(f"{role} ({ts}): {m.body}")
-        text = "\n".join(parts)
-    else:
-        text = ticket.description or ""
-
+    text = await _conversation_text(db, ticket)
     language = ticket.language or "ru"
-    return suggest_replies(
+    return await suggest_replies_async(
         conversation_text=text,
         language=language,
         request_type=ticket.request_type,
     )
 
 
-def _ticket_to_read(ticket: Ticket) -> TicketRead:
+def _ticket_to_read(ticket: Ticket | ArchivedTicket, archived: bool = False) -> TicketRead:
     department_name = ticket.department.name if ticket.department else None
     department_code = ticket.department.code if ticket.department else None
-    # SLA: простое правило по приоритету
-    sla_map = {
-        "P1": 30,   # минуты до целевого решения
-        "P2": 60,
-        "P3": 240,
-        "P4": 1440,
-    }
-    sla_target = sla_map.get(ticket.priority, 240)
+    # SLA: срок хранится в тикете; у старых записей без него считаем по текущей политике
+    sla_due_at = ticket.sla_due_at
+    first_response_due_at = ticket.first_response_due_at
+    if sla_due_at is None:
+        first_response_due_at, sla_due_at = sla_deadlines(ticket.created_at, ticket.priority, department_code)
+    sla_target = round((sla_due_at - ticket.created_at).total_seconds() / 60.0)
     now = datetime.utcnow()
     end_ts = ticket.closed_at or now
     elapsed_minutes = max((end_ts - ticket.created_at).total_seconds() / 60.0, 0.0)
-    sla_breached = elapsed_minutes > sla_target and ticket.status not in {
+    sla_breached = now > sla_due_at and ticket.status not in {
         TicketStatus.CLOSED.value,
         TicketStatus.AUTO_CLOSED.value,
     }
@@ -273,7 +443,10 @@ def _ticket_to_read(ticket: Ticket) -> TicketRead:
         updated_at=ticket.updated_at,
         closed_at=ticket.closed_at,
         sla_target_minutes=sla_target,
+        sla_due_at=sla_due_at,
+        first_response_due_at=first_response_due_at,
         sla_elapsed_minutes=elapsed_minutes,
         sla_breached=sla_breached,
         status_elapsed_minutes=status_elapsed_minutes,
+        archived=archived,
     )
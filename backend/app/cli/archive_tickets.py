@@ -0,0 +1,31 @@
+import argparse
+import time
+
+from app.db.session import SessionLocal
+from app.models import archive, department, idempotency_key, job, message, model_log, ticket  # noqa: F401
+from app.services.ticket_archive import archive_closed_tickets
+
+
+def main() -> None:
+    """Перенос давно закрытых тикетов с сообщениями в архивные таблицы.
+
+    Запуск (например, из cron раз в сутки):
+        python -m app.cli.archive_tickets --days 90
+    """
+
+    parser = argparse.ArgumentParser(description="Archive closed tickets")
+    parser.add_argument("--days", type=int, default=None, help="По умолчанию TICKET_ARCHIVE_AFTER_DAYS")
+    parser.add_argument("--batch-size", type=int, default=None, help="По умолчанию TICKET_ARCHIVE_BATCH_SIZE")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        count = archive_closed_tickets(db, older_than_days=args.days, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"archived={count} elapsed={time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
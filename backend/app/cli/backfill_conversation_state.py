@@ -0,0 +1,32 @@
+import argparse
+import time
+
+from app.db.session import SessionLocal
+from app.models import department, message, ticket  # noqa: F401
+from app.services.ticket_service import backfill_conversation_state
+
+
+def main() -> None:
+    """Пересчёт состояния диалога в tickets (message_count, last_message_at и т. д.) по messages.
+
+    Запуск:
+        python -m app.cli.backfill_conversation_state          # только тикеты без состояния
+        python -m app.cli.backfill_conversation_state --all    # все тикеты
+    """
+
+    parser = argparse.ArgumentParser(description="Backfill denormalized conversation state on tickets")
+    parser.add_argument("--all", action="store_true", help="Пересчитать все тикеты, а не только без состояния")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        count = backfill_conversation_state(db, recompute_all=args.all, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"tickets={count} elapsed={time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
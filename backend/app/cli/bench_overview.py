@@ -0,0 +1,218 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.db.base import Base
+from app.db.engine import engine_options, install_sqlite_pragmas
+from app.models import archive, department, message, model_log, ticket  # noqa: F401
+from app.models.message import AuthorType, Message
+from app.models.model_log import ModelLog
+from app.models.ticket import Ticket, TicketStatus
+from app.services.analytics_service import get_overview_metrics
+
+REQUEST_TYPES = ["problem", "question", "feedback", "career", "partner", "other", "difficulty", "job", None]
+STATUSES = [status.value for status in TicketStatus]
+PRIORITIES = ["P1", "P2", "P3", "P4"]
+CHUNK = 10000
+
+
+def _fill(engine, tickets: int, seed: int) -> None:
+    """Синтетические тикеты за последние 60 дней: по сообщению клиента, у ~30% — ответ оператора."""
+
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(0, tickets, CHUNK):
+            ticket_rows, message_rows, log_rows = [], [], []
+            for ticket_id in range(start + 1, min(start + CHUNK, tickets) + 1):
+                created_at = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 60))
+                status = rnd.choice(STATUSES)
+                closed = status in (TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value)
+                closed_at = created_at + timedelta(minutes=rnd.randint(1, 600)) if closed else None
+                agent_at = created_at + timedelta(minutes=5) if rnd.random() < 0.3 else None
+                priority = rnd.choice(PRIORITIES)
+                ticket_rows.append(
+                    {
+                        "id": ticket_id,
+                        "subject": "Bench",
+                        "description": "Bench",
+                        "channel": "email",
+                        "language": "ru",
+                        "request_type": rnd.choice(REQUEST_TYPES),
+                        "priority": priority,
+                        "status": status,
+                        "auto_closed_by_ai": status == TicketStatus.AUTO_CLOSED.value or rnd.random() < 0.1,
+                        "ai_disabled": False,
+                        "created_at": created_at,
+                        "updated_at": created_at,
+                        "status_updated_at": created_at,
+                        "closed_at": closed_at,
+                        "sla_due_at": created_at + timedelta(minutes={"P1": 30, "P2": 60, "P3": 240, "P4": 1440}[priority]),
+                        "message_count": 2 if agent_at else 1,
+                        "last_message_at": agent_at or created_at,
+                        "last_message_author_type": AuthorType.AGENT.value if agent_at else AuthorType.CUSTOMER.value,
+                        "last_customer_message_at": created_at,
+                        "first_agent_response_at": agent_at,
+                    }
+                )
+                message_rows.append(
+                    {"ticket_id": ticket_id, "author_type": AuthorType.CUSTOMER.value, "body": "b", "language": "ru", "created_at": created_at}
+                )
+                if agent_at:
+                    message_rows.append(
+                        {"ticket_id": ticket_id, "author_type": AuthorType.AGENT.value, "body": "b", "language": "ru", "created_at": agent_at}
+                    )
+                log_rows.append(
+                    {
+                        "ticket_id": ticket_id,
+                        "model_name": "bench",
+                        "input_type": "classification",
+                        "request_payload": "",
+                        "response_payload": "",
+                        "was_corrected": int(rnd.random() < 0.1),
+                        "created_at": created_at,
+                    }
+                )
+            conn.execute(insert(Ticket.__table__), ticket_rows)
+            conn.execute(insert(Message.__table__), message_rows)
+            conn.execute(insert(ModelLog.__table__), log_rows)
+
+
+def _per_metric_overview(db: Session) -> dict:
+    """Прежняя схема расчёта для сравнения: отдельный COUNT на метрику и проходы в Python."""
+
+    def count(*conditions) -> int:
+        return db.query(func.count(Ticket.id)).filter(*conditions).scalar() or 0
+
+    now = datetime.utcnow()
+    today_start = datetime(now.year, now.month, now.day)
+    result = {
+        "total": count(),
+        "new_today": count(Ticket.created_at >= today_start),
+        "auto_closed": count(Ticket.status == TicketStatus.AUTO_CLOSED.value),
+        "in_progress": count(Ticket.status == TicketStatus.IN_PROGRESS.value),
+        "closed_today": count(
+            Ticket.closed_at.isnot(None),
+            Ticket.closed_at >= today_start,
+            Ticket.status.in_([TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value]),
+        ),
+        "problem": count(Ticket.request_type.in_(["problem", "difficulty"])),
+        "question": count(Ticket.request_type == "question"),
+        "feedback": count(Ticket.request_type.in_(["feedback", "proposal"])),
+        "career": count(Ticket.request_type.in_(["career", "job"])),
+        "partner": count(Ticket.request_type == "partner"),
+        "other": count(or_(Ticket.request_type == "other", Ticket.request_type.is_(None))),
+    }
+    for priority in PRIORITIES:
+        result[priority] = count(Ticket.priority == priority)
+
+    breached = ok = 0
+    for due_at, in db.query(Ticket.sla_due_at).filter(
+        Ticket.status.in_([TicketStatus.NEW.value, TicketStatus.IN_PROGRESS.value])
+    ):
+        if due_at < now:
+            breached += 1
+        else:
+            ok += 1
+    result["sla"] = (ok, breached)
+
+    seconds = samples = 0
+    for created_at, closed_at in db.query(Ticket.created_at, Ticket.closed_at).filter(
+        Ticket.status == TicketStatus.AUTO_CLOSED.value
+    ):
+        seconds += (closed_at - created_at).total_seconds()
+        samples += 1
+    result["avg"] = seconds / 60.0 / samples if samples else None
+
+    result["classifications"] = db.query(func.count(ModelLog.id)).filter(ModelLog.input_type == "classification").scalar()
+    result["incorrect"] = (
+        db.query(func.count(ModelLog.id))
+        .filter(ModelLog.input_type == "classification", ModelLog.was_corrected == 1)
+        .scalar()
+    )
+    agent_ticket_ids = {
+        ticket_id
+        for (ticket_id,) in db.query(Message.ticket_id).filter(Message.author_type == AuthorType.AGENT.value).distinct()
+    }
+    query = db.query(func.count(Ticket.id)).filter(
+        Ticket.status == TicketStatus.CLOSED.value, Ticket.auto_closed_by_ai.is_(True)
+    )
+    if agent_ticket_ids:
+        query = query.filter(~Ticket.id.in_(agent_ticket_ids))
+    result["user_auto_closed"] = query.scalar()
+    return result
+
+
+def _best_of(repeat: int, fn) -> tuple[float, object]:
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, value
+
+
+def main() -> None:
+    """Время расчёта метрик дашборда: отдельные COUNT на метрику vs один агрегирующий проход.
+
+    Заполняет временный файл SQLite синтетическими тикетами. Запуск:
+        python -m app.cli.bench_overview --tickets 100000
+        python -m app.cli.bench_overview --tickets 1000000 --repeat 1
+        python -m app.cli.bench_overview --database-url postgresql://... --no-fill
+    """
+
+    parser = argparse.ArgumentParser(description="Overview metrics benchmark")
+    parser.add_argument("--tickets", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3, help="Лучшее из N прогонов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=None, help="Существующая БД вместо временного SQLite")
+    parser.add_argument("--no-fill", action="store_true", help="Не генерировать данные (для --database-url)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url, **engine_options(url))
+        install_sqlite_pragmas(engine)
+        Base.metadata.create_all(bind=engine)
+        if not args.no_fill:
+            started = time.perf_counter()
+            _fill(engine, args.tickets, args.seed)
+            print(f"filled {args.tickets} tickets in {time.perf_counter() - started:.1f}s")
+
+        with Session(engine) as db:
+            single_time, metrics = _best_of(args.repeat, lambda: get_overview_metrics(db))
+            try:
+                legacy_time, legacy = _best_of(args.repeat, lambda: _per_metric_overview(db))
+            except OperationalError as exc:
+                # NOT IN со всеми id тикетов с ответом оператора упирается в лимит параметров SQLite
+                db.rollback()
+                print(f"per-metric queries: failed ({exc.orig})")
+                print(f"single pass:        {single_time * 1000:9.1f} ms")
+                engine.dispose()
+                return
+
+        print(f"per-metric queries: {legacy_time * 1000:9.1f} ms")
+        print(f"single pass:        {single_time * 1000:9.1f} ms  (x{legacy_time / single_time:.1f})")
+        same = (
+            legacy["total"] == metrics.total_tickets
+            and legacy["sla"] == (metrics.open_sla_ok_tickets, metrics.open_sla_breached_tickets)
+            and legacy["user_auto_closed"] == metrics.user_auto_closed_tickets
+            and [legacy[p] for p in PRIORITIES]
+            == [metrics.p1_tickets, metrics.p2_tickets, metrics.p3_tickets, metrics.p4_tickets]
+            and legacy["other"] == metrics.other_tickets
+            and (legacy["avg"] is None) == (metrics.avg_first_response_minutes is None)
+            and (legacy["avg"] is None or abs(legacy["avg"] - metrics.avg_first_response_minutes) < 0.01)
+        )
+        print(f"results match: {same}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.engine import engine_options, install_sqlite_pragmas
+from app.db.write_coordinator import WriteCoordinator
+from app.models import department, idempotency_key, job, message, model_log, ticket  # noqa: F401
+from app.schemas.ticket import ExternalTicketCreate
+from app.services.routing_service import _persist_external_ticket
+
+
+def _ticket(i: int) -> ExternalTicketCreate:
+    return ExternalTicketCreate(
+        subject=f"Bench ticket {i}",
+        description="Не работает интернет после грозы",
+        channel="email",
+        language="ru",
+        customer_email=f"user{i}@example.com",
+        request_type="problem",
+        category_code="CONNECTION_INTERNET",
+        priority="P3",
+        status="new",
+        department_code="TECH_SUPPORT",
+    )
+
+
+def _run(session_factory, writers: int, total: int, coordinator: WriteCoordinator | None) -> tuple[float, int]:
+    def write_direct(i: int) -> None:
+        db = session_factory()
+        try:
+            _persist_external_ticket(db, _ticket(i))
+            db.commit()
+        finally:
+            db.close()
+
+    def write_coordinated(i: int) -> None:
+        data = _ticket(i)
+        coordinator.run(lambda s: _persist_external_ticket(s, data))
+
+    write = write_coordinated if coordinator else write_direct
+    errors = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for future in [pool.submit(write, i) for i in range(total)]:
+            try:
+                future.result()
+            except Exception:
+                errors += 1
+    return time.perf_counter() - started, errors
+
+
+def main() -> None:
+    """Сравнение пропускной способности записи: commit на каждый тикет vs координатор записи.
+
+    Пишет тикеты во временный файл SQLite с теми же PRAGMA и пулом, что и приложение.
+    Запуск:
+        python -m app.cli.bench_writes --writers 16 --tickets 2000
+    """
+
+    parser = argparse.ArgumentParser(description="Concurrent write throughput benchmark")
+    parser.add_argument("--writers", type=int, default=16, help="Число конкурентных потоков")
+    parser.add_argument("--tickets", type=int, default=2000, help="Тикетов на каждый режим")
+    parser.add_argument("--window-ms", type=float, default=None, help="Окно группового commit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url, **engine_options(url))
+        install_sqlite_pragmas(engine)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+        # Прогрев: департамент и соединения пула
+        _run(session_factory, 1, 1, None)
+
+        elapsed, errors = _run(session_factory, args.writers, args.tickets, None)
+        print(
+            f"direct:      {args.tickets / elapsed:8.0f} tickets/s  "
+            f"elapsed={elapsed:.2f}s errors={errors}"
+        )
+
+        coordinator = WriteCoordinator(session_factory, window_ms=args.window_ms).start()
+        try:
+            elapsed, errors = _run(session_factory, args.writers, args.tickets, coordinator)
+        finally:
+            coordinator.stop()
+        print(
+            f"coordinator: {args.tickets / elapsed:8.0f} tickets/s  "
+            f"elapsed={elapsed:.2f}s errors={errors} "
+            f"batches={coordinator.batches} avg_batch={coordinator.units / max(coordinator.batches, 1):.1f}"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
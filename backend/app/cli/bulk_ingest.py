@@ -0,0 +1,44 @@
+import argparse
+import json
+import sys
+import time
+
+from app.db.session import SessionLocal
+from app.services.bulk_ingest import DEFAULT_BATCH_SIZE, ingest_ndjson
+
+
+def main() -> None:
+    """Массовая загрузка тикетов из NDJSON‑файла (формат как у POST /tickets/bulk).
+
+    Запуск:
+        python -m app.cli.bulk_ingest tickets.ndjson --batch-size 5000
+        cat tickets.ndjson | python -m app.cli.bulk_ingest -
+    """
+
+    parser = argparse.ArgumentParser(description="Bulk ticket ingest (NDJSON)")
+    parser.add_argument("path", help="Путь к NDJSON‑файлу или '-' для stdin")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        result = ingest_ndjson(db, source, batch_size=args.batch_size)
+    finally:
+        db.close()
+        if source is not sys.stdin:
+            source.close()
+    elapsed = time.perf_counter() - started
+
+    for error in result.errors:
+        print(json.dumps(error.model_dump(), ensure_ascii=False), file=sys.stderr)
+    rate = result.inserted / elapsed if elapsed > 0 else 0.0
+    print(
+        f"received={result.received} inserted={result.inserted} failed={result.failed} "
+        f"elapsed={elapsed:.2f}s rate={rate:.0f} tickets/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
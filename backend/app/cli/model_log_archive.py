@@ -0,0 +1,77 @@
+import argparse
+import json
+import sys
+from datetime import date
+
+from app.db.session import SessionLocal
+from app.models import department, message, model_log, ticket  # noqa: F401
+from app.services.model_log_archive import (
+    archive_model_logs,
+    backfill_classification_columns,
+    compress_legacy_payloads,
+    iter_archived_records,
+    restore_model_logs,
+)
+
+
+def main() -> None:
+    """Архив логов модели.
+
+    Запуск (например, из cron раз в сутки):
+        python -m app.cli.model_log_archive archive --days 30
+        python -m app.cli.model_log_archive compress
+        python -m app.cli.model_log_archive backfill-columns
+        python -m app.cli.model_log_archive export --from 2024-01-01 --to 2024-01-31 --ticket-id 42
+        python -m app.cli.model_log_archive restore --from 2024-01-01 --to 2024-01-31
+    """
+
+    parser = argparse.ArgumentParser(description="ModelLog retention and archive")
+    parser.add_argument("--archive-dir", default=None, help="По умолчанию MODEL_LOG_ARCHIVE_DIR")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="Перенести полезную нагрузку старых логов в архив")
+    archive.add_argument("--days", type=int, default=None, help="По умолчанию MODEL_LOG_RETENTION_DAYS")
+
+    commands.add_parser("compress", help="Сжать логи, сохранённые открытым текстом")
+    commands.add_parser("backfill-columns", help="Заполнить колонки классификации из JSON старых логов")
+
+    for name, help_text in (
+        ("export", "Вывести записи архива в stdout (NDJSON), не меняя БД"),
+        ("restore", "Вернуть полезную нагрузку из архива в model_logs"),
+    ):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None)
+        sub.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None)
+        sub.add_argument("--ticket-id", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for record in iter_archived_records(args.archive_dir, args.date_from, args.date_to, args.ticket_id):
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+
+    db = SessionLocal()
+    try:
+        if args.command == "archive":
+            count = archive_model_logs(db, older_than_days=args.days, archive_dir=args.archive_dir)
+            print(f"archived={count}")
+        elif args.command == "compress":
+            print(f"compressed={compress_legacy_payloads(db)}")
+        elif args.command == "backfill-columns":
+            print(f"backfilled={backfill_classification_columns(db)}")
+        else:
+            count = restore_model_logs(
+                db,
+                archive_dir=args.archive_dir,
+                date_from=args.date_from,
+                date_to=args.date_to,
+                ticket_id=args.ticket_id,
+            )
+            print(f"restored={count}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import time
+
+from app.db.session import SessionLocal
+from app.models import archive, classification_stats, department, message, model_log, ticket  # noqa: F401
+from app.services.classification_stats_service import rebuild_classification_stats
+
+
+def main() -> None:
+    """Пересборка матриц ошибок и калибровки классификации по model_logs и исправлениям операторов.
+
+    Запуск (при подозрении на расхождение или после восстановления логов из архива):
+        python -m app.cli.rebuild_classification_stats
+    """
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        counted = rebuild_classification_stats(db)
+    finally:
+        db.close()
+    print(f"classifications={counted} elapsed={time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
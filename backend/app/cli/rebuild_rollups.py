@@ -0,0 +1,27 @@
+import time
+
+from app.db.session import SessionLocal
+from app.models import archive, department, message, ticket, ticket_latency_sketch, ticket_rollup  # noqa: F401
+from app.services.rollup_service import rebuild_rollups
+
+
+def main() -> None:
+    """Пересборка ticket_rollups (дневные и часовые счётчики) и ticket_latency_sketches
+    (квантильные скетчи времени ответа и решения) по tickets и tickets_archive.
+
+    Запуск (после загрузки истории в обход API, backfill_conversation_state --all
+    или при подозрении на расхождение):
+        python -m app.cli.rebuild_rollups
+    """
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        rows, sketch_rows = rebuild_rollups(db)
+    finally:
+        db.close()
+    print(f"rollup_rows={rows} sketch_rows={sketch_rows} elapsed={time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
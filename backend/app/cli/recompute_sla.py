@@ -0,0 +1,28 @@
+import argparse
+
+from app.db.session import SessionLocal
+from app.models import department, message, ticket  # noqa: F401
+from app.services.sla_service import backfill_sla_deadlines
+
+
+def main() -> None:
+    """Проставляет сроки SLA тикетам без них; с --open пересчитывает и открытые.
+
+    Запуск (например, после изменения SLA_* в .env):
+        python -m app.cli.recompute_sla --open
+    """
+
+    parser = argparse.ArgumentParser(description="Backfill / recompute ticket SLA deadlines")
+    parser.add_argument("--open", action="store_true", help="Пересчитать сроки всех открытых тикетов")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = backfill_sla_deadlines(db, recompute_open=args.open)
+    finally:
+        db.close()
+    print(f"updated={count}")
+
+
+if __name__ == "__main__":
+    main()
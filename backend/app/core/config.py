@@ -12,12 +12,82 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str = "sqlite:///./helpdesk.db"
+    # Async-движок для API. Если не задан, выводится из database_url
+    # (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg).
+    async_database_url: str | None = None
+    # Реплика для чтения (аналитика, списки, FAQ). Пусто — всё читается с основной БД
+    database_read_url: str | None = None
+    # Допустимое отставание реплики, сек; при большем лаге или ошибке читаем с основной
+    read_replica_max_lag_seconds: float = 5.0
+    read_replica_check_interval_seconds: float = 5.0
+
+    # Пул соединений (Postgres и файловый SQLite)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+
+    # Профиль SQLite: API, бот и email-воркер работают с одним файлом БД
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
+    # Единственный писатель с групповым commit внутри процесса (имеет смысл для SQLite).
+    # Мимо него, своим commit, пишут: аренды очередей jobs и outbound_emails (claim,
+    # завершение, ошибка — ORM‑объекты задачи живут в сессии воркера) и обслуживание
+    # (очистка ключей идемпотентности, архивация, бэкфиллы, bulk‑ingest)
+    write_coordinator_enabled: bool = False
+    write_coordinator_window_ms: float = 5.0
+    write_coordinator_max_batch: int = 64
 
     # DeepSeek
     deepseek_api_key: str | None = None
     deepseek_base_url: AnyUrl | None = None
     deepseek_model: str = "deepseek-chat"
 
+    # Отложенная AI‑обработка: POST /tickets сохраняет тикет и ставит задачу в очередь (202)
+    ticket_ai_deferred: bool = False
+    job_worker_threads: int = 2
+    job_lease_seconds: int = 120
+    job_max_attempts: int = 5
+    job_retry_backoff_seconds: int = 10
+    job_poll_interval_seconds: float = 1.0
+
+    # Сколько последних сообщений отдаёт GET /tickets/{id} (остальные — через /tickets/{id}/messages)
+    ticket_details_messages_limit: int = 50
+
+    # Идемпотентность приёма обращений
+    idempotency_ttl_hours: int = 48
+    # Сколько держится резерв ключа, если обработка оборвалась (после — ключ можно занять снова)
+    idempotency_pending_seconds: int = 300
+
+    # Логи модели: сжатие полезной нагрузки и архивирование старых записей
+    model_log_compression_level: int = 6
+    model_log_retention_days: int = 30
+    model_log_archive_dir: str = "./archive/model_logs"
+
+    # Кэш /analytics/overview в процессе: TTL и сколько ещё отдавать устаревший снимок,
+    # пока в фоне идёт пересчёт. 0 — без кэша
+    analytics_overview_cache_ttl_seconds: float = 10.0
+    analytics_overview_stale_seconds: float = 60.0
+
+    # Потоковая выгрузка /export: строк в пачке серверного курсора и уровень gzip
+    export_batch_size: int = 1000
+    export_gzip_level: int = 6
+
+    # Архив закрытых тикетов (tickets_archive / messages_archive)
+    ticket_archive_after_days: int = 90
+    ticket_archive_batch_size: int = 500
+
+    # SLA: минуты до первого ответа и до решения по приоритету. Для департамента
+    # можно переопределить, например SLA_DEPARTMENT_RESOLUTION_MINUTES='{"billing": {"P1": 20}}'
+    sla_first_response_minutes: dict[str, int] = {"P1": 15, "P2": 30, "P3": 120, "P4": 480}
+    sla_resolution_minutes: dict[str, int] = {"P1": 30, "P2": 60, "P3": 240, "P4": 1440}
+    sla_department_first_response_minutes: dict[str, dict[str, int]] = {}
+    sla_department_resolution_minutes: dict[str, dict[str, int]] = {}
+
     # Telegram
     telegram_bot_token: str | None = None
 
@@ -30,6 +100,31 @@ class Settings(BaseSettings):
     email_username: str | None = None
     email_password: str | None = None
     email_from_name: str = "Kazakhtelecom HelpDesk"
+    # Воркер держит одно IMAP‑соединение и ждёт писем через IDLE (без IDLE на сервере — опрос).
+    # IDLE перезапускается раньше серверного таймаута (RFC 2177: не реже 29 мин);
+    # заодно в этот момент идёт страховочный поиск UNSEEN и авто‑закрытие тикетов
+    email_idle_enabled: bool = True
+    email_idle_timeout_seconds: float = 300.0
+    email_imap_timeout_seconds: float = 30.0
+    # Задержка переподключения: удваивается после каждой неудачи до максимума
+    email_reconnect_min_seconds: float = 1.0
+    email_reconnect_max_seconds: float = 300.0
+    # Писем в одном UID FETCH и сколько байт текстовой части тела забирать (вложения не качаются)
+    email_fetch_batch_size: int = 50
+    email_max_body_bytes: int = 256 * 1024
+    # Конвейер входящих писем: потоков AI‑стадии и ёмкость очередей между стадиями
+    email_pipeline_workers: int = 4
+    email_pipeline_queue_size: int = 100
+    # Исходящие ответы идут через очередь outbound_emails; отправитель держит одну SMTP‑сессию
+    # и переоткрывает её, если она простояла дольше email_smtp_idle_seconds
+    email_outbox_embedded_sender: bool = True
+    email_smtp_timeout_seconds: float = 30.0
+    email_smtp_idle_seconds: float = 60.0
+    email_outbox_batch_size: int = 20
+    email_outbox_poll_interval_seconds: float = 1.0
+    email_outbox_lease_seconds: int = 120
+    email_outbox_max_attempts: int = 8
+    email_outbox_retry_backoff_seconds: int = 30
 
     # CORS
     allowed_origins: list[str] = ["*"]
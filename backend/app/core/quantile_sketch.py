@@ -0,0 +1,55 @@
+"""Квантильный скетч с логарифмическими корзинами (по схеме DDSketch).
+
+Значение x > 0 попадает в корзину i = ceil(log_gamma(x)), gamma = (1 + a) / (1 - a).
+Оценка квантиля по корзине отличается от истинного значения не более чем на a
+(относительная погрешность). Скетч — это просто счётчики по корзинам, поэтому
+скетчи складываются (слияние по дням и разрезам) и из них можно вычитать
+(тикет переоткрыли или перенесли в другой департамент).
+"""
+
+import math
+from typing import Dict, Iterable
+
+# Относительная погрешность квантилей. Меняется только вместе с пересборкой
+# сохранённых скетчей (python -m app.cli.rebuild_rollups)
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+# Всё меньше секунды считается одной корзиной
+MIN_VALUE = 1.0
+
+
+def bucket_index(value: float) -> int:
+    return math.ceil(math.log(max(value, MIN_VALUE)) / _LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """Оценка значения корзины: середина (gamma^(i-1), gamma^i] в смысле относительной погрешности."""
+
+    if index <= 0:
+        return MIN_VALUE
+    return 2 * GAMMA**index / (GAMMA + 1)
+
+
+def merge(sketches: Iterable[Dict[int, int]]) -> Dict[int, int]:
+    merged: Dict[int, int] = {}
+    for sketch in sketches:
+        for index, count in sketch.items():
+            merged[index] = merged.get(index, 0) + count
+    return merged
+
+
+def quantile(sketch: Dict[int, int], q: float) -> float | None:
+    """q‑квантиль (0..1) по счётчикам корзин; None, если скетч пуст."""
+
+    buckets = sorted((index, count) for index, count in sketch.items() if count > 0)
+    total = sum(count for _, count in buckets)
+    if total == 0:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for index, count in buckets:
+        seen += count
+        if seen > rank:
+            return bucket_value(index)
+    return bucket_value(buckets[-1][0])
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple, Tuple
+
+from app.core.config import get_settings
+
+# Приоритет, чьи нормативы берутся для неизвестных значений (как и дефолт в модели тикета)
+FALLBACK_PRIORITY = "P3"
+
+
+class SlaPolicy(NamedTuple):
+    first_response_minutes: int
+    resolution_minutes: int
+
+
+def _minutes(policy: dict, overrides: dict, priority: str, department_code: str | None) -> int:
+    department_policy = overrides.get(department_code or "", {})
+    for key in (priority, FALLBACK_PRIORITY):
+        for source in (department_policy, policy):
+            if key in source:
+                return source[key]
+    raise ValueError(f"SLA policy has no entry for {priority} nor {FALLBACK_PRIORITY}")
+
+
+def sla_policy(priority: str, department_code: str | None = None) -> SlaPolicy:
+    """Нормативы SLA по приоритету; настройки департамента перекрывают общие."""
+
+    settings = get_settings()
+    return SlaPolicy(
+        first_response_minutes=_minutes(
+            settings.sla_first_response_minutes,
+            settings.sla_department_first_response_minutes,
+            priority,
+            department_code,
+        ),
+        resolution_minutes=_minutes(
+            settings.sla_resolution_minutes,
+            settings.sla_department_resolution_minutes,
+            priority,
+            department_code,
+        ),
+    )
+
+
+def has_department_policies() -> bool:
+    settings = get_settings()
+    return bool(settings.sla_department_first_response_minutes or settings.sla_department_resolution_minutes)
+
+
+def sla_deadlines(
+    created_at: datetime, priority: str, department_code: str | None = None
+) -> Tuple[datetime, datetime]:
+    """(first_response_due_at, sla_due_at) для тикета."""
+
+    policy = sla_policy(priority, department_code)
+    return (
+        created_at + timedelta(minutes=policy.first_response_minutes),
+        created_at + timedelta(minutes=policy.resolution_minutes),
+    )
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.db.engine import engine_options, install_sqlite_pragmas, is_sqlite
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Преобразует sync-строку подключения в строку для async-драйвера."""
+
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return url
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def _create_async_engine(url: str):
+    engine = create_async_engine(url, **engine_options(url, is_async=True))
+    if is_sqlite(url):
+        install_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+async_database_url = settings.async_database_url or to_async_url(settings.database_url)
+
+# Отдельный модуль, чтобы бот и email-воркер, работающие через sync SessionLocal,
+# не требовали установленных async-драйверов.
+async_engine = _create_async_engine(async_database_url)
+
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Реплика для чтения (DATABASE_READ_URL). Используется только read-only эндпоинтами,
+# которые терпят отставание данных на read_replica_max_lag_seconds.
+async_read_engine = (
+    _create_async_engine(to_async_url(settings.database_read_url)) if settings.database_read_url else None
+)
+AsyncReadSessionLocal = (
+    sessionmaker(
+        bind=async_read_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    if async_read_engine is not None
+    else None
+)
+
+# Лаг реплики Postgres в секундах. Если всё полученное WAL уже применено, лаг 0,
+# иначе pg_last_xact_replay_timestamp() на простаивающей основной БД давал бы ложный лаг.
+_PG_REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+class _ReplicaState:
+    checked_at: float = float("-inf")
+    usable: bool = False
+    lock: asyncio.Lock | None = None
+
+
+_replica = _ReplicaState()
+
+
+async def _probe_replica() -> bool:
+    try:
+        async with async_read_engine.connect() as conn:
+            if async_read_engine.dialect.name != "postgresql":
+                await conn.execute(text("SELECT 1"))
+                return True
+            lag = (await conn.execute(_PG_REPLICA_LAG_SQL)).scalar()
+    except Exception:
+        logger.warning("Read replica is unavailable, reading from primary", exc_info=True)
+        return False
+
+    lag = float(lag or 0)
+    if lag > settings.read_replica_max_lag_seconds:
+        logger.warning("Read replica lag %.1fs exceeds tolerance, reading from primary", lag)
+        return False
+    return True
+
+
+async def read_replica_usable() -> bool:
+    """Можно ли сейчас читать с реплики. Проверка кэшируется на read_replica_check_interval_seconds."""
+
+    if AsyncReadSessionLocal is None:
+        return False
+    if time.monotonic() - _replica.checked_at < settings.read_replica_check_interval_seconds:
+        return _replica.usable
+
+    if _replica.lock is None:
+        _replica.lock = asyncio.Lock()
+    async with _replica.lock:
+        # Пока ждали блокировку, проверку мог выполнить другой запрос
+        if time.monotonic() - _replica.checked_at >= settings.read_replica_check_interval_seconds:
+            _replica.usable = await _probe_replica()
+            _replica.checked_at = time.monotonic()
+    return _replica.usable
+
+
+async def read_session_factory() -> sessionmaker:
+    """Фабрика сессий для чтения: реплика, если она настроена и не отстаёт, иначе основная БД.
+
+    Для кода, которому сессия нужна дольше запроса (фоновый пересчёт, потоковая выгрузка).
+    """
+
+    return AsyncReadSessionLocal if await read_replica_usable() else AsyncSessionLocal
+
+
+async def get_async_read_db():
+    """Сессия для read-only запросов: реплика, если она настроена и не отстаёт, иначе основная БД."""
+
+    async with (await read_session_factory())() as db:
+        yield db
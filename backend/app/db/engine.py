@@ -0,0 +1,114 @@
+import logging
+from typing import Any, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_sqlite_file(url: str) -> bool:
+    database = make_url(url).database
+    return bool(database) and database != ":memory:" and not database.startswith("file::memory:")
+
+
+def engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """Параметры create_engine/create_async_engine для заданной строки подключения."""
+
+    settings = get_settings()
+    pool_options: Dict[str, Any] = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+    }
+
+    if not is_sqlite(url):
+        return {
+            **pool_options,
+            "pool_recycle": settings.db_pool_recycle,
+            "pool_pre_ping": settings.db_pool_pre_ping,
+        }
+
+    options: Dict[str, Any] = {}
+    if not is_async:
+        options["connect_args"] = {"check_same_thread": False}
+    if _is_sqlite_file(url):
+        # По умолчанию SQLAlchemy 1.4 открывает файл SQLite заново на каждый checkout (NullPool),
+        # и кэш страниц/mmap теряются. Держим соединения в пуле.
+        options["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+        options.update(pool_options)
+    return options
+
+
+def sqlite_pragmas() -> List[str]:
+    settings = get_settings()
+    return [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}",
+        f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}",
+        # Отрицательное значение — размер в KiB, а не в страницах
+        f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}",
+    ]
+
+
+def install_sqlite_pragmas(engine: Engine) -> None:
+    """Выставляет PRAGMA на каждое новое соединение SQLite (для async — передать engine.sync_engine)."""
+
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def begin_sqlite_write(session: Session) -> None:
+    """Открывает транзакцию записи явным BEGIN IMMEDIATE, если сессия работает с SQLite.
+
+    pysqlite сам шлёт BEGIN только перед INSERT/UPDATE/DELETE, но не перед
+    SAVEPOINT: без этого каждый RELEASE внешнего SAVEPOINT фиксируется сразу,
+    и несколько begin_nested() подряд не складываются в один commit.
+    IMMEDIATE берёт блокировку записи сразу, а не при первой записи после чтения.
+    """
+
+    if session.get_bind().dialect.name == "sqlite":
+        session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def log_engine_settings(name: str, engine: Engine, read_pragmas: bool = True) -> None:
+    """Пишет в лог фактические настройки движка (для SQLite — значения PRAGMA из соединения).
+
+    Для async-движка передавайте engine.sync_engine и read_pragmas=False:
+    sync-соединение с него вне greenlet не открыть.
+    """
+
+    pool = engine.pool
+    logger.info(
+        "%s engine: url=%r pool=%s size=%s overflow=%s",
+        name,
+        engine.url,
+        type(pool).__name__,
+        getattr(pool, "size", lambda: None)(),
+        getattr(pool, "_max_overflow", None),
+    )
+    if engine.dialect.name != "sqlite" or not read_pragmas:
+        return
+    with engine.connect() as conn:
+        effective = {
+            pragma: conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size")
+        }
+    logger.info("%s SQLite pragmas: %s", name, effective)
@@ -0,0 +1,51 @@
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+
+from app.db.base import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _column_ddl(column, dialect) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        if isinstance(default, str):
+            default = "'" + default.replace("'", "''") + "'"
+        ddl += f" DEFAULT {default}"
+    return ddl
+
+
+def run_additive_migrations(engine: Engine) -> None:
+    """Докатывает аддитивные изменения схемы на существующую БД.
+
+    create_all создаёт только отсутствующие таблицы, поэтому новые колонки и
+    индексы в уже существующих таблицах добавляем здесь. Новые колонки должны
+    быть nullable или иметь server_default.
+    """
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                logger.info("Adding column %s.%s", table.name, column.name)
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, engine.dialect)}"
+                )
+
+            existing_indexes = {idx["name"] for idx in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                logger.info("Creating index %s", index.name)
+                index.create(bind=conn, checkfirst=True)
@@ -2,13 +2,13 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import get_settings
+from app.db.engine import engine_options, install_sqlite_pragmas, is_sqlite
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {},
-)
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
+if is_sqlite(settings.database_url):
+    install_sqlite_pragmas(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -19,4 +19,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import get_settings
+from app.db.engine import begin_sqlite_write
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+# Единица записи: получает сессию писателя и возвращает простые значения (id и т.п.),
+# а не ORM‑объекты — они принадлежат чужой сессии и другому потоку.
+WriteUnit = Callable[[Session], T]
+
+_STOP = object()
+
+
+class WriteCoordinator:
+    """Единственный писатель с групповым commit.
+
+    Потоки процесса отправляют единицы записи в очередь; поток‑писатель
+    собирает их в пачку в течение короткого окна, выполняет каждую в своём
+    SAVEPOINT и фиксирует всю пачку одним commit. Ошибка единицы откатывает
+    только её SAVEPOINT, ошибка commit — всю пачку.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        window_ms: float | None = None,
+        max_batch: int | None = None,
+    ):
+        settings = get_settings()
+        self._session_factory = session_factory
+        self._window = (window_ms if window_ms is not None else settings.write_coordinator_window_ms) / 1000.0
+        self._max_batch = max_batch or settings.write_coordinator_max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.units = 0
+
+    def start(self) -> "WriteCoordinator":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, unit: WriteUnit[T]) -> "Future[T]":
+        future: "Future[T]" = Future()
+        self._queue.put((unit, future))
+        return future
+
+    def run(self, unit: WriteUnit[T]) -> T:
+        return self.submit(unit).result()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: List[Tuple[WriteUnit, Future]]) -> None:
+        session = self._session_factory()
+        done: List[Tuple[Future, object]] = []
+        try:
+            begin_sqlite_write(session)
+            for unit, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        done.append((future, unit(session)))
+                except Exception as exc:
+                    future.set_exception(exc)
+            session.commit()
+        except Exception as exc:
+            logger.exception("Group commit of %s write units failed", len(done))
+            session.rollback()
+            for future, _ in done:
+                future.set_exception(exc)
+        else:
+            self.batches += 1
+            self.units += len(done)
+            for future, result in done:
+                future.set_result(result)
+        finally:
+            session.close()
+
+
+_coordinator: Optional[WriteCoordinator] = None
+_coordinator_lock = threading.Lock()
+
+
+def get_write_coordinator() -> Optional[WriteCoordinator]:
+    """Координатор процесса, если включён WRITE_COORDINATOR_ENABLED (иначе None)."""
+
+    global _coordinator
+    if _coordinator is None and get_settings().write_coordinator_enabled:
+        with _coordinator_lock:
+            if _coordinator is None:
+                _coordinator = WriteCoordinator().start()
+    return _coordinator
+
+
+def set_write_coordinator(coordinator: Optional[WriteCoordinator]) -> Optional[WriteCoordinator]:
+    """Подменяет координатор процесса (для бенчмарков). Возвращает предыдущий."""
+
+    global _coordinator
+    with _coordinator_lock:
+        previous, _coordinator = _coordinator, coordinator
+    return previous
+
+
+def execute_write(db: Session, unit: WriteUnit[T]) -> T:
+    """Выполняет единицу записи и фиксирует её.
+
+    Без координатора — прямо в сессии вызывающего кода с commit. С координатором —
+    через поток‑писатель; транзакция вызывающей сессии при этом закрывается
+    (rollback), чтобы последующие чтения увидели записанные данные, а не старый
+    снимок WAL. Поэтому в режиме координатора вся запись должна идти через единицы.
+    Исключения (пишут своим commit) перечислены у write_coordinator_enabled в настройках.
+    """
+
+    coordinator = get_write_coordinator()
+    if coordinator is None:
+        result = unit(db)
+        db.commit()
+        return result
+
+    result = coordinator.run(unit)
+    db.rollback()
+    return result
+
+
+async def execute_write_async(db: AsyncSession, unit: WriteUnit[T]) -> T:
+    coordinator = get_write_coordinator()
+    if coordinator is None:
+        result = await db.run_sync(unit)
+        await db.commit()
+        return result
+
+    result = await asyncio.wrap_future(coordinator.submit(unit))
+    await db.rollback()
+    return result
@@ -0,0 +1,194 @@
+"""Конвейер обработки входящих писем: fetch -> parse -> AI‑маршрутизация -> ответ.
+
+fetch идёт в потоке IMAP‑соединения (imaplib не потокобезопасен), parse — в
+отдельном потоке, AI‑маршрутизация — в пуле из email_pipeline_workers потоков,
+у каждого своя сессия БД. Очереди между стадиями ограничены, поэтому при
+медленной модели fetch ждёт, а не копит письма в памяти. Ответ ставится в
+очередь outbound_emails и уходит через email_sender.
+
+Письма с одним ключом (тикет [HD-N], иначе Message-ID) всегда попадают в один
+поток AI‑стадии: ответы в одной переписке обрабатываются по порядку и никогда
+не параллельно.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.integrations.imap_fetch import FetchedEmail
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class ParsedEmail:
+    uid: int
+    from_name: str
+    from_address: str
+    subject: str
+    body: str
+    message_id: str
+    ticket_id: int | None
+
+    @property
+    def ordering_key(self) -> str | None:
+        if self.ticket_id is not None:
+            return f"ticket:{self.ticket_id}"
+        if self.message_id:
+            return f"message:{self.message_id}"
+        return None
+
+
+class StageMetrics:
+    """Пропускная способность стадии: сколько писем, ошибок и чистого времени работы."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, items: int = 1, failures: int = 0) -> None:
+        with self._lock:
+            self.items += items
+            self.failures += failures
+            self.busy_seconds += seconds
+
+    def summary(self, wall_seconds: float) -> str:
+        rate = self.items / wall_seconds if wall_seconds > 0 else 0.0
+        average_ms = self.busy_seconds * 1000 / self.items if self.items else 0.0
+        return (
+            f"{self.name}: items={self.items} failed={self.failures} "
+            f"busy={self.busy_seconds:.2f}s avg={average_ms:.0f}ms rate={rate:.1f}/s"
+        )
+
+
+class EmailPipeline:
+    """Стадии parse и AI‑маршрутизации в фоновых потоках; fetch вызывает submit().
+
+    Результаты (uid, успех) забираются через completed() в потоке IMAP, где
+    ставятся флаги \\Seen и сдвигается checkpoint.
+    """
+
+    def __init__(
+        self,
+        parse: Callable[[FetchedEmail], ParsedEmail],
+        route: Callable[[Session, ParsedEmail], None],
+        session_factory: Callable[[], Session],
+        workers: int,
+        queue_size: int,
+    ) -> None:
+        self._parse = parse
+        self._route = route
+        self._session_factory = session_factory
+        self._started = time.monotonic()
+        self.metrics = {name: StageMetrics(name) for name in ("fetch", "parse", "route")}
+
+        workers = max(workers, 1)
+        self._parse_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._route_queues = [queue.Queue(maxsize=max(queue_size // workers, 1)) for _ in range(workers)]
+        self._results: queue.Queue = queue.Queue()
+        # Письма без ключа раскладываются по потокам по кругу
+        self._round_robin = itertools.cycle(range(workers))
+
+        self._threads = [threading.Thread(target=self._parse_loop, name="email-parse", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._route_loop, args=(route_queue,), name=f"email-route-{n}", daemon=True)
+            for n, route_queue in enumerate(self._route_queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fetched: FetchedEmail) -> None:
+        """Передаёт письмо в parse; блокируется, пока очередь заполнена."""
+
+        self._parse_queue.put(fetched)
+
+    def record_fetch(self, seconds: float, items: int) -> None:
+        self.metrics["fetch"].record(seconds, items=items)
+
+    def completed(self) -> List[Tuple[int, bool]]:
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self, cancel: bool = False) -> None:
+        """Дожидается обработки переданных писем. cancel — выбросить ещё не начатые.
+
+        Выброшенные письма остаются непрочитанными и без сдвига checkpoint,
+        поэтому будут взяты снова.
+        """
+
+        if cancel:
+            for pending in [self._parse_queue, *self._route_queues]:
+                while True:
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        break
+        self._parse_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def log_metrics(self) -> None:
+        if not self.metrics["fetch"].items:
+            return
+        wall = time.monotonic() - self._started
+        logger.info(
+            "Email pipeline %.2fs; %s",
+            wall,
+            "; ".join(stage.summary(wall) for stage in self.metrics.values()),
+        )
+
+    def _parse_loop(self) -> None:
+        while True:
+            fetched = self._parse_queue.get()
+            if fetched is _STOP:
+                for route_queue in self._route_queues:
+                    route_queue.put(_STOP)
+                return
+            started = time.monotonic()
+            try:
+                parsed = self._parse(fetched)
+            except Exception:
+                logger.exception("Failed to parse email uid=%s", fetched.uid)
+                self.metrics["parse"].record(time.monotonic() - started, failures=1)
+                self._results.put((fetched.uid, False))
+                continue
+            self.metrics["parse"].record(time.monotonic() - started)
+
+            key = parsed.ordering_key
+            index = hash(key) % len(self._route_queues) if key else next(self._round_robin)
+            self._route_queues[index].put(parsed)
+
+    def _route_loop(self, route_queue: queue.Queue) -> None:
+        db = self._session_factory()
+        try:
+            while True:
+                parsed = route_queue.get()
+                if parsed is _STOP:
+                    return
+                started = time.monotonic()
+                try:
+                    self._route(db, parsed)
+                    ok = True
+                except Exception:
+                    logger.exception("Failed to process email uid=%s", parsed.uid)
+                    db.rollback()
+                    ok = False
+                self.metrics["route"].record(time.monotonic() - started, failures=0 if ok else 1)
+                self._results.put((parsed.uid, ok))
+        finally:
+            db.close()
@@ -0,0 +1,215 @@
+import logging
+import os
+import smtplib
+import socket
+import threading
+import time
+from email.message import EmailMessage
+
+from app.core.config import get_settings
+from app.db.engine import log_engine_settings
+from app.db.migrations import run_additive_migrations
+from app.db.session import SessionLocal, engine
+from app.models.outbound_email import OutboundEmail
+from app.services.mail_outbox import claim_emails, fail_email, mark_sent, release_emails, renew_lease
+
+logger = logging.getLogger(__name__)
+
+
+class SmtpSession:
+    """Одна аутентифицированная SMTP‑сессия на много писем.
+
+    Серверы закрывают простаивающие соединения, поэтому сессия, простоявшая
+    дольше email_smtp_idle_seconds, перед отправкой открывается заново.
+    """
+
+    def __init__(self) -> None:
+        self.smtp: smtplib.SMTP | None = None
+        self.last_used = 0.0
+
+    def _connect(self) -> None:
+        settings = get_settings()
+        smtp = smtplib.SMTP(
+            settings.email_smtp_host, settings.email_smtp_port, timeout=settings.email_smtp_timeout_seconds
+        )
+        try:
+            smtp.starttls()
+            smtp.login(settings.email_username, settings.email_password)
+        except Exception:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+    def idle_expired(self) -> bool:
+        return self.smtp is not None and time.monotonic() - self.last_used > get_settings().email_smtp_idle_seconds
+
+    def send(self, message: EmailMessage) -> None:
+        if self.idle_expired():
+            self.close()
+        if self.smtp is None:
+            self._connect()
+        try:
+            self.smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Сервер закрыл соединение раньше нашего таймаута — одна попытка на новой сессии
+            self.close()
+            self._connect()
+            self.smtp.send_message(message)
+        except Exception as exc:
+            if is_connection_failure(exc):
+                self.close()
+            raise
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+        self.smtp = None
+
+
+def is_connection_failure(exc: Exception) -> bool:
+    """Ошибка соединения или сессии (сеть, TLS, вход, отказ отправителю), а не конкретного письма."""
+
+    if isinstance(exc, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+        return False
+    return isinstance(exc, OSError)
+
+
+def is_permanent_failure(exc: Exception) -> bool:
+    """Письмо не уйдёт и при повторе: все адресаты или само письмо отвергнуты с кодом 5xx."""
+
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPDataError):
+        return exc.smtp_code >= 500
+    # Письмо не удалось даже собрать (например, некорректный адрес)
+    return not isinstance(exc, OSError)
+
+
+def build_message(outbound: OutboundEmail) -> EmailMessage:
+    settings = get_settings()
+    msg = EmailMessage()
+    from_display = settings.email_from_name or settings.email_username
+    msg["From"] = f"{from_display} <{settings.email_username}>"
+    msg["To"] = outbound.to_address
+    msg["Subject"] = outbound.subject
+    # Message-ID сохранён при постановке в очередь (или при захвате старого письма):
+    # повтор после обрыва уходит с тем же идентификатором
+    msg["Message-ID"] = outbound.message_id
+    msg.set_content(outbound.body)
+    return msg
+
+
+def send_batch(session: SmtpSession, sender_id: str) -> tuple[int, bool]:
+    """Захватывает и отправляет пачку писем одной сессией.
+
+    Возвращает (число захваченных писем, была ли ошибка соединения). При ошибке
+    соединения оставшиеся письма пачки возвращаются в очередь без траты попытки.
+    """
+
+    settings = get_settings()
+    db = SessionLocal()
+    started = time.monotonic()
+    sent = 0
+    try:
+        emails = claim_emails(db, sender_id, settings.email_outbox_batch_size)
+        for position, outbound in enumerate(emails):
+            # Аренда на всю пачку могла истечь на медленном SMTP — продлеваем перед каждым письмом
+            if not renew_lease(db, outbound):
+                logger.warning("Lease on outbound email %s expired; it was taken by another sender", outbound.id)
+                continue
+            try:
+                session.send(build_message(outbound))
+            except Exception as exc:
+                permanent = is_permanent_failure(exc)
+                if permanent:
+                    logger.error("Outbound email %s is dead: %r", outbound.id, exc)
+                else:
+                    logger.warning("Outbound email %s failed on attempt %s: %r", outbound.id, outbound.attempts, exc)
+                if not fail_email(db, outbound, repr(exc), permanent=permanent):
+                    logger.warning("Lease on outbound email %s was lost before recording the failure", outbound.id)
+                if is_connection_failure(exc):
+                    release_emails(db, emails[position + 1 :])
+                    return len(emails), True
+                continue
+            if not mark_sent(db, outbound):
+                logger.warning("Lease on outbound email %s was lost during sending; it may be sent twice", outbound.id)
+            sent += 1
+        return len(emails), False
+    finally:
+        if sent:
+            # Пропускная способность стадии ответа (см. email_pipeline)
+            logger.info("Sent %s of %s emails in %.2fs", sent, len(emails), time.monotonic() - started)
+        db.close()
+
+
+def run_sender(stop: threading.Event, sender_id: str | None = None) -> None:
+    """Цикл отправки очереди outbound_emails; при ошибках соединения — экспоненциальная пауза."""
+
+    settings = get_settings()
+    sender_id = sender_id or f"{socket.gethostname()}:{os.getpid()}:smtp"
+    session = SmtpSession()
+    backoff = settings.email_reconnect_min_seconds
+    try:
+        while not stop.is_set():
+            if not (settings.email_username and settings.email_password):
+                logger.warning("Email credentials are not configured; outbound queue is not drained")
+                stop.wait(settings.email_reconnect_max_seconds)
+                continue
+            try:
+                sent, connection_failed = send_batch(session, sender_id)
+            except Exception:
+                logger.exception("Error while draining outbound email queue")
+                sent, connection_failed = 0, True
+            if connection_failed:
+                stop.wait(backoff)
+                backoff = min(backoff * 2, settings.email_reconnect_max_seconds)
+                continue
+            backoff = settings.email_reconnect_min_seconds
+            if not sent:
+                if session.idle_expired():
+                    session.close()
+                stop.wait(settings.email_outbox_poll_interval_seconds)
+    finally:
+        session.close()
+
+
+def start_sender_thread() -> threading.Event:
+    """Отправитель в фоновом потоке (встроенный режим email‑воркера). Возвращает событие остановки."""
+
+    stop = threading.Event()
+    threading.Thread(target=run_sender, args=(stop,), name="email-sender", daemon=True).start()
+    return stop
+
+
+def main_loop() -> None:
+    """Отдельный процесс отправки писем из очереди.
+
+    Запуск:
+        python -m app.integrations.email_sender
+    """
+
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        level=logging.INFO,
+    )
+    log_engine_settings("sync", engine)
+    # Таблица и новые колонки (message_id) могли ещё не создаться, если API не перезапускали
+    OutboundEmail.__table__.create(bind=engine, checkfirst=True)
+    run_additive_migrations(engine)
+    logger.info("Starting email sender")
+    stop = threading.Event()
+    try:
+        run_sender(stop)
+    except KeyboardInterrupt:
+        logger.info("Stopping email sender")
+        stop.set()
+
+
+if __name__ == "__main__":
+    main_loop()
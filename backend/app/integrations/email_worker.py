@@ -2,20 +2,40 @@ import email
 import imaplib
 import logging
 import re
-import smtplib
+import select
+import ssl
 import time
 from email.header import decode_header, make_header
-from email.message import EmailMessage
 from typing import Optional
 
 from datetime import datetime, timedelta
 
 from app.ai.answer_generator import generate_answer
 from app.core.config import get_settings
-from app.db.session import SessionLocal
-from app.models.message import AuthorType, Message as DbMessage
+from app.db.engine import log_engine_settings
+from app.db.migrations import run_additive_migrations
+from app.db.session import SessionLocal, engine
+from app.db.write_coordinator import execute_write
+from app.integrations.email_pipeline import EmailPipeline, ParsedEmail
+from app.integrations.email_sender import start_sender_thread
+from app.integrations.imap_fetch import (
+    FetchedEmail,
+    MailboxStatus,
+    decode_email,
+    fetch_emails,
+    mark_seen,
+    search_new_uids,
+    select_inbox,
+)
+from app.models.mailbox_checkpoint import MailboxCheckpoint
+from app.models.outbound_email import OutboundEmail
+from app.models.message import AuthorType
 from app.models.ticket import Ticket, TicketStatus
+from app.services.department_registry import warm_department_cache
+from app.services.idempotency_service import SCOPE_IMAP, purge_expired_keys, run_idempotent
+from app.services.mail_outbox import enqueue_email
 from app.services.routing_service import continue_telegram_ticket, process_new_ticket
+from app.services.ticket_service import add_ticket_message, latest_ai_message
 from app.schemas.ticket import TicketCreate
 
 logger = logging.getLogger(__name__)
@@ -112,26 +132,6 @@ def _decode_mime_header(value: Optional[str]) -> str:
         return value
 
 
-def _extract_plain_text(msg: email.message.Message) -> str:
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            disposition = (part.get("Content-Disposition") or "").lower()
-            if content_type == "text/plain" and "attachment" not in disposition:
-                charset = part.get_content_charset() or "utf-8"
-                try:
-                    return part.get_payload(decode=True).decode(charset, errors="replace")
-                except Exception:
-                    continue
-    else:
-        charset = msg.get_content_charset() or "utf-8"
-        try:
-            return msg.get_payload(decode=True).decode(charset, errors="replace")
-        except Exception:
-            return msg.get_payload()
-    return ""
-
-
 def _detect_language(text: str, fallback: str = "ru") -> str:
     has_cyrillic = any("а" <= ch <= "я" or "А" <= ch <= "Я" for ch in text)
     kazakh_chars = set("әіңғүұқөһӘІҢҒҮҰҚӨҺ")
@@ -162,27 +162,21 @@ def _build_reply_subject(original_subject: str, ticket_id: int) -> str:
     return f"Re: {original_subject} {tag}".strip()
 
 
-def _send_email_reply(
+def _queue_email_reply(
+    db,
     to_address: str,
     subject: str,
     body: str,
+    ticket_id: int | None = None,
 ) -> None:
+    """Ставит ответ в очередь outbound_emails; отправляет его app.integrations.email_sender."""
+
     settings = get_settings()
     if not settings.email_username or not settings.email_password:
         logger.warning("Email credentials are not configured; reply is skipped")
         return
 
-    msg = EmailMessage()
-    from_display = settings.email_from_name or settings.email_username
-    msg["From"] = f"{from_display} <{settings.email_username}>"
-    msg["To"] = to_address
-    msg["Subject"] = subject
-    msg.set_content(body)
-
-    with smtplib.SMTP(settings.email_smtp_host, settings.email_smtp_port) as smtp:
-        smtp.starttls()
-        smtp.login(settings.email_username, settings.email_password)
-        smtp.send_message(msg)
+    execute_write(db, lambda s: enqueue_email(s, to_address, subject, body, ticket_id=ticket_id))
 
 
 def _handle_new_email_message(
@@ -191,18 +185,18 @@ def _handle_new_email_message(
     subject: str,
     body: str,
     from_name: str | None = None,
-) -> None:
+) -> Ticket | None:
     settings = get_settings()
 
     if from_address.lower() == (settings.email_username or "").lower():
         # Это наше собственное письмо — не создаём тикет
-        return
+        return None
 
     local_part = (from_address.split("@", 1)[0] or "").lower()
     if local_part in SYSTEM_SENDER_PREFIXES:
         # Системные письма (bounce/уведомления) пропускаем и не отвечаем на них
         logger.info("Skip system email from %s", from_address)
-        return
+        return None
 
     ticket_id = _parse_ticket_id_from_subject(subject)
     language = _detect_language(body or subject or "")
@@ -217,24 +211,18 @@ def _handle_new_email_message(
                 message_text=body,
                 language=language,
             )
-            # Находим последний AI‑ответ, чтобы отправить его по почте
-            ai_message = (
-                db.query(DbMessage)
-                .filter(
-                    DbMessage.ticket_id == updated_ticket.id,
-                    DbMessage.author_type == AuthorType.AI.value,
-                )
-                .order_by(DbMessage.created_at.desc())
-                .first()
-            )
+            # Отправляем по почте AI‑ответ, если он только что добавлен
+            ai_message = latest_ai_message(db, updated_ticket)
             if ai_message:
                 reply_subject = _build_reply_subject(subject, updated_ticket.id)
-                _send_email_reply(
+                _queue_email_reply(
+                    db,
                     to_address=from_address,
                     subject=reply_subject,
                     body=ai_message.body,
+                    ticket_id=updated_ticket.id,
                 )
-            return
+            return updated_ticket
 
     # Новый тикет из письма
     request_text = f"{subject or ''}\n\n{body or ''}"
@@ -252,15 +240,7 @@ def _handle_new_email_message(
     ticket = process_new_ticket(db, ticket_in)
 
     # Проверяем, есть ли авто‑ответ от модели при авто‑закрытии
-    ai_message = (
-        db.query(DbMessage)
-        .filter(
-            DbMessage.ticket_id == ticket.id,
-            DbMessage.author_type == AuthorType.AI.value,
-        )
-        .order_by(DbMessage.created_at.desc())
-        .first()
-    )
+    ai_message = latest_ai_message(db, ticket)
 
     if ai_message:
         answer_text = ai_message.body
@@ -273,14 +253,9 @@ def _handle_new_email_message(
             faq_snippet=None,
             request_type=ticket.request_type,
         )
-        ai_message = DbMessage(
-            ticket_id=ticket.id,
-            author_type=AuthorType.AI.value,
-            body=suggestion.answer,
-            language=suggestion.answer_language,
+        add_ticket_message(
+            db, ticket.id, AuthorType.AI.value, suggestion.answer, suggestion.answer_language
         )
-        db.add(ai_message)
-        db.commit()
         answer_text = suggestion.answer
 
     reply_subject = _build_reply_subject(subject, ticket.id)
@@ -296,19 +271,22 @@ def _handle_new_email_message(
         prefix = "Ваш запрос обработан. Мы предлагаем вам следующее решение:\n\n"
     reply_body = prefix + (answer_text or "")
 
-    _send_email_reply(
+    _queue_email_reply(
+        db,
         to_address=from_address,
         subject=reply_subject,
         body=reply_body,
+        ticket_id=ticket.id,
     )
+    return ticket
 
 
 def _auto_close_stale_email_tickets(db, inactivity_minutes: int = 60) -> None:
     """Авто‑закрытие email‑тикетов при отсутствии новых писем от клиента.
 
-    Логика:
+    Логика (по состоянию диалога в самом тикете, без запросов к messages):
     - берём тикеты канала email, которые ещё не закрыты;
-    - находим последнее сообщение клиента и последнее сообщение оператора/ИИ;
+    - смотрим время последнего сообщения клиента и автора последнего сообщения;
     - если последнее сообщение в тикете не от клиента (то есть мы уже ответили)
       и с момента последнего сообщения клиента прошло больше inactivity_minutes,
       считаем, что диалог можно закрыть автоматически.
@@ -316,114 +294,389 @@ def _auto_close_stale_email_tickets(db, inactivity_minutes: int = 60) -> None:
 
     threshold = datetime.utcnow() - timedelta(minutes=inactivity_minutes)
 
-    open_tickets = (
-        db.query(Ticket)
-        .filter(
+    stale_ids = [
+        ticket_id
+        for (ticket_id,) in db.query(Ticket.id).filter(
             Ticket.channel == "email",
             Ticket.status.in_([TicketStatus.NEW.value, TicketStatus.IN_PROGRESS.value]),
+            Ticket.last_customer_message_at <= threshold,
+            Ticket.last_message_author_type != AuthorType.CUSTOMER.value,
         )
-        .all()
+    ]
+
+    if stale_ids:
+        execute_write(db, lambda s: _mark_auto_closed(s, stale_ids))
+    else:
+        db.commit()
+
+
+def _mark_auto_closed(db, ticket_ids: list[int]) -> None:
+    now = datetime.utcnow()
+    for ticket in db.query(Ticket).filter(Ticket.id.in_(ticket_ids)):
+        ticket.status = TicketStatus.AUTO_CLOSED.value
+        ticket.auto_closed_by_ai = True
+        ticket.closed_at = now
+        ticket.status_updated_at = now
+
+
+def _email_configured() -> bool:
+    settings = get_settings()
+    return bool(settings.email_enabled and settings.email_username and settings.email_password)
+
+
+def _connect() -> tuple[imaplib.IMAP4_SSL, MailboxStatus]:
+    """Новое IMAP‑соединение: вход и выбор INBOX."""
+
+    settings = get_settings()
+    mail = imaplib.IMAP4_SSL(
+        settings.email_imap_host, settings.email_imap_port, timeout=settings.email_imap_timeout_seconds
+    )
+    try:
+        mail.login(settings.email_username, settings.email_password)
+        status = select_inbox(mail)
+    except Exception:
+        _logout(mail)
+        raise
+    return mail, status
+
+
+def _logout(mail: imaplib.IMAP4_SSL) -> None:
+    try:
+        mail.logout()
+    except Exception:
+        pass
+
+
+def _checkpoint_mailbox() -> str:
+    return f"{get_settings().email_username}/INBOX"
+
+
+def _save_checkpoint(db, mailbox: str, uid_validity: int, last_uid: int) -> None:
+    checkpoint = db.query(MailboxCheckpoint).filter(MailboxCheckpoint.mailbox == mailbox).one_or_none()
+    if checkpoint is None:
+        db.add(MailboxCheckpoint(mailbox=mailbox, uid_validity=uid_validity, last_uid=last_uid))
+    else:
+        checkpoint.uid_validity = uid_validity
+        checkpoint.last_uid = last_uid
+
+
+def _parse_fetched_email(fetched: FetchedEmail) -> ParsedEmail:
+    headers, body = decode_email(fetched)
+    subject = _decode_mime_header(headers.get("Subject", ""))
+    from_name, from_address = email.utils.parseaddr(headers.get("From", ""))
+    return ParsedEmail(
+        uid=fetched.uid,
+        from_name=from_name,
+        from_address=from_address,
+        subject=subject,
+        body=body.strip(),
+        message_id=(headers.get("Message-ID") or "").strip(),
+        ticket_id=_parse_ticket_id_from_subject(subject),
+    )
+
+
+def _route_email(db, parsed: ParsedEmail) -> None:
+    # Повторно полученное письмо (например, после падения до установки \Seen)
+    # не создаёт новый тикет и не запускает AI повторно.
+    _, replayed = run_idempotent(
+        db,
+        SCOPE_IMAP,
+        parsed.message_id or None,
+        lambda: _handle_new_email_message(
+            db=db,
+            from_address=parsed.from_address,
+            subject=parsed.subject,
+            body=parsed.body,
+            from_name=parsed.from_name or None,
+        ),
     )
+    if replayed:
+        logger.info("Skip already processed email %s", parsed.message_id)
 
-    for ticket in open_tickets:
-        customer_msg = (
-            db.query(DbMessage)
-            .filter(
-                DbMessage.ticket_id == ticket.id,
-                DbMessage.author_type == AuthorType.CUSTOMER.value,
+
+class _InboxProgress:
+    """Флаги \\Seen и checkpoint по мере завершения писем в конвейере.
+
+    Checkpoint — последний UID, до которого все письма обработаны: он не
+    обгоняет письма, которые ещё в работе или упали (упавшие остаются
+    непрочитанными и будут взяты снова).
+    """
+
+    def __init__(self, mail: imaplib.IMAP4_SSL, db, status: MailboxStatus, last_uid: int | None) -> None:
+        self.mail = mail
+        self.db = db
+        self.status = status
+        self.mailbox = _checkpoint_mailbox()
+        self.last_uid = last_uid
+        # Всё, что ниже UIDNEXT на момент SELECT, уже в ящике и покрыто поиском
+        self.done_uid = max(last_uid or 0, (status.uid_next or 1) - 1)
+        self.pending: set[int] = set()
+        self.failed: set[int] = set()
+
+    def submitted(self, batch: list[int], fetched_uids: list[int]) -> None:
+        # Письма пачки, которых не вернул FETCH (удалены), считаем обработанными
+        self.pending.update(fetched_uids)
+        self.done_uid = max(self.done_uid, batch[-1])
+
+    def settle(self, results: list[tuple[int, bool]]) -> None:
+        processed = []
+        for uid, ok in results:
+            self.pending.discard(uid)
+            if ok:
+                processed.append(uid)
+            else:
+                self.failed.add(uid)
+        # Помечаем письма прочитанными одной командой
+        mark_seen(self.mail, processed)
+
+        blockers = self.pending | self.failed
+        new_last_uid = min(blockers) - 1 if blockers else self.done_uid
+        if new_last_uid != self.last_uid:
+            execute_write(
+                self.db, lambda s: _save_checkpoint(s, self.mailbox, self.status.uid_validity, new_last_uid)
             )
-            .order_by(DbMessage.created_at.desc())
-            .first()
-        )
-        last_msg = (
-            db.query(DbMessage)
-            .filter(DbMessage.ticket_id == ticket.id)
-            .order_by(DbMessage.created_at.desc())
-            .first()
-        )
+            self.last_uid = new_last_uid
 
-        if not customer_msg or not last_msg:
-            continue
 
-        # Если последнее сообщение от клиента — нельзя считать тикет закрытым
-        if last_msg.author_type == AuthorType.CUSTOMER.value:
-            continue
+def _process_inbox(mail: imaplib.IMAP4_SSL, status: MailboxStatus) -> None:
+    """Обработка новых писем в выбранном INBOX и обслуживание тикетов.
 
-        # Если с момента последнего клиентского сообщения прошло больше порога — закрываем
-        if customer_msg.created_at <= threshold:
-            now = datetime.utcnow()
-            ticket.status = TicketStatus.AUTO_CLOSED.value
-            ticket.auto_closed_by_ai = True
-            ticket.closed_at = now
-            ticket.status_updated_at = now
-            db.add(ticket)
+    Берутся непрочитанные письма с UID больше checkpoint, пачками по
+    email_fetch_batch_size: структура и заголовки одним FETCH, текст — без
+    вложений. Дальше письма идут через конвейер parse -> AI‑маршрутизация
+    (email_pipeline), а этот поток тем временем забирает следующую пачку.
+    """
 
-    db.commit()
+    settings = get_settings()
+    mailbox = _checkpoint_mailbox()
+    db = SessionLocal()
+    try:
+        checkpoint = db.query(MailboxCheckpoint).filter(MailboxCheckpoint.mailbox == mailbox).one_or_none()
+        last_uid = None
+        if checkpoint is not None and checkpoint.uid_validity == status.uid_validity:
+            last_uid = checkpoint.last_uid
+        progress = _InboxProgress(mail, db, status, last_uid)
+
+        uids = search_new_uids(mail, last_uid)
+        if uids:
+            pipeline = EmailPipeline(
+                _parse_fetched_email,
+                _route_email,
+                SessionLocal,
+                workers=settings.email_pipeline_workers,
+                queue_size=settings.email_pipeline_queue_size,
+            )
+            try:
+                for start in range(0, len(uids), settings.email_fetch_batch_size):
+                    batch = uids[start : start + settings.email_fetch_batch_size]
+                    started = time.monotonic()
+                    fetched = fetch_emails(mail, batch, settings.email_max_body_bytes)
+                    pipeline.record_fetch(time.monotonic() - started, len(fetched))
+                    progress.submitted(batch, [item.uid for item in fetched])
+                    for item in fetched:
+                        pipeline.submit(item)
+                    progress.settle(pipeline.completed())
+            except Exception:
+                # Соединение потеряно: не начатые письма заберём после переподключения
+                pipeline.close(cancel=True)
+                raise
+            pipeline.close()
+            progress.settle(pipeline.completed())
+            pipeline.log_metrics()
+        else:
+            progress.settle([])
+
+        # После обработки входящих писем пробуем авто‑закрыть "тихие" тикеты
+        _auto_close_stale_email_tickets(db)
+        purge_expired_keys(db)
+    finally:
+        db.close()
 
 
 def poll_email_once() -> None:
-    """Однократная обработка новых писем по IMAP."""
+    """Однократная обработка новых писем по IMAP (отдельное соединение на вызов)."""
 
-    settings = get_settings()
-    if not (settings.email_enabled and settings.email_username and settings.email_password):
+    if not _email_configured():
         logger.info("Email polling is disabled or not configured")
         return
 
-    mail = imaplib.IMAP4_SSL(settings.email_imap_host, settings.email_imap_port)
+    mail, status = _connect()
     try:
-        mail.login(settings.email_username, settings.email_password)
-        mail.select("INBOX")
+        _process_inbox(mail, status)
+    finally:
+        _logout(mail)
+
+
+# Untagged‑ответы, означающие новые письма в ящике
+NEW_MAIL_PATTERN = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b", re.IGNORECASE)
+
 
-        status, data = mail.search(None, "UNSEEN")
-        if status != "OK":
-            logger.warning("Failed to search UNSEEN emails: %s", status)
-            return
+def _supports_idle(mail: imaplib.IMAP4_SSL) -> bool:
+    # Список возможностей после входа может отличаться от приветствия — запрашиваем заново
+    status, data = mail.capability()
+    if status != "OK" or not data:
+        return False
+    return b"IDLE" in data[0].upper().split()
 
-        ids = data[0].split()
 
-        db = SessionLocal()
+class _ResponseLines:
+    """Чтение строк ответа через буфер imaplib (mail.file) с таймаутом.
+
+    Читать сокет напрямую нельзя: imaplib мог уже забрать в буфер mail.file
+    непрошенный ответ, например EXISTS, пришедший вместе с "+". Таймаут на
+    файловом объекте делает соединение непригодным, поэтому строка читается,
+    только когда данные уже есть: в буфере файла, в буфере TLS или в сокете.
+    """
+
+    def __init__(self, mail: imaplib.IMAP4) -> None:
+        self.mail = mail
+
+    def _buffered(self) -> bool:
+        # peek на неблокирующем сокете отдаёт буфер файла и не ждёт новых данных
+        sock = self.mail.sock
+        previous_timeout = sock.gettimeout()
+        sock.setblocking(False)
         try:
-            if ids:
-                for email_id in ids:
-                    try:
-                        status, msg_data = mail.fetch(email_id, "(RFC822)")
-                        if status != "OK":
-                            continue
-                        raw_email = msg_data[0][1]
-                        msg = email.message_from_bytes(raw_email)
-
-                        raw_subject = msg.get("Subject", "")
-                        subject = _decode_mime_header(raw_subject)
-                        from_header = msg.get("From", "")
-                        from_name, from_address = email.utils.parseaddr(from_header)
-                        body = _extract_plain_text(msg).strip()
-
-                        _handle_new_email_message(
-                            db=db,
-                            from_address=from_address,
-                            subject=subject,
-                            body=body,
-                            from_name=from_name or None,
-                        )
-
-                        # Помечаем письмо прочитанным
-                        mail.store(email_id, "+FLAGS", "\\Seen")
-                    except Exception:
-                        logger.exception("Failed to process email message id=%s", email_id)
-
-            # После обработки входящих писем пробуем авто‑закрыть "тихие" тикеты
-            _auto_close_stale_email_tickets(db)
+            return bool(self.mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
         finally:
-            db.close()
-    finally:
+            sock.settimeout(previous_timeout)
+
+    def readline(self, timeout: float) -> bytes | None:
+        """Следующая строка без CRLF или None, если за timeout секунд её не было."""
+
+        if not self._buffered():
+            pending = getattr(self.mail.sock, "pending", None)
+            if not (pending and pending()):
+                readable, _, _ = select.select([self.mail.sock], [], [], max(timeout, 0))
+                if not readable:
+                    return None
+        line = self.mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed by server")
+        return line.rstrip(b"\r\n")
+
+
+def _idle_wait(mail: imaplib.IMAP4_SSL, timeout: float) -> bool:
+    """Один цикл IMAP IDLE (RFC 2177): ждём не дольше timeout секунд.
+
+    True — сервер сообщил о новых письмах. После выхода соединение снова
+    в обычном режиме и готово к командам imaplib.
+    """
+
+    response_timeout = get_settings().email_imap_timeout_seconds
+    tag = mail._new_tag()
+    mail.tagged_commands.pop(tag, None)
+    mail.send(tag + b" IDLE\r\n")
+    lines = _ResponseLines(mail)
+
+    new_mail = False
+    while True:
+        line = lines.readline(response_timeout)
+        # До "+" могут прийти непрошенные ответы, уже лежавшие в буфере imaplib
+        if line is not None and line.startswith(b"* ") and not line.upper().startswith(b"* BYE"):
+            new_mail = new_mail or bool(NEW_MAIL_PATTERN.match(line))
+            continue
+        if line is None or not line.startswith(b"+"):
+            raise imaplib.IMAP4.abort(f"IDLE rejected: {line!r}")
+        break
+
+    deadline = time.monotonic() + timeout
+    while not new_mail:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        line = lines.readline(remaining)
+        if line is None:
+            break
+        if line.upper().startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort(f"server closed IDLE: {line!r}")
+        new_mail = bool(NEW_MAIL_PATTERN.match(line))
+
+    mail.send(b"DONE\r\n")
+    while True:
+        line = lines.readline(response_timeout)
+        if line is None:
+            raise imaplib.IMAP4.abort("no response to DONE")
+        if line.startswith(tag + b" "):
+            if not line[len(tag) + 1 :].upper().startswith(b"OK"):
+                raise imaplib.IMAP4.abort(f"IDLE failed: {line!r}")
+            break
+        new_mail = new_mail or bool(NEW_MAIL_PATTERN.match(line))
+    # Всё, что пришло после OK, остаётся в буфере mail.file и достанется imaplib
+    return new_mail
+
+
+def _new_mail_pending(mail: imaplib.IMAP4_SSL) -> bool:
+    """Были ли EXISTS в ответах на команды с прошлой проверки; очищает их.
+
+    imaplib складывает непрошенные EXISTS в untagged_responses, и IDLE их уже
+    не увидит — сервер сообщает о письме один раз.
+    """
+
+    _, data = mail.response("EXISTS")
+    return bool(data and data[0] is not None)
+
+
+def _serve_connection(mail: imaplib.IMAP4_SSL, status: MailboxStatus, poll_interval_seconds: float) -> None:
+    """Обработка писем на одном открытом соединении, пока оно живо.
+
+    С IDLE воркер просыпается по уведомлению сервера и перезапускает IDLE раньше
+    серверного таймаута; без IDLE — опрашивает ящик на том же соединении.
+    В обоих случаях после каждого цикла выполняется поиск UNSEEN: он же страхует
+    от пропущенных уведомлений и запускает авто‑закрытие тикетов.
+    """
+
+    settings = get_settings()
+    use_idle = settings.email_idle_enabled and _supports_idle(mail)
+    if settings.email_idle_enabled and not use_idle:
+        logger.warning("IMAP server does not support IDLE; polling every %s s", poll_interval_seconds)
+    while True:
+        _process_inbox(mail, status)
+        if _new_mail_pending(mail):
+            # Письма пришли, пока шла обработка: сразу следующий цикл, без ожидания
+            continue
+        if use_idle:
+            if _idle_wait(mail, settings.email_idle_timeout_seconds):
+                logger.info("IMAP IDLE: new mail")
+        else:
+            time.sleep(poll_interval_seconds)
+            # NOOP заодно держит соединение и получает обновления ящика
+            mail.noop()
+
+
+def run_email_worker(poll_interval_seconds: float = 5) -> None:
+    """Постоянное IMAP‑соединение с переподключением по экспоненциальной задержке."""
+
+    settings = get_settings()
+    backoff = settings.email_reconnect_min_seconds
+    while True:
+        if not _email_configured():
+            logger.info("Email polling is disabled or not configured")
+            time.sleep(poll_interval_seconds)
+            continue
         try:
-            mail.logout()
+            mail, status = _connect()
         except Exception:
-            pass
+            logger.exception("IMAP connection failed; retry in %.0f s", backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, settings.email_reconnect_max_seconds)
+            continue
+        logger.info("IMAP connected to %s", settings.email_imap_host)
+        backoff = settings.email_reconnect_min_seconds
+        try:
+            _serve_connection(mail, status, poll_interval_seconds)
+        except Exception:
+            logger.exception("IMAP connection lost; reconnect in %.0f s", backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, settings.email_reconnect_max_seconds)
+        finally:
+            _logout(mail)
 
 
 def main_loop(poll_interval_seconds: int = 5) -> None:
-    """Простой цикл опроса почты.
+    """Цикл приёма почты на постоянном IMAP‑соединении (IDLE или опрос).
 
     Запуск:
         python -m app.integrations.email_worker
@@ -433,13 +686,18 @@ def main_loop(poll_interval_seconds: int = 5) -> None:
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
         level=logging.INFO,
     )
+    log_engine_settings("sync", engine)
+    # Таблицы и новые колонки могли ещё не создаться, если API не перезапускали
+    MailboxCheckpoint.__table__.create(bind=engine, checkfirst=True)
+    OutboundEmail.__table__.create(bind=engine, checkfirst=True)
+    run_additive_migrations(engine)
+    with SessionLocal() as db:
+        warm_department_cache(db)
     logger.info("Starting email worker")
-    while True:
-        try:
-            poll_email_once()
-        except Exception:
-            logger.exception("Error while polling email")
-        time.sleep(poll_interval_seconds)
+    if get_settings().email_outbox_embedded_sender:
+        # Ответы уходят из очереди в отдельном потоке; приём писем SMTP не ждёт
+        start_sender_thread()
+    run_email_worker(poll_interval_seconds)
 
 
 if __name__ == "__main__":
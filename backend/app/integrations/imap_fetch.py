@@ -0,0 +1,292 @@
+"""Пакетная выборка писем по UID для email‑воркера.
+
+За один FETCH на пачку забираются UID, BODYSTRUCTURE и нужные заголовки,
+затем по структуре — только текстовая часть тела (BODY.PEEK[<раздел>]<0.N>),
+без вложений. Флаги \\Seen ставятся одной командой на пачку.
+"""
+
+import base64
+import binascii
+import email
+import imaplib
+import re
+from dataclasses import dataclass
+from email.message import Message
+from typing import Iterable, List, NamedTuple, Sequence
+
+HEADER_FIELDS = "FROM SUBJECT MESSAGE-ID"
+
+
+class MailboxStatus(NamedTuple):
+    uid_validity: int
+    # UID следующего письма на момент SELECT; все меньшие уже лежат в ящике
+    uid_next: int | None
+
+
+class TextPart(NamedTuple):
+    section: str
+    encoding: str
+    charset: str
+
+
+@dataclass
+class FetchedEmail:
+    """Письмо как пришло с сервера; разбор — decode_email (стадия parse конвейера)."""
+
+    uid: int
+    raw_headers: bytes
+    raw_body: bytes | None
+    part: TextPart | None
+
+
+def decode_email(fetched: FetchedEmail) -> tuple[Message, str]:
+    """Заголовки и текст письма."""
+
+    headers = email.message_from_bytes(fetched.raw_headers)
+    if fetched.part is None or fetched.raw_body is None:
+        return headers, ""
+    return headers, decode_part(fetched.raw_body, fetched.part.encoding, fetched.part.charset)
+
+
+def _first_int(mail: imaplib.IMAP4, name: str) -> int | None:
+    _, data = mail.response(name)
+    try:
+        return int(data[0]) if data and data[0] is not None else None
+    except ValueError:
+        return None
+
+
+def select_inbox(mail: imaplib.IMAP4, mailbox: str = "INBOX") -> MailboxStatus:
+    """SELECT ящика; UIDVALIDITY и UIDNEXT берутся из его же ответа."""
+
+    status, data = mail.select(mailbox)
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"SELECT {mailbox} failed: {data!r}")
+    uid_validity = _first_int(mail, "UIDVALIDITY")
+    uid_next = _first_int(mail, "UIDNEXT")
+    if uid_validity is None:
+        _, data = mail.status(mailbox, "(UIDVALIDITY)")
+        match = re.search(rb"UIDVALIDITY (\d+)", data[0] or b"")
+        if not match:
+            raise imaplib.IMAP4.error("server did not report UIDVALIDITY")
+        uid_validity = int(match.group(1))
+    return MailboxStatus(uid_validity, uid_next)
+
+
+def uid_set(uids: Iterable[int]) -> str:
+    """Компактная запись набора UID: 1,2,3,7 -> "1:3,7"."""
+
+    ranges: List[List[int]] = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+def search_new_uids(mail: imaplib.IMAP4, last_uid: int | None) -> List[int]:
+    """UID непрочитанных писем после last_uid (без checkpoint — все непрочитанные)."""
+
+    criteria = ("UNSEEN",) if last_uid is None else (f"UID {last_uid + 1}:*", "UNSEEN")
+    status, data = mail.uid("SEARCH", None, *criteria)
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"UID SEARCH failed: {data!r}")
+    uids = [int(uid) for uid in (data[0] or b"").split()]
+    # "N:*" всегда включает последнее письмо, даже если его UID меньше N
+    return sorted(uid for uid in uids if last_uid is None or uid > last_uid)
+
+
+def mark_seen(mail: imaplib.IMAP4, uids: Sequence[int]) -> None:
+    if uids:
+        mail.uid("STORE", uid_set(uids), "+FLAGS.SILENT", "(\\Seen)")
+
+
+# --- Разбор ответа FETCH ---
+
+_OPEN = object()
+_CLOSE = object()
+_ATOM_END = b" ()\r\n"
+
+
+def _tokenize(chunk: bytes, tokens: list) -> None:
+    i, size = 0, len(chunk)
+    while i < size:
+        char = chunk[i : i + 1]
+        if char in b" \r\n":
+            i += 1
+        elif char == b"(":
+            tokens.append(_OPEN)
+            i += 1
+        elif char == b")":
+            tokens.append(_CLOSE)
+            i += 1
+        elif char == b'"':
+            value = bytearray()
+            i += 1
+            while i < size and chunk[i : i + 1] != b'"':
+                if chunk[i : i + 1] == b"\\":
+                    i += 1
+                value += chunk[i : i + 1]
+                i += 1
+            tokens.append(bytes(value))
+            i += 1
+        else:
+            start = i
+            while i < size and chunk[i : i + 1] not in _ATOM_END:
+                if chunk[i : i + 1] == b"[":
+                    # BODY[HEADER.FIELDS (FROM SUBJECT)] — пробелы и скобки внутри [] часть имени
+                    i = chunk.index(b"]", i)
+                i += 1
+            atom = chunk[start:i]
+            tokens.append(None if atom.upper() == b"NIL" else atom)
+
+
+def _build(tokens: list, position: int) -> tuple:
+    items: list = []
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token is _OPEN:
+            nested, position = _build(tokens, position)
+            items.append(nested)
+        elif token is _CLOSE:
+            return items, position
+        else:
+            items.append(token)
+    return items, position
+
+
+def parse_fetch_response(data: list) -> List[dict]:
+    """Ответ imaplib на FETCH -> список словарей {ИМЯ_ЭЛЕМЕНТА: значение}.
+
+    Литералы imaplib отдаёт кортежами (строка с {n}, содержимое); они встают в
+    поток токенов как строки на место {n}.
+    """
+
+    tokens: list = []
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item
+            _tokenize(head[: head.rindex(b"{")], tokens)
+            tokens.append(literal)
+        elif item:
+            _tokenize(item, tokens)
+
+    parsed, _ = _build(tokens, 0)
+    messages = []
+    # Верхний уровень: <seq> (<имя> <значение> ...) <seq> (...) ...
+    for attributes in parsed:
+        if isinstance(attributes, list):
+            messages.append(
+                {attributes[i].decode().upper(): attributes[i + 1] for i in range(0, len(attributes) - 1, 2)}
+            )
+    return messages
+
+
+def _text(value) -> str:
+    return value.decode("ascii", errors="replace") if isinstance(value, bytes) else ""
+
+
+def find_text_part(structure: list, section: str = "") -> TextPart | None:
+    """Первая часть text/plain (не вложение) по BODYSTRUCTURE.
+
+    Письмо без вложенных частей — раздел "1"; он берётся при любом типе и
+    Content-Disposition, как раньше в _extract_plain_text.
+    """
+
+    if structure and isinstance(structure[0], list):
+        index = 0
+        for part in structure:
+            if not isinstance(part, list):
+                break
+            index += 1
+            found = find_text_part(part, f"{section}.{index}" if section else str(index))
+            if found:
+                return found
+        return None
+
+    if len(structure) < 7:
+        return None
+    if section:
+        if _text(structure[0]).upper() != "TEXT" or _text(structure[1]).upper() != "PLAIN":
+            return None
+        disposition = structure[9] if len(structure) > 9 else None
+        if isinstance(disposition, list) and disposition and _text(disposition[0]).upper() == "ATTACHMENT":
+            return None
+
+    charset = "utf-8"
+    params = structure[2] if isinstance(structure[2], list) else []
+    for i in range(0, len(params) - 1, 2):
+        if _text(params[i]).upper() == "CHARSET" and params[i + 1]:
+            charset = _text(params[i + 1])
+    return TextPart(section or "1", _text(structure[5]).upper(), charset)
+
+
+def decode_part(raw: bytes, encoding: str, charset: str) -> str:
+    """Декодирование (возможно, обрезанной) части по Content-Transfer-Encoding."""
+
+    if encoding == "BASE64":
+        compact = re.sub(rb"\s+", b"", raw)
+        try:
+            raw = base64.b64decode(compact[: len(compact) // 4 * 4])
+        except binascii.Error:
+            raw = b""
+    elif encoding == "QUOTED-PRINTABLE":
+        raw = binascii.a2b_qp(raw)
+    try:
+        return raw.decode(charset, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+def _body_value(attributes: dict, prefix: str):
+    for key, value in attributes.items():
+        if key.startswith(prefix):
+            return value
+    return None
+
+
+def fetch_emails(mail: imaplib.IMAP4, uids: Sequence[int], max_body_bytes: int) -> List[FetchedEmail]:
+    """Заголовки и текстовая часть писем пачкой: FETCH структуры и заголовков плюс по FETCH на раздел."""
+
+    if not uids:
+        return []
+    status, data = mail.uid(
+        "FETCH", uid_set(uids), f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+    )
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"UID FETCH failed: {data!r}")
+
+    headers = {}
+    parts = {}
+    for attributes in parse_fetch_response(data):
+        if attributes.get("UID") is None:
+            continue
+        uid = int(attributes["UID"])
+        headers[uid] = _body_value(attributes, "BODY[HEADER.FIELDS") or b""
+        structure = attributes.get("BODYSTRUCTURE")
+        part = find_text_part(structure) if isinstance(structure, list) else None
+        if part:
+            parts[uid] = part
+
+    # Разделы у писем разные ("1", "1.1", ...): один FETCH на раздел
+    by_section: dict = {}
+    for uid, part in parts.items():
+        by_section.setdefault(part.section, []).append(uid)
+    # Для base64 обрезаем по границе 4 символов
+    limit = max(max_body_bytes // 4 * 4, 4)
+    bodies = {}
+    for section, section_uids in by_section.items():
+        status, data = mail.uid("FETCH", uid_set(section_uids), f"(UID BODY.PEEK[{section}]<0.{limit}>)")
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"UID FETCH failed: {data!r}")
+        for attributes in parse_fetch_response(data):
+            if attributes.get("UID") is None:
+                continue
+            uid = int(attributes["UID"])
+            raw = _body_value(attributes, f"BODY[{section}]")
+            if isinstance(raw, bytes):
+                bodies[uid] = raw
+
+    return [FetchedEmail(uid, headers[uid], bodies.get(uid), parts.get(uid)) for uid in sorted(headers)]
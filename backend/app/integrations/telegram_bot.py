@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from datetime import datetime
 from typing import Dict
 
 from aiogram import Bot, Dispatcher, F
@@ -8,16 +9,28 @@ from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMar
 
 from app.ai.answer_generator import generate_answer
 from app.core.config import get_settings
-from app.db.session import SessionLocal
-from app.models.message import AuthorType, Message as DbMessage
+from app.db.engine import log_engine_settings
+from app.db.session import SessionLocal, engine
+from app.db.write_coordinator import execute_write
+from app.models.message import AuthorType
 from app.models.ticket import Ticket, TicketStatus
 from app.schemas.ticket import TicketCreate
+from app.services.department_registry import warm_department_cache
+from app.services.idempotency_service import (
+    SCOPE_TELEGRAM,
+    IdempotencyConflict,
+    complete_key,
+    release_key,
+    reserve_key,
+    run_idempotent,
+)
 from app.services.routing_service import (
     continue_telegram_ticket,
     create_placeholder_telegram_ticket,
     process_new_ticket,
 )
 from app.services.faq_service import get_best_match
+from app.services.ticket_service import add_ticket_message, latest_ai_message
 
 logger = logging.getLogger(__name__)
 
@@ -87,31 +100,82 @@ async def handle_category(callback: CallbackQuery) -> None:
 
     language = (user.language_code or "ru")[:2] if user and user.language_code else "ru"
 
-    # Создаём пустой лид сразу после выбора категории
+    # Создаём пустой лид сразу после выбора категории.
+    # Повторная доставка того же callback не создаёт второй тикет.
     db = SessionLocal()
     try:
         username = user.username if user else None
         subject = CATEGORY_CHOICES.get(category_key, "Обращение")
-        ticket = create_placeholder_telegram_ticket(
-            db=db,
-            subject=subject,
-            chat_id=chat_id,
-            username=username,
-            language=language,
-            request_type=category_key,
-        )
+        try:
+            ticket_id, replayed = run_idempotent(
+                db,
+                SCOPE_TELEGRAM,
+                f"callback:{callback.id}",
+                lambda: create_placeholder_telegram_ticket(
+                    db=db,
+                    subject=subject,
+                    chat_id=chat_id,
+                    username=username,
+                    language=language,
+                    request_type=category_key,
+                ),
+            )
+        except IdempotencyConflict:
+            # Та же доставка callback обрабатывается параллельно — ведём себя как при повторе
+            logger.info("Skip concurrent Telegram callback %s in chat %s", callback.id, chat_id)
+            await callback.answer()
+            return
         USER_STATE[chat_id] = {
             "category_key": category_key,
             "language": language,
-            "ticket_id": str(ticket.id),
+            "ticket_id": str(ticket_id),
         }
     finally:
         db.close()
 
+    if replayed:
+        await callback.answer()
+        return
+
     await callback.message.edit_text("Пожалуйста, опишите вашу проблему/вопрос одним сообщением.")
     await callback.answer()
 
 
+def _ai_reply_text(db, ticket: Ticket, subject: str, description: str, msg_language: str) -> str:
+    """Текст ответа клиенту: авто‑ответ ИИ, статья FAQ или сгенерированный ответ."""
+
+    # Проверяем, создал ли AI авто‑ответ при авто‑закрытии
+    ai_message = latest_ai_message(db, ticket)
+    if ai_message:
+        return ai_message.body
+
+    # Дополнительный ответ, если AI‑сообщение не было создано
+    try:
+        faq = get_best_match(
+            db,
+            ticket.category_code,
+            ticket.language,
+            request_type=ticket.request_type,
+        )
+    except Exception:
+        faq = None
+
+    if faq:
+        add_ticket_message(db, ticket.id, AuthorType.AI.value, faq.answer, faq.language)
+        return faq.answer
+
+    full_text = f"Категория обращения (выбрана пользователем): {subject}\n\nСообщение клиента:\n{description}"
+    answer_language = ticket.language or msg_language
+    suggestion = generate_answer(
+        full_text,
+        language=answer_language,
+        faq_snippet=None,
+        request_type=ticket.request_type,
+    )
+    add_ticket_message(db, ticket.id, AuthorType.AI.value, suggestion.answer, suggestion.answer_language)
+    return suggestion.answer
+
+
 async def handle_text(message: Message) -> None:
     if not message.text:
         return
@@ -126,6 +190,16 @@ async def handle_text(message: Message) -> None:
         await message.answer("Для начала выберите тип обращения с помощью /start.")
         return
 
+    # Повторная доставка того же сообщения не должна заново запускать классификацию и ответ ИИ
+    db = SessionLocal()
+    try:
+        idempotency_record_id = reserve_key(db, SCOPE_TELEGRAM, f"message:{chat_id}:{message.message_id}")
+    finally:
+        db.close()
+    if idempotency_record_id is None:
+        logger.info("Skip duplicate Telegram message %s in chat %s", message.message_id, chat_id)
+        return
+
     ui_language = state.get("language") or "ru"
     category_key = state.get("category_key") or "other"
 
@@ -143,93 +217,59 @@ async def handle_text(message: Message) -> None:
     username = message.from_user.username if message.from_user else None
     user_id = message.from_user.id if message.from_user else None
 
+    # (id, статус) тикета для вопроса «получили ли ответ»: ORM‑объект после закрытия сессии недоступен
+    reply_ticket: tuple[int, str] | None = None
     db = SessionLocal()
     try:
         ticket: Ticket | None = None
-        ticket_id_str = state.get("ticket_id")
-        if ticket_id_str:
-            ticket = db.query(Ticket).get(int(ticket_id_str))
+        try:
+            ticket_id_str = state.get("ticket_id")
+            if ticket_id_str:
+                ticket = db.query(Ticket).get(int(ticket_id_str))
+
+            if ticket is None:
+                # На всякий случай создаём тикет, если по какой‑то причине его ещё нет
+                ticket_in = TicketCreate(
+                    subject=subject,
+                    description=description,
+                    channel="telegram",
+                    language=msg_language,
+                    customer_email=None,
+                    customer_username=username,
+                    external_user_id=str(user_id) if user_id is not None else None,
+                    request_type=category_key,
+                )
+                ticket = process_new_ticket(db, ticket_in)
+                USER_STATE[chat_id]["ticket_id"] = str(ticket.id)
+            else:
+                ticket = continue_telegram_ticket(
+                    db=db,
+                    ticket=ticket,
+                    message_text=description,
+                    language=msg_language,
+                )
+            # Сообщение клиента уже сохранено: повторная доставка не должна добавить его снова,
+            # даже если ответ ИИ ниже не получится
+            complete_key(db, idempotency_record_id, ticket.id)
+        except Exception:
+            logger.exception("Ошибка при обработке сообщения Telegram")
+            ticket = None
+            try:
+                # Сообщение не сохранено — снимаем резерв, чтобы пользователь мог отправить его повторно
+                release_key(db, idempotency_record_id)
+            except Exception:
+                logger.exception("Не удалось снять ключ идемпотентности")
 
         if ticket is None:
-            # На всякий случай создаём тикет, если по какой‑то причине его ещё нет
-            ticket_in = TicketCreate(
-                subject=subject,
-                description=description,
-                channel="telegram",
-                language=msg_language,
-                customer_email=None,
-                customer_username=username,
-                external_user_id=str(user_id) if user_id is not None else None,
-                request_type=category_key,
-            )
-            ticket = process_new_ticket(db, ticket_in)
-            USER_STATE[chat_id]["ticket_id"] = str(ticket.id)
+            answer_text = "Произошла ошибка при обработке обращения. Попробуйте позже."
         else:
-            ticket = continue_telegram_ticket(
-                db=db,
-                ticket=ticket,
-                message_text=description,
-                language=msg_language,
-            )
-
-        # Проверяем, создал ли AI авто‑ответ при авто‑закрытии
-        ai_message = (
-            db.query(DbMessage)
-            .filter(
-                DbMessage.ticket_id == ticket.id,
-                DbMessage.author_type == AuthorType.AI.value,
-            )
-            .order_by(DbMessage.created_at.desc())
-            .first()
-        )
-
-        if ai_message:
-            answer_text = ai_message.body
-        else:
-            # Дополнительный ответ, если AI‑сообщение не было создано
+            reply_ticket = ticket.id, ticket.status
             try:
-                faq = get_best_match(
-                    db,
-                    ticket.category_code,
-                    ticket.language,
-                    request_type=ticket.request_type,
-                )
+                answer_text = _ai_reply_text(db, ticket, subject, description, msg_language)
             except Exception:
-                faq = None
-
-            if faq:
-                answer_text = faq.answer
-                ai_message = DbMessage(
-                    ticket_id=ticket.id,
-                    author_type=AuthorType.AI.value,
-                    body=answer_text,
-                    language=faq.language,
-                )
-                db.add(ai_message)
-                db.commit()
-            else:
-                full_text = f"Категория обращения (выбрана пользователем): {subject}\n\nСообщение клиента:\n{description}"
-                answer_language = ticket.language or msg_language
-                suggestion = generate_answer(
-                    full_text,
-                    language=answer_language,
-                    faq_snippet=None,
-                    request_type=ticket.request_type,
-                )
-
-                ai_message = DbMessage(
-                    ticket_id=ticket.id,
-                    author_type=AuthorType.AI.value,
-                    body=suggestion.answer,
-                    language=suggestion.answer_language,
-                )
-                db.add(ai_message)
-                db.commit()
-
-                answer_text = suggestion.answer
-    except Exception:
-        logger.exception("Ошибка при обработке сообщения Telegram")
-        answer_text = "Произошла ошибка при обработке обращения. Попробуйте позже."
+                logger.exception("Ошибка при подготовке ответа ИИ для тикета %s", ticket.id)
+                db.rollback()
+                answer_text = "Ваше обращение сохранено, но ответ сейчас подготовить не удалось. Оператор свяжется с вами."
     finally:
         db.close()
 
@@ -244,15 +284,15 @@ async def handle_text(message: Message) -> None:
         await message.answer(final_text)
 
     # Спрашиваем, помог ли ответ
-    if ticket and ticket.status != TicketStatus.CLOSED.value:
+    if reply_ticket and reply_ticket[1] != TicketStatus.CLOSED.value:
         kb = InlineKeyboardMarkup(
             inline_keyboard=[
                 [
                     InlineKeyboardButton(
-                        text="Да, спасибо", callback_data=f"close:{ticket.id}"
+                        text="Да, спасибо", callback_data=f"close:{reply_ticket[0]}"
                     ),
                     InlineKeyboardButton(
-                        text="Нет, продолжить", callback_data=f"continue:{ticket.id}"
+                        text="Нет, продолжить", callback_data=f"continue:{reply_ticket[0]}"
                     ),
                 ]
             ]
@@ -266,18 +306,18 @@ async def handle_close(callback: CallbackQuery) -> None:
     _, ticket_id_str = callback.data.split(":", 1)
     chat_id = callback.message.chat.id
 
-    db = SessionLocal()
-    try:
-        ticket = db.query(Ticket).get(int(ticket_id_str))
+    def _close(s) -> None:
+        ticket = s.query(Ticket).get(int(ticket_id_str))
         if ticket:
             ticket.status = TicketStatus.CLOSED.value
             ticket.auto_closed_by_ai = True
-            from datetime import datetime
-
             now = datetime.utcnow()
             ticket.closed_at = now
             ticket.status_updated_at = now
-            db.commit()
+
+    db = SessionLocal()
+    try:
+        execute_write(db, _close)
         USER_STATE.pop(chat_id, None)
     finally:
         db.close()
@@ -308,6 +348,9 @@ async def main() -> None:
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
         level=logging.INFO,
     )
+    log_engine_settings("sync", engine)
+    with SessionLocal() as db:
+        warm_department_cache(db)
     logger.info("Запуск Telegram-бота HelpDeskAI (aiogram)")
 
     bot = Bot(token=token)
@@ -34,3 +34,26 @@ def send_text_message(chat_id: Union[int, str], text: str) -> None:
     except Exception:
         logger.exception("Failed to send Telegram message to chat_id=%s", chat_id)
 
+
+
+async def send_text_message_async(chat_id: Union[int, str], text: str) -> None:
+    """Асинхронный вариант send_text_message для async-ручек API."""
+
+    settings = get_settings()
+    token = settings.telegram_bot_token
+    if not token:
+        logger.warning("TELEGRAM_BOT_TOKEN is not configured; skipping Telegram send")
+        return
+
+    url = f"https://api.telegram.org/bot{token}/sendMessage"
+    payload = {
+        "chat_id": chat_id,
+        "text": text,
+    }
+
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            resp = await client.post(url, json=payload)
+            resp.raise_for_status()
+    except Exception:
+        logger.exception("Failed to send Telegram message to chat_id=%s", chat_id)
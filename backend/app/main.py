@@ -1,16 +1,25 @@
+import logging
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.api.v1 import analytics, faq, tickets
+from app.api.v1 import analytics, export, faq, tickets
 from app.core.config import get_settings
+from app.db.async_session import async_engine, async_read_engine
 from app.db.base import Base
+from app.db.engine import log_engine_settings
+from app.db.migrations import run_additive_migrations
 from app.db.session import engine
 
 settings = get_settings()
 
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    level=logging.INFO,
+)
+
 
 def create_app() -> FastAPI:
     app = FastAPI(title=settings.app_name)
@@ -29,6 +38,7 @@ def create_app() -> FastAPI:
     app.include_router(tickets.router, prefix=api_prefix)
     app.include_router(faq.router, prefix=api_prefix)
     app.include_router(analytics.router, prefix=api_prefix)
+    app.include_router(export.router, prefix=api_prefix)
 
     # Статические файлы (фронтенд React)
     project_root = Path(__file__).resolve().parents[2]
@@ -47,6 +57,59 @@ app = create_app()
 @app.on_event("startup")
 def on_startup():
     # Импорт моделей для регистрации в metadata перед create_all
-    from app.models import department, faq, message, model_log, ticket  # noqa: F401
+    from app.models import (  # noqa: F401
+        archive,
+        classification_stats,
+        department,
+        faq,
+        idempotency_key,
+        job,
+        mailbox_checkpoint,
+        message,
+        model_log,
+        outbound_email,
+        ticket,
+        ticket_latency_sketch,
+        ticket_rollup,
+    )
 
     Base.metadata.create_all(bind=engine)
+    run_additive_migrations(engine)
+    log_engine_settings("sync", engine)
+    log_engine_settings("async", async_engine.sync_engine, read_pragmas=False)
+    if async_read_engine is not None:
+        log_engine_settings("async-read", async_read_engine.sync_engine, read_pragmas=False)
+
+    from app.db.session import SessionLocal
+    from app.services.classification_stats_service import classification_stats_missing, rebuild_classification_stats
+    from app.services.department_registry import warm_department_cache
+    from app.services.idempotency_service import purge_expired_keys
+    from app.services.model_log_archive import backfill_classification_columns
+    from app.services.rollup_service import rebuild_rollups, rollups_missing
+    from app.services.sla_service import backfill_sla_deadlines
+    from app.services.ticket_service import backfill_conversation_state
+
+    db = SessionLocal()
+    try:
+        purge_expired_keys(db)
+        warm_department_cache(db)
+        # Тикеты, созданные до появления сроков SLA; после первого запуска — пустой запрос по индексу
+        backfill_sla_deadlines(db)
+        # То же для состояния диалога (last_message_at и т. п.): после первого запуска
+        # проверяются только тикеты без сообщений, по индексам last_message_at и messages.ticket_id
+        backfill_conversation_state(db)
+        if rollups_missing(db):
+            rebuild_rollups(db)
+        # Колонки классификации у логов, записанных до их появления
+        backfill_classification_columns(db)
+        if classification_stats_missing(db):
+            rebuild_classification_stats(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await async_engine.dispose()
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
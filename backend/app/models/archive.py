@@ -0,0 +1,103 @@
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+
+from app.db.base import Base
+
+
+class ArchivedTicket(Base):
+    """Закрытый тикет, перенесённый из tickets (id сохраняется). Только для чтения."""
+
+    __tablename__ = "tickets_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    subject = Column(String(255), nullable=False)
+    description = Column(Text, nullable=False)
+    channel = Column(String(50), nullable=False)
+    language = Column(String(10), nullable=False)
+
+    customer_email = Column(String(255), nullable=True, index=True)
+    customer_username = Column(String(255), nullable=True)
+    external_user_id = Column(String(100), nullable=True)
+    request_type = Column(String(50), nullable=True)
+
+    category_code = Column(String(100), nullable=True)
+    priority = Column(String(10), nullable=False)
+
+    status = Column(String(50), nullable=False)
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=True)
+
+    auto_closed_by_ai = Column(Boolean, default=False)
+    ai_disabled = Column(Boolean, default=False)
+
+    created_at = Column(DateTime, nullable=True, index=True)
+    updated_at = Column(DateTime, nullable=True)
+    status_updated_at = Column(DateTime, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
+    first_response_due_at = Column(DateTime, nullable=True)
+    sla_due_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_author_type = Column(String(20), nullable=True)
+    last_customer_message_at = Column(DateTime, nullable=True)
+    first_agent_response_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    department = relationship("Department")
+
+
+class ArchivedMessage(Base):
+    __tablename__ = "messages_archive"
+    __table_args__ = (Index("ix_messages_archive_ticket_created_id", "ticket_id", "created_at", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    ticket_id = Column(Integer, ForeignKey("tickets_archive.id"), nullable=False)
+
+    author_type = Column(String(20), nullable=False)
+    body = Column(Text, nullable=False)
+    language = Column(String(10), nullable=False)
+    created_at = Column(DateTime, nullable=True)
+
+
+class TicketArchiveStats(Base):
+    """Агрегаты по архивным тикетам для метрик «за всё время» без сканирования архива.
+
+    Пополняется при архивации, по одной строке на комбинацию ключевых полей.
+    """
+
+    __tablename__ = "ticket_archive_stats"
+    __table_args__ = (
+        UniqueConstraint(
+            "request_type",
+            "priority",
+            "status",
+            "auto_closed_by_ai",
+            "agent_involved",
+            name="uq_ticket_archive_stats_key",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    request_type = Column(String(50), nullable=True)
+    priority = Column(String(10), nullable=False)
+    status = Column(String(50), nullable=False)
+    auto_closed_by_ai = Column(Boolean, nullable=False)
+    # Был ли в диалоге ответ оператора (для user_auto_closed_tickets)
+    agent_involved = Column(Boolean, nullable=False)
+
+    tickets = Column(Integer, nullable=False, default=0)
+    # Сумма и число интервалов created_at → closed_at у auto_closed тикетов
+    auto_close_seconds = Column(Float, nullable=False, default=0.0)
+    auto_close_samples = Column(Integer, nullable=False, default=0)
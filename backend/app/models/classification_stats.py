@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, UniqueConstraint
+
+from app.db.base import Base
+
+# Поля классификации, которые может исправить оператор. request_type выбирает клиент,
+# а не модель, поэтому в was_corrected и калибровку он не входит
+CORRECTABLE_FIELDS = ("priority", "department", "category", "request_type")
+MODEL_FIELDS = ("priority", "department", "category")
+
+
+class ClassificationCorrection(Base):
+    """Исправление оператором метки тикета: что было предсказано и на что исправлено.
+
+    predicted — метка последней классификации тикета (model_log_id) до первого
+    исправления этого поля; при повторных исправлениях не меняется.
+    """
+
+    __tablename__ = "classification_corrections"
+
+    id = Column(Integer, primary_key=True)
+    # Без FK: тикет и его логи могут уехать в архив
+    ticket_id = Column(Integer, nullable=False, index=True)
+    model_log_id = Column(Integer, nullable=True, index=True)
+    field = Column(String(20), nullable=False)  # priority / department / category / request_type
+    predicted = Column(String(100), nullable=True)
+    corrected = Column(String(100), nullable=True)
+    confidence = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ClassificationConfusion(Base):
+    """Матрица ошибок по полю: сколько классификаций с меткой predicted сейчас имеют метку actual.
+
+    Новая классификация добавляет 1 на диагональ, исправление оператора переносит
+    её из (predicted, прежняя метка) в (predicted, новая метка). "" — метки нет.
+    """
+
+    __tablename__ = "classification_confusion"
+    __table_args__ = (UniqueConstraint("field", "predicted", "actual", name="uq_classification_confusion_key"),)
+
+    id = Column(Integer, primary_key=True)
+    field = Column(String(20), nullable=False)
+    predicted = Column(String(100), nullable=False)
+    actual = Column(String(100), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ClassificationCalibration(Base):
+    """Гистограмма калибровки: классификации по корзинам уверенности и сколько из них исправлено."""
+
+    __tablename__ = "classification_calibration"
+    __table_args__ = (UniqueConstraint("bucket", name="uq_classification_calibration_bucket"),)
+
+    id = Column(Integer, primary_key=True)
+    bucket = Column(Integer, nullable=False)  # floor(confidence * CALIBRATION_BUCKETS)
+    classifications = Column(Integer, nullable=False, default=0)
+    corrected = Column(Integer, nullable=False, default=0)
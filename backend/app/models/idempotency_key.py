@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+
+from app.db.base import Base
+
+
+class IdempotencyKey(Base):
+    """Ключ идемпотентности входящего запроса (HTTP‑заголовок, Message‑ID письма, update Telegram)."""
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("scope", "key", name="uq_idempotency_keys_scope_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(50), nullable=False)  # api / api_external / imap / telegram
+    key = Column(String(255), nullable=False)
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Пока completed_at пуст, запрос ещё обрабатывается (ключ зарезервирован)
+    completed_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
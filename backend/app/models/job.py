@@ -0,0 +1,42 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+
+from app.db.base import Base
+
+
+class JobKind(str, Enum):
+    PROCESS_TICKET = "process_ticket"
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """Фоновая задача (например, AI‑обработка тикета), хранящаяся в БД."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # process_ticket / ...
+    ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=True, index=True)
+    payload = Column(Text, nullable=True)  # JSON
+
+    status = Column(String(20), nullable=False, default=JobStatus.QUEUED.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    last_error = Column(Text, nullable=True)
+
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Аренда задачи воркером: пока locked_until в будущем, задачу никто другой не берёт
+    locked_by = Column(String(64), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String
+
+from app.db.base import Base
+
+
+class MailboxCheckpoint(Base):
+    """Докуда обработан IMAP‑ящик: UIDVALIDITY и последний UID, до которого всё обработано.
+
+    При смене UIDVALIDITY (ящик пересоздан) прежние UID недействительны,
+    и воркер снова начинает с поиска всех непрочитанных писем.
+    """
+
+    __tablename__ = "mailbox_checkpoints"
+
+    id = Column(Integer, primary_key=True)
+    mailbox = Column(String(255), nullable=False, unique=True)  # <логин>/<папка>
+    uid_validity = Column(BigInteger, nullable=False)
+    last_uid = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
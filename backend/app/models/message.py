@@ -1,10 +1,11 @@
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, event, func, select, update
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
+from app.models.ticket import ROLLUP_ATTRIBUTES, Ticket, apply_state_change, rollup_state
 
 
 class AuthorType(str, Enum):
@@ -15,6 +16,8 @@ class AuthorType(str, Enum):
 
 class Message(Base):
     __tablename__ = "messages"
+    # Keyset‑пагинация истории тикета по (created_at, id)
+    __table_args__ = (Index("ix_messages_ticket_created_id", "ticket_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=False, index=True)
@@ -25,3 +28,51 @@ class Message(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     ticket = relationship("Ticket", back_populates="messages")
+
+
+def conversation_state_values(author_type: str, created_at: datetime) -> dict:
+    """Изменения денормализованного состояния диалога в tickets после нового сообщения."""
+
+    tickets = Ticket.__table__
+    values = {
+        tickets.c.message_count: tickets.c.message_count + 1,
+        tickets.c.last_message_at: created_at,
+        tickets.c.last_message_author_type: author_type,
+    }
+    if author_type == AuthorType.CUSTOMER.value:
+        values[tickets.c.last_customer_message_at] = created_at
+    elif author_type == AuthorType.AGENT.value:
+        values[tickets.c.first_agent_response_at] = func.coalesce(tickets.c.first_agent_response_at, created_at)
+    return values
+
+
+@event.listens_for(Message, "before_insert")
+def _set_created_at(mapper, connection, message: Message) -> None:
+    if message.created_at is None:
+        message.created_at = datetime.utcnow()
+
+
+@event.listens_for(Message, "after_insert")
+def _update_conversation_state(mapper, connection, message: Message) -> None:
+    # Атомарный UPDATE в той же транзакции: счётчик не теряется при параллельных записях.
+    # Загруженный в сессию Ticket увидит новые значения после commit/refresh.
+    tickets = Ticket.__table__
+    if message.author_type == AuthorType.AGENT.value:
+        # Первый ответ оператора фиксируем условным UPDATE: из параллельных ответов
+        # его выполнит ровно один, и только он добавит замер в скетч времени ответа
+        first = connection.execute(
+            update(tickets)
+            .where(tickets.c.id == message.ticket_id, tickets.c.first_agent_response_at.is_(None))
+            .values(first_agent_response_at=message.created_at)
+        )
+        if first.rowcount == 1:
+            row = connection.execute(
+                select(*(tickets.c[name] for name in ROLLUP_ATTRIBUTES)).where(tickets.c.id == message.ticket_id)
+            ).one()
+            new = rollup_state(*row)
+            apply_state_change(connection, new._replace(first_agent_response_at=None), new)
+    connection.execute(
+        update(tickets)
+        .where(tickets.c.id == message.ticket_id)
+        .values(conversation_state_values(message.author_type, message.created_at))
+    )
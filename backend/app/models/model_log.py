@@ -1,23 +1,77 @@
+import zlib
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, Text
 
+from app.core.config import get_settings
 from app.db.base import Base
 
 
+def compress_payload(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), get_settings().model_log_compression_level)
+
+
+def decompress_payload(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
 class ModelLog(Base):
     __tablename__ = "model_logs"
+    # Агрегаты по типу запроса за период
+    __table_args__ = (Index("ix_model_logs_type_created", "input_type", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     ticket_id = Column(Integer, ForeignKey("tickets.id"), nullable=True, index=True)
+    # Тикет перенесён в архив (tickets_archive): ссылка по FK снимается, id сохраняется здесь
+    archived_ticket_id = Column(Integer, nullable=True, index=True)
 
     model_name = Column(String(100), nullable=False)
     input_type = Column(String(50), nullable=False)  # classification / summary / answer
-    request_payload = Column(Text, nullable=False)
-    response_payload = Column(Text, nullable=False)
+
+    # Полезная нагрузка хранится сжатой (zlib) в *_z. Старые записи — открытым текстом
+    # в исходных колонках; для новых там пустая строка (колонки NOT NULL в старых БД).
+    # Читать и писать нужно через свойства request_payload / response_payload.
+    request_payload_text = Column("request_payload", Text, nullable=False, default="")
+    response_payload_text = Column("response_payload", Text, nullable=False, default="")
+    request_payload_z = Column(LargeBinary, nullable=True)
+    response_payload_z = Column(LargeBinary, nullable=True)
 
     confidence = Column(Float, nullable=True)
-    was_corrected = Column(Integer, default=0)  # 0 / 1
+    # Результат классификации в колонках (для SQL‑аналитики без разбора JSON). Старые
+    # записи заполняются из response_payload: python -m app.cli.model_log_archive backfill-columns
+    category_code = Column(String(100), nullable=True, index=True)
+    department_code = Column(String(100), nullable=True, index=True)
+    priority = Column(String(10), nullable=True, index=True)
+    language = Column(String(10), nullable=True)
+    auto_resolvable = Column(Boolean, nullable=True)
+    latency_ms = Column(Float, nullable=True)
+    was_corrected = Column(Integer, default=0)  # 0 / 1: оператор исправил priority, department или category
+    # Классификация учтена в classification_confusion / classification_calibration
+    # (app.services.classification_stats_service)
+    in_classification_stats = Column(Boolean, nullable=False, default=False, server_default="0")
 
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Когда полезная нагрузка перенесена в архив (app.services.model_log_archive)
+    archived_at = Column(DateTime, nullable=True, index=True)
+
+    @property
+    def request_payload(self) -> str:
+        if self.request_payload_z is not None:
+            return decompress_payload(self.request_payload_z)
+        return self.request_payload_text or ""
+
+    @request_payload.setter
+    def request_payload(self, value: str) -> None:
+        self.request_payload_z = compress_payload(value)
+        self.request_payload_text = ""
+
+    @property
+    def response_payload(self) -> str:
+        if self.response_payload_z is not None:
+            return decompress_payload(self.response_payload_z)
+        return self.response_payload_text or ""
 
+    @response_payload.setter
+    def response_payload(self, value: str) -> None:
+        self.response_payload_z = compress_payload(value)
+        self.response_payload_text = ""
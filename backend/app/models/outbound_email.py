@@ -0,0 +1,46 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from app.db.base import Base
+
+
+class OutboundEmailStatus(str, Enum):
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    # Постоянная ошибка (адрес отвергнут, 5xx) или исчерпаны попытки — письмо больше не отправляется
+    DEAD = "dead"
+
+
+class OutboundEmail(Base):
+    """Исходящее письмо в очереди отправки (ответ клиенту по email)."""
+
+    __tablename__ = "outbound_emails"
+    __table_args__ = (Index("ix_outbound_emails_status_run_after", "status", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Без FK: тикет может уехать в архив раньше, чем очистится очередь
+    ticket_id = Column(Integer, nullable=True, index=True)
+    to_address = Column(String(255), nullable=False)
+    subject = Column(String(500), nullable=False)
+    body = Column(Text, nullable=False)
+    # Message-ID генерируется один раз при постановке в очередь и не меняется на повторах
+    message_id = Column(String(255), nullable=True)
+
+    status = Column(String(20), nullable=False, default=OutboundEmailStatus.QUEUED.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=8)
+    last_error = Column(Text, nullable=True)
+
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Аренда письма отправителем, как у jobs
+    locked_by = Column(String(64), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    # Токен аренды, выданный claim_emails (не колонка). После commit locked_by
+    # перечитывается из БД и может уже принадлежать другому отправителю.
+    lease_token = None
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
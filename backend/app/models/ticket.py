@@ -1,10 +1,14 @@
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, event, inspect, select
 from sqlalchemy.orm import relationship
 
+from app.core.sla import has_department_policies, sla_deadlines
 from app.db.base import Base
+from app.models.department import Department
+from app.models.ticket_latency_sketch import apply_sketch_deltas, sketch_deltas
+from app.models.ticket_rollup import RollupState, apply_rollup_deltas, rollup_deltas
 
 
 class TicketStatus(str, Enum):
@@ -16,6 +20,12 @@ class TicketStatus(str, Enum):
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    __table_args__ = (
+        # Нарушения SLA, «горящие» тикеты и сортировка по сроку среди открытых
+        Index("ix_tickets_status_sla_due", "status", "sla_due_at"),
+        # Авто‑закрытие email‑тикетов без ответа клиента
+        Index("ix_tickets_channel_status_last_customer", "channel", "status", "last_customer_message_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     subject = Column(String(255), nullable=False)
@@ -45,5 +55,109 @@ class Ticket(Base):
     status_updated_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime, nullable=True)
 
+    # Сроки SLA по политике приоритета/департамента (app.core.sla). Проставляются при
+    # создании тикета и пересчитываются при смене приоритета или департамента.
+    first_response_due_at = Column(DateTime, nullable=True)
+    sla_due_at = Column(DateTime, nullable=True, index=True)
+
+    # Состояние диалога, поддерживается при каждой записи сообщения (app.models.message),
+    # чтобы не искать последнее сообщение запросом по messages
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True, index=True)
+    last_message_author_type = Column(String(20), nullable=True)
+    last_customer_message_at = Column(DateTime, nullable=True)
+    first_agent_response_at = Column(DateTime, nullable=True)
+
     department = relationship("Department")
     messages = relationship("Message", back_populates="ticket", cascade="all, delete-orphan")
+
+
+def _department_code(connection, department_id: int | None) -> str | None:
+    # Код нужен только для политик департаментов, без них запрос не делаем
+    if department_id is None or not has_department_policies():
+        return None
+    return connection.execute(select(Department.code).where(Department.id == department_id)).scalar()
+
+
+@event.listens_for(Ticket, "before_insert")
+def _set_sla_on_insert(mapper, connection, ticket: Ticket) -> None:
+    if ticket.created_at is None:
+        ticket.created_at = datetime.utcnow()
+    ticket.first_response_due_at, ticket.sla_due_at = sla_deadlines(
+        ticket.created_at, ticket.priority or "P3", _department_code(connection, ticket.department_id)
+    )
+
+
+@event.listens_for(Ticket, "before_update")
+def _set_sla_on_update(mapper, connection, ticket: Ticket) -> None:
+    state = inspect(ticket)
+    if not (state.attrs.priority.history.has_changes() or state.attrs.department_id.history.has_changes()):
+        return
+    ticket.first_response_due_at, ticket.sla_due_at = sla_deadlines(
+        ticket.created_at, ticket.priority, _department_code(connection, ticket.department_id)
+    )
+
+
+ROLLUP_ATTRIBUTES = (
+    "created_at",
+    "closed_at",
+    "status",
+    "channel",
+    "department_id",
+    "priority",
+    "request_type",
+    "first_agent_response_at",
+)
+_CLOSED = (TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value)
+
+
+def rollup_state(
+    created_at, closed_at, status, channel, department_id, priority, request_type, first_agent_response_at=None
+) -> RollupState:
+    return RollupState(
+        created_at=created_at,
+        closed_at=closed_at if status in _CLOSED else None,
+        status=status,
+        channel=channel,
+        department_id=department_id,
+        priority=priority,
+        request_type=request_type,
+        first_agent_response_at=first_agent_response_at,
+    )
+
+
+def apply_state_change(connection, old: RollupState | None, new: RollupState | None) -> None:
+    """Переносит вклад тикета в ticket_rollups и ticket_latency_sketches (None — тикета нет)."""
+
+    apply_rollup_deltas(connection, rollup_deltas(old, new))
+    apply_sketch_deltas(connection, sketch_deltas(old, new))
+
+
+def _ticket_rollup_state(ticket: Ticket) -> RollupState:
+    return rollup_state(*(getattr(ticket, name) for name in ROLLUP_ATTRIBUTES))
+
+
+@event.listens_for(Ticket, "after_insert")
+def _rollup_on_insert(mapper, connection, ticket: Ticket) -> None:
+    apply_state_change(connection, None, _ticket_rollup_state(ticket))
+
+
+@event.listens_for(Ticket, "before_update")
+def _rollup_on_update(mapper, connection, ticket: Ticket) -> None:
+    state = inspect(ticket)
+    changed = [state.attrs[name].history.has_changes() for name in ROLLUP_ATTRIBUTES]
+    if not any(changed):
+        return
+    # Прежние значения берём из строки в БД: UPDATE ещё не выполнен, а история
+    # атрибутов пуста, если значение меняли без предварительной загрузки
+    table = Ticket.__table__
+    old = connection.execute(
+        select(*(table.c[name] for name in ROLLUP_ATTRIBUTES)).where(table.c.id == ticket.id)
+    ).one()
+    # Неизменённые поля — тоже из БД: в объекте они могут быть устаревшими
+    # (first_agent_response_at проставляется UPDATE'ом при вставке сообщения)
+    new = [
+        getattr(ticket, name) if is_changed else old_value
+        for name, is_changed, old_value in zip(ROLLUP_ATTRIBUTES, changed, old)
+    ]
+    apply_state_change(connection, rollup_state(*old), rollup_state(*new))
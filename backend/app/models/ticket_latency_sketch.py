@@ -0,0 +1,72 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Column, Date, Integer, String, UniqueConstraint
+
+from app.core.quantile_sketch import bucket_index
+from app.db.base import Base
+from app.models.ticket_rollup import RollupState, upsert_increments
+
+METRICS = ("first_response", "resolution")
+KEY_COLUMNS = ("metric", "day", "channel", "department_id", "priority", "bucket")
+
+
+class TicketLatencySketch(Base):
+    """Дневные квантильные скетчи времени первого ответа и решения (app.core.quantile_sketch).
+
+    Строка — счётчик одной корзины скетча в разрезе канала, департамента и
+    приоритета. first_response учитывается в день первого ответа оператора,
+    resolution — в день закрытия. Как и ticket_rollups, таблица равна
+    пересчёту по tickets + tickets_archive: при изменении тикета его вклад
+    переносится (sketch_deltas).
+    """
+
+    __tablename__ = "ticket_latency_sketches"
+    __table_args__ = (UniqueConstraint(*KEY_COLUMNS, name="uq_ticket_latency_sketches_key"),)
+
+    id = Column(Integer, primary_key=True)
+    metric = Column(String(20), nullable=False)  # first_response / resolution
+    day = Column(Date, nullable=False)
+    channel = Column(String(50), nullable=False)
+    # 0 — департамент не задан (см. TicketRollup.department_id)
+    department_id = Column(Integer, nullable=False, default=0)
+    priority = Column(String(10), nullable=False)
+    bucket = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+SketchKey = Tuple[str, date, str, int, str, int]
+
+
+def _samples(state: RollupState):
+    if state.created_at is None:
+        return
+    if state.first_agent_response_at is not None:
+        yield "first_response", state.first_agent_response_at
+    if state.closed_at is not None:
+        yield "resolution", state.closed_at
+
+
+def add_sketch_contributions(totals: Dict[SketchKey, int], state: RollupState, sign: int) -> None:
+    attrs = (state.channel, state.department_id or 0, state.priority)
+    for metric, at in _samples(state):
+        seconds = max((at - state.created_at).total_seconds(), 0.0)
+        totals[(metric, at.date(), *attrs, bucket_index(seconds))] += sign
+
+
+def sketch_deltas(old: RollupState | None, new: RollupState | None) -> Dict[SketchKey, int]:
+    totals: Dict[SketchKey, int] = defaultdict(int)
+    if old is not None:
+        add_sketch_contributions(totals, old, -1)
+    if new is not None:
+        add_sketch_contributions(totals, new, 1)
+    return {key: count for key, count in totals.items() if count}
+
+
+def sketch_rows(deltas: Dict[SketchKey, int]) -> List[dict]:
+    return [dict(zip(KEY_COLUMNS, key), count=count) for key, count in deltas.items()]
+
+
+def apply_sketch_deltas(connection, deltas: Dict[SketchKey, int]) -> None:
+    upsert_increments(connection, TicketLatencySketch.__table__, KEY_COLUMNS, ("count",), sketch_rows(deltas))
@@ -0,0 +1,123 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, UniqueConstraint, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.db.base import Base
+
+GRANULARITIES = ("day", "hour")
+KEY_COLUMNS = ("granularity", "bucket_start", "channel", "department_id", "priority", "request_type", "status")
+MEASURE_COLUMNS = ("created", "closed", "resolution_seconds")
+
+
+class TicketRollup(Base):
+    """Счётчики тикетов по дням и часам в разрезе канала, департамента, приоритета, типа и статуса.
+
+    created — тикеты, созданные в интервале; closed и resolution_seconds — закрытые
+    в интервале. Ключ — текущие атрибуты тикета: при их изменении вклад тикета
+    переносится (см. rollup_deltas), поэтому таблица всегда равна GROUP BY по
+    tickets + tickets_archive (app.services.rollup_service.rebuild_rollups).
+    """
+
+    __tablename__ = "ticket_rollups"
+    __table_args__ = (UniqueConstraint(*KEY_COLUMNS, name="uq_ticket_rollups_key"),)
+
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String(10), nullable=False)  # day / hour
+    bucket_start = Column(DateTime, nullable=False)
+    channel = Column(String(50), nullable=False)
+    # 0 / "" — не задано: NULL в уникальном ключе не сравнивается, и upsert бы не сработал
+    department_id = Column(Integer, nullable=False, default=0)
+    priority = Column(String(10), nullable=False)
+    request_type = Column(String(50), nullable=False, default="")
+    status = Column(String(50), nullable=False)
+
+    created = Column(Integer, nullable=False, default=0)
+    closed = Column(Integer, nullable=False, default=0)
+    resolution_seconds = Column(Float, nullable=False, default=0.0)
+
+
+class RollupState(NamedTuple):
+    """Атрибуты тикета, от которых зависит его вклад в rollup и скетчи латентности. closed_at — только у закрытых."""
+
+    created_at: datetime | None
+    closed_at: datetime | None
+    status: str
+    channel: str
+    department_id: int | None
+    priority: str
+    request_type: str | None
+    first_agent_response_at: datetime | None = None
+
+
+RollupKey = Tuple[str, datetime, str, int, str, str, str]
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_rollup_contributions(totals: Dict[RollupKey, List[float]], state: RollupState, sign: int) -> None:
+    attrs = (state.channel, state.department_id or 0, state.priority, state.request_type or "", state.status)
+    for granularity in GRANULARITIES:
+        if state.created_at is not None:
+            totals[(granularity, bucket_start(state.created_at, granularity), *attrs)][0] += sign
+        if state.closed_at is not None:
+            entry = totals[(granularity, bucket_start(state.closed_at, granularity), *attrs)]
+            entry[1] += sign
+            if state.created_at is not None:
+                entry[2] += sign * max((state.closed_at - state.created_at).total_seconds(), 0.0)
+
+
+def rollup_deltas(old: RollupState | None, new: RollupState | None) -> Dict[RollupKey, List[float]]:
+    """Изменения счётчиков при переходе тикета из old в new (None — тикета нет)."""
+
+    totals: Dict[RollupKey, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    if old is not None:
+        add_rollup_contributions(totals, old, -1)
+    if new is not None:
+        add_rollup_contributions(totals, new, 1)
+    return {key: values for key, values in totals.items() if any(values)}
+
+
+def _rows(deltas: Dict[RollupKey, List[float]]) -> List[dict]:
+    return [
+        dict(zip(KEY_COLUMNS, key), created=created, closed=closed, resolution_seconds=seconds)
+        for key, (created, closed, seconds) in deltas.items()
+    ]
+
+
+def upsert_increments(connection, table, key_columns, measure_columns, rows: List[dict]) -> None:
+    """Upsert «счётчик += дельта» по уникальному ключу key_columns."""
+
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={name: table.c[name] + stmt.excluded[name] for name in measure_columns},
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(table)
+            .where(*(table.c[name] == row[name] for name in key_columns))
+            .values({name: table.c[name] + row[name] for name in measure_columns})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert(), row)
+
+
+def apply_rollup_deltas(connection, deltas: Dict[RollupKey, List[float]]) -> None:
+    """Применяет дельты в той же транзакции, что и изменение тикета."""
+
+    upsert_increments(connection, TicketRollup.__table__, KEY_COLUMNS, MEASURE_COLUMNS, _rows(deltas))
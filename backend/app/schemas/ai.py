@@ -8,6 +8,7 @@ class ClassificationResult(BaseModel):
     language: str = Field(..., description="Определённый язык обращения")
     auto_resolvable: bool = Field(False, description="Можно ли автоматически решить")
     confidence: float = Field(..., description="Уверенность модели 0-1")
+    latency_ms: float | None = Field(None, description="Время ответа модели, мс (замеряется при вызове, не моделью)")
 
 
 class SummaryResult(BaseModel):
@@ -27,3 +27,83 @@ class OverviewMetrics(BaseModel):
     p3_tickets: int
     p4_tickets: int
     generated_at: datetime
+
+
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    # Значение разреза group_by (None — не задано или разрез не запрошен)
+    group: str | None = None
+    created: int
+    closed: int
+    auto_closed: int
+    avg_resolution_minutes: float | None
+
+
+class TimeseriesResponse(BaseModel):
+    granularity: str
+    date_from: datetime
+    date_to: datetime
+    group_by: str | None
+    points: list[TimeseriesPoint]
+
+
+class LatencyPercentiles(BaseModel):
+    group: str | None = None
+    metric: str  # first_response / resolution
+    count: int
+    p50_minutes: float
+    p90_minutes: float
+    p99_minutes: float
+
+
+class LatencyPercentilesResponse(BaseModel):
+    date_from: datetime
+    date_to: datetime
+    group_by: str | None
+    items: list[LatencyPercentiles]
+
+
+class ConfusionCell(BaseModel):
+    predicted: str | None
+    actual: str | None
+    count: int
+
+
+class ConfusionMatrixResponse(BaseModel):
+    field: str
+    total: int
+    # Доля классификаций, где метку не исправляли, %
+    accuracy: float | None
+    cells: list[ConfusionCell]
+
+
+class CalibrationBucket(BaseModel):
+    confidence_from: float
+    confidence_to: float
+    classifications: int
+    corrected: int
+    accuracy: float | None
+    # Если бы порог авто‑закрытия был confidence_from
+    classifications_at_or_above: int
+    accuracy_at_or_above: float | None
+
+
+class CalibrationResponse(BaseModel):
+    auto_close_confidence_threshold: float
+    buckets: list[CalibrationBucket]
+
+
+class ModelStatsRow(BaseModel):
+    group: str | None
+    classifications: int
+    avg_confidence: float | None
+    auto_resolvable_percent: float
+    corrected_percent: float
+    avg_latency_ms: float | None
+
+
+class ModelStatsResponse(BaseModel):
+    group_by: str
+    date_from: datetime | None
+    date_to: datetime | None
+    items: list[ModelStatsRow]
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 
 
 class MessageBase(BaseModel):
@@ -59,8 +59,10 @@ class TicketRead(BaseModel):
     department_code: Optional[str] = None
     department_name: Optional[str] = None
     auto_closed_by_ai: bool
-    # SLA (рассчитывается на лету на основе приоритета и времени)
+    # SLA: сроки по политике приоритета/департамента, прошедшее время — на момент запроса
     sla_target_minutes: int
+    sla_due_at: Optional[datetime] = None
+    first_response_due_at: Optional[datetime] = None
     sla_elapsed_minutes: float
     sla_breached: bool
     status_elapsed_minutes: float
@@ -68,12 +70,16 @@ class TicketRead(BaseModel):
     created_at: datetime
     updated_at: datetime
     closed_at: Optional[datetime] = None
+    # Тикет перенесён в архив закрытых (только чтение)
+    archived: bool = False
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class TicketDetails(TicketRead):
+    # Последние N сообщений в хронологическом порядке; более ранние — через GET /tickets/{id}/messages
     messages: List[MessageRead] = []
+    has_more_messages: bool = False
 
 
 class TicketStatusUpdate(BaseModel):
@@ -93,6 +99,14 @@ class TicketStatusUpdate(BaseModel):
         None,
         description="Отключить ли авто‑ответы ИИ для этого тикета",
     )
+    department_code: Optional[str] = Field(
+        None,
+        description="Перевести тикет в другой департамент (код)",
+    )
+    category_code: Optional[str] = Field(
+        None,
+        description="Исправленная подкатегория (код)",
+    )
 
 
 class ExternalTicketCreate(BaseModel):
@@ -124,3 +138,78 @@ class ExternalTicketCreate(BaseModel):
     department_code: Optional[str] = Field(
         None, description="Код департамента, если уже известен"
     )
+
+
+class BulkTicketRow(ExternalTicketCreate):
+    """Строка массовой загрузки тикетов (NDJSON), например из старого helpdesk."""
+
+    created_at: Optional[datetime] = Field(None, description="Исходная дата создания тикета")
+    closed_at: Optional[datetime] = Field(None, description="Исходная дата закрытия тикета")
+
+
+class BulkIngestError(BaseModel):
+    line: int = Field(..., description="Номер строки во входном потоке (с 1)")
+    error: str
+
+
+class BulkIngestResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    failed: int = 0
+    errors: List[BulkIngestError] = []
+
+
+class TicketBulkFilter(BaseModel):
+    """Фильтр тикетов для массового обновления (условия объединяются через AND)."""
+
+    # Пустая строка не условие: без min_length фильтр {"status": ""} обновил бы все тикеты
+    status: Optional[str] = Field(None, min_length=1)
+    channel: Optional[str] = Field(None, min_length=1)
+    priority: Optional[str] = Field(None, min_length=1)
+    request_type: Optional[str] = Field(None, min_length=1)
+    category_code: Optional[str] = Field(None, min_length=1)
+    department_code: Optional[str] = Field(None, min_length=1)
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def _not_empty(self) -> "TicketBulkFilter":
+        # Та же проверка истинности, что и в ticket_service._filter_conditions
+        if not any(self.model_dump().values()):
+            raise ValueError("filter must contain at least one condition")
+        return self
+
+
+class TicketBulkUpdate(BaseModel):
+    """Массовое изменение тикетов: по списку id или по фильтру."""
+
+    ids: Optional[List[int]] = Field(None, description="Список id тикетов")
+    filter: Optional[TicketBulkFilter] = Field(None, description="Фильтр тикетов вместо списка id")
+
+    status: Optional[str] = Field(None, description="Новый статус (new/in_progress/closed/auto_closed)")
+    priority: Optional[str] = Field(None, description="Новый приоритет (P1-P4)")
+    request_type: Optional[str] = Field(None, description="Новая основная категория обращения")
+    ai_disabled: Optional[bool] = Field(None, description="Отключить ли авто‑ответы ИИ")
+
+    @model_validator(mode="after")
+    def _check_target_and_changes(self) -> "TicketBulkUpdate":
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("exactly one of ids or filter must be provided")
+        if all(
+            value is None
+            for value in (self.status, self.priority, self.request_type, self.ai_disabled)
+        ):
+            raise ValueError("at least one of status, priority, request_type, ai_disabled must be set")
+        return self
+
+
+class TicketBulkUpdateResult(BaseModel):
+    updated: int
+
+
+class MessagePage(BaseModel):
+    items: List[MessageRead] = []
+    next_cursor: Optional[int] = Field(
+        None, description="id последнего сообщения страницы; передать в cursor для следующей страницы"
+    )
+    has_more: bool = False
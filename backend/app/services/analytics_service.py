@@ -1,220 +1,339 @@
-from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+from datetime import datetime
 
-from sqlalchemy import func, or_
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.config import get_settings
+from app.db.async_session import read_session_factory
+from app.models.archive import TicketArchiveStats
 from app.models.model_log import ModelLog
 from app.models.ticket import Ticket, TicketStatus
-from app.models.message import Message, AuthorType
-from app.schemas.analytics import OverviewMetrics
+from app.schemas.analytics import ModelStatsResponse, ModelStatsRow, OverviewMetrics
 
+logger = logging.getLogger(__name__)
 
-def get_overview_metrics(db: Session) -> OverviewMetrics:
-    now = datetime.utcnow()
-    today_start = datetime(now.year, now.month, now.day)
+REQUEST_TYPE_BUCKETS = {
+    "problem": "problem",
+    "difficulty": "problem",
+    "question": "question",
+    "feedback": "feedback",
+    "proposal": "feedback",
+    "career": "career",
+    "job": "career",
+    "partner": "partner",
+    "other": "other",
+    None: "other",
+}
+PRIORITIES = ("P1", "P2", "P3", "P4")
 
-    total_tickets = db.query(func.count(Ticket.id)).scalar() or 0
-    new_today = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.created_at >= today_start)
-        .scalar()
-        or 0
-    )
 
-    auto_closed_count = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.status == TicketStatus.AUTO_CLOSED.value)
-        .scalar()
-        or 0
-    )
-    in_progress_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.status == TicketStatus.IN_PROGRESS.value)
-        .scalar()
-        or 0
-    )
-    closed_today = (
-        db.query(func.count(Ticket.id))
-        .filter(
-            Ticket.closed_at.isnot(None),
-            Ticket.closed_at >= today_start,
-            Ticket.status.in_([TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value]),
-        )
-        .scalar()
-        or 0
-    )
+def _archived_totals(db: Session) -> dict:
+    """Вклад архивных тикетов в метрики «за всё время» (из ticket_archive_stats)."""
 
-    # Кол-во заявок по категориям (request_type)
-    problem_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.request_type.in_(["problem", "difficulty"]))
-        .scalar()
-        or 0
-    )
-    question_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.request_type == "question")
-        .scalar()
-        or 0
-    )
-    feedback_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.request_type.in_(["feedback", "proposal"]))
-        .scalar()
-        or 0
-    )
-    career_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.request_type.in_(["career", "job"]))
-        .scalar()
-        or 0
-    )
-    partner_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.request_type == "partner")
-        .scalar()
-        or 0
-    )
-    other_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(or_(Ticket.request_type == "other", Ticket.request_type.is_(None)))
-        .scalar()
-        or 0
-    )
+    totals = {
+        "total": 0,
+        "auto_closed": 0,
+        "user_auto_closed": 0,
+        "auto_close_seconds": 0.0,
+        "auto_close_samples": 0,
+        "request_types": {bucket: 0 for bucket in set(REQUEST_TYPE_BUCKETS.values())},
+        "priorities": {priority: 0 for priority in PRIORITIES},
+    }
+    for stats in db.query(TicketArchiveStats).all():
+        totals["total"] += stats.tickets
+        if stats.status == TicketStatus.AUTO_CLOSED.value:
+            totals["auto_closed"] += stats.tickets
+        if stats.status == TicketStatus.CLOSED.value and stats.auto_closed_by_ai and not stats.agent_involved:
+            totals["user_auto_closed"] += stats.tickets
+        totals["auto_close_seconds"] += stats.auto_close_seconds
+        totals["auto_close_samples"] += stats.auto_close_samples
+        bucket = REQUEST_TYPE_BUCKETS.get(stats.request_type)
+        if bucket:
+            totals["request_types"][bucket] += stats.tickets
+        if stats.priority in totals["priorities"]:
+            totals["priorities"][stats.priority] += stats.tickets
+    return totals
 
-    # Кол-во заявок по приоритетам
-    p1_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.priority == "P1")
-        .scalar()
-        or 0
-    )
-    p2_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.priority == "P2")
-        .scalar()
-        or 0
-    )
-    p3_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.priority == "P3")
-        .scalar()
-        or 0
-    )
-    p4_tickets = (
-        db.query(func.count(Ticket.id))
-        .filter(Ticket.priority == "P4")
-        .scalar()
-        or 0
-    )
-    auto_closed_percent = (auto_closed_count / total_tickets * 100.0) if total_tickets else 0.0
 
-    # SLA по открытым тикетам (NEW + IN_PROGRESS)
-    sla_map = {
-        "P1": 30,   # минуты до целевого решения
-        "P2": 60,
-        "P3": 240,
-        "P4": 1440,
-    }
-    open_sla_ok_tickets = 0
-    open_sla_breached_tickets = 0
-    open_tickets = (
-        db.query(Ticket.priority, Ticket.created_at, Ticket.status)
-        .filter(Ticket.status.in_([TicketStatus.NEW.value, TicketStatus.IN_PROGRESS.value]))
-        .all()
+def _duration_seconds(dialect: str, start, end):
+    """SQL‑выражение «секунд между start и end» или None, если диалект не поддержан."""
+
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start)
+    if dialect == "sqlite":
+        # julianday — дробные сутки; округляем до мс, чтобы убрать погрешность float
+        return func.round((func.julianday(end) - func.julianday(start)) * 86400.0, 3)
+    return None
+
+
+def _auto_close_seconds_in_python(db: Session) -> tuple[float, int]:
+    # Фолбэк для прочих БД: разница считается в Python, без специфичных SQL‑функций
+    total_seconds = 0.0
+    samples = 0
+    rows = db.query(Ticket.created_at, Ticket.closed_at).filter(
+        Ticket.status == TicketStatus.AUTO_CLOSED.value,
+        Ticket.created_at.isnot(None),
+        Ticket.closed_at.isnot(None),
     )
-    for priority, created_at, status in open_tickets:
-        if not created_at:
-            continue
-        target = sla_map.get(priority, 240)
-        elapsed_minutes = max((now - created_at).total_seconds() / 60.0, 0.0)
-        if elapsed_minutes > target:
-            open_sla_breached_tickets += 1
-        else:
-            open_sla_ok_tickets += 1
+    for created_at, closed_at in rows:
+        delta = (closed_at - created_at).total_seconds()
+        if delta >= 0:
+            total_seconds += delta
+            samples += 1
+    return total_seconds, samples
+
+
+def _count_if(condition):
+    return func.count(case((condition, 1)))
+
+
+def _ticket_aggregates(db: Session, now: datetime, today_start: datetime) -> dict:
+    """Все счётчики по горячей таблице tickets за один проход (условная агрегация)."""
+
+    open_status = Ticket.status.in_([TicketStatus.NEW.value, TicketStatus.IN_PROGRESS.value])
+    auto_closed = Ticket.status == TicketStatus.AUTO_CLOSED.value
+    columns = [
+        func.count().label("total"),
+        _count_if(Ticket.created_at >= today_start).label("new_today"),
+        _count_if(auto_closed).label("auto_closed"),
+        _count_if(Ticket.status == TicketStatus.IN_PROGRESS.value).label("in_progress"),
+        _count_if(
+            and_(
+                Ticket.status.in_([TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value]),
+                Ticket.closed_at >= today_start,
+            )
+        ).label("closed_today"),
+        _count_if(open_status).label("open"),
+        _count_if(and_(open_status, Ticket.sla_due_at < now)).label("sla_breached"),
+        # Пользователь подтвердил авто‑закрытие, оператор в диалоге не участвовал
+        _count_if(
+            and_(
+                Ticket.status == TicketStatus.CLOSED.value,
+                Ticket.auto_closed_by_ai.is_(True),
+                Ticket.first_agent_response_at.is_(None),
+            )
+        ).label("user_auto_closed"),
+    ]
+    for bucket in sorted(set(REQUEST_TYPE_BUCKETS.values())):
+        keys = [key for key, value in REQUEST_TYPE_BUCKETS.items() if value == bucket]
+        condition = Ticket.request_type.in_([key for key in keys if key is not None])
+        if None in keys:
+            condition = or_(condition, Ticket.request_type.is_(None))
+        columns.append(_count_if(condition).label(f"request_type_{bucket}"))
+    for priority in PRIORITIES:
+        columns.append(_count_if(Ticket.priority == priority).label(f"priority_{priority}"))
+
+    seconds = _duration_seconds(db.get_bind().dialect.name, Ticket.created_at, Ticket.closed_at)
+    if seconds is not None:
+        auto_close_sample = and_(auto_closed, Ticket.created_at.isnot(None), Ticket.closed_at >= Ticket.created_at)
+        columns.append(func.sum(case((auto_close_sample, seconds))).label("auto_close_seconds"))
+        columns.append(_count_if(auto_close_sample).label("auto_close_samples"))
+
+    row = dict(db.execute(select(*columns)).one()._mapping)
+    if seconds is None:
+        row["auto_close_seconds"], row["auto_close_samples"] = _auto_close_seconds_in_python(db)
+    return row
+
+
+def get_overview_metrics(db: Session) -> OverviewMetrics:
+    """Метрики дашборда: один агрегирующий проход по tickets, один по model_logs и агрегаты архива."""
+
+    now = datetime.utcnow()
+    today_start = datetime(now.year, now.month, now.day)
+
+    hot = _ticket_aggregates(db, now, today_start)
+    # Архивные тикеты (закрыты давно) учитываем через агрегаты, не сканируя архив
+    archived = _archived_totals(db)
+
+    total_tickets = hot["total"] + archived["total"]
+    auto_closed_count = hot["auto_closed"] + archived["auto_closed"]
+    auto_closed_percent = (auto_closed_count / total_tickets * 100.0) if total_tickets else 0.0
 
     # Упрощённая метрика: пока нет хранения времени первого ответа, берём время до закрытия авто‑тикетов.
-    # Считаем разницу в Python, чтобы не зависеть от специфичных SQL‑функций БД.
     avg_first_response_minutes: float | None = None
-    if auto_closed_count:
-        auto_tickets = (
-            db.query(Ticket.created_at, Ticket.closed_at)
-            .filter(
-                Ticket.status == TicketStatus.AUTO_CLOSED.value,
-                Ticket.created_at.isnot(None),
-                Ticket.closed_at.isnot(None),
-            )
-            .all()
-        )
-        total_seconds = 0.0
-        sample_count = 0
-        for created_at, closed_at in auto_tickets:
-            try:
-                delta = (closed_at - created_at).total_seconds()
-            except Exception:
-                continue
-            if delta is not None and delta >= 0:
-                total_seconds += delta
-                sample_count += 1
-        if sample_count:
-            avg_first_response_minutes = total_seconds / 60.0 / sample_count
+    sample_count = (hot["auto_close_samples"] or 0) + archived["auto_close_samples"]
+    if sample_count:
+        total_seconds = (hot["auto_close_seconds"] or 0.0) + archived["auto_close_seconds"]
+        avg_first_response_minutes = total_seconds / 60.0 / sample_count
 
     # Оценка "точности" по признаку was_corrected
-    total_classifications = (
-        db.query(func.count(ModelLog.id)).filter(ModelLog.input_type == "classification").scalar() or 0
-    )
-    incorrect = (
-        db.query(func.count(ModelLog.id))
-        .filter(ModelLog.input_type == "classification", ModelLog.was_corrected == 1)
-        .scalar()
-        or 0
-    )
+    is_classification = ModelLog.input_type == "classification"
+    total_classifications, incorrect = db.execute(
+        select(
+            func.count(),
+            _count_if(ModelLog.was_corrected == 1),
+        ).where(is_classification)
+    ).one()
     classification_accuracy: float | None
     if total_classifications:
         classification_accuracy = (total_classifications - incorrect) / total_classifications * 100.0
     else:
         classification_accuracy = None
 
-    # Авто‑закрытые тикеты, где:
-    # 1) пользователь подтвердил авто‑закрытие (status=CLOSED и auto_closed_by_ai=True),
-    # 2) оператор ни разу не участвовал в диалоге (нет сообщений с author_type=agent).
-    agent_ticket_ids = {
-        ticket_id
-        for (ticket_id,) in db.query(Message.ticket_id)
-        .filter(Message.author_type == AuthorType.AGENT.value)
-        .distinct()
-        .all()
-    }
-    user_auto_closed_tickets_query = db.query(func.count(Ticket.id)).filter(
-        Ticket.status == TicketStatus.CLOSED.value,
-        Ticket.auto_closed_by_ai.is_(True),
-    )
-    if agent_ticket_ids:
-        user_auto_closed_tickets_query = user_auto_closed_tickets_query.filter(
-            ~Ticket.id.in_(agent_ticket_ids)
-        )
-    user_auto_closed_tickets = user_auto_closed_tickets_query.scalar() or 0
+    def _request_type(bucket: str) -> int:
+        return hot[f"request_type_{bucket}"] + archived["request_types"][bucket]
+
+    def _priority(priority: str) -> int:
+        return hot[f"priority_{priority}"] + archived["priorities"][priority]
 
     return OverviewMetrics(
         total_tickets=total_tickets,
-        new_today=new_today,
-        in_progress_tickets=in_progress_tickets,
-        closed_today=closed_today,
+        new_today=hot["new_today"],
+        in_progress_tickets=hot["in_progress"],
+        closed_today=hot["closed_today"],
         auto_closed_percent=auto_closed_percent,
-        open_sla_ok_tickets=open_sla_ok_tickets,
-        open_sla_breached_tickets=open_sla_breached_tickets,
-        user_auto_closed_tickets=user_auto_closed_tickets,
+        open_sla_ok_tickets=hot["open"] - hot["sla_breached"],
+        open_sla_breached_tickets=hot["sla_breached"],
+        user_auto_closed_tickets=hot["user_auto_closed"] + archived["user_auto_closed"],
         avg_first_response_minutes=avg_first_response_minutes,
         classification_accuracy=classification_accuracy,
-        problem_tickets=problem_tickets,
-        question_tickets=question_tickets,
-        feedback_tickets=feedback_tickets,
-        career_tickets=career_tickets,
-        partner_tickets=partner_tickets,
-        other_tickets=other_tickets,
-        p1_tickets=p1_tickets,
-        p2_tickets=p2_tickets,
-        p3_tickets=p3_tickets,
-        p4_tickets=p4_tickets,
+        problem_tickets=_request_type("problem"),
+        question_tickets=_request_type("question"),
+        feedback_tickets=_request_type("feedback"),
+        career_tickets=_request_type("career"),
+        partner_tickets=_request_type("partner"),
+        other_tickets=_request_type("other"),
+        p1_tickets=_priority("P1"),
+        p2_tickets=_priority("P2"),
+        p3_tickets=_priority("P3"),
+        p4_tickets=_priority("P4"),
         generated_at=now,
     )
+
+
+async def get_overview_metrics_async(db: AsyncSession) -> OverviewMetrics:
+    """Async-вариант для ручки API.
+
+    Запросы те же, что и в sync-версии, но выполняются через run_sync поверх
+    async-драйвера и не занимают поток из threadpool.
+    """
+
+    return await db.run_sync(get_overview_metrics)
+
+
+MODEL_STATS_GROUPS = {
+    "category": ModelLog.category_code,
+    "department": ModelLog.department_code,
+    "priority": ModelLog.priority,
+    "language": ModelLog.language,
+}
+
+
+def get_model_stats(
+    db: Session,
+    group_by: str = "category",
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+) -> ModelStatsResponse:
+    """Классификации по предсказанной метке: число, средняя уверенность, доли авто‑решаемых
+    и исправленных, среднее время ответа модели. Один GROUP BY по колонкам model_logs."""
+
+    group_column = MODEL_STATS_GROUPS[group_by]
+    conditions = [ModelLog.input_type == "classification", ModelLog.priority.isnot(None)]
+    if date_from:
+        conditions.append(ModelLog.created_at >= date_from)
+    if date_to:
+        conditions.append(ModelLog.created_at < date_to)
+    rows = db.execute(
+        select(
+            group_column,
+            func.count(),
+            func.avg(ModelLog.confidence),
+            _count_if(ModelLog.auto_resolvable.is_(True)),
+            _count_if(ModelLog.was_corrected == 1),
+            func.avg(ModelLog.latency_ms),
+        )
+        .where(*conditions)
+        .group_by(group_column)
+        .order_by(func.count().desc(), group_column)
+    ).all()
+    return ModelStatsResponse(
+        group_by=group_by,
+        date_from=date_from,
+        date_to=date_to,
+        items=[
+            ModelStatsRow(
+                group=group,
+                classifications=count,
+                avg_confidence=round(avg_confidence, 3) if avg_confidence is not None else None,
+                auto_resolvable_percent=round(auto_resolvable / count * 100.0, 2),
+                corrected_percent=round(corrected / count * 100.0, 2),
+                avg_latency_ms=round(avg_latency, 1) if avg_latency is not None else None,
+            )
+            for group, count, avg_confidence, auto_resolvable, corrected, avg_latency in rows
+        ],
+    )
+
+
+async def get_model_stats_async(db: AsyncSession, **params) -> ModelStatsResponse:
+    return await db.run_sync(lambda session: get_model_stats(session, **params))
+
+
+class _OverviewCache:
+    metrics: OverviewMetrics | None = None
+    computed_at: float = float("-inf")
+    refresh: asyncio.Task | None = None
+
+
+_overview_cache = _OverviewCache()
+
+
+async def _compute_overview() -> OverviewMetrics:
+    # Своя сессия: пересчёт может пережить запрос, который его запустил
+    async with (await read_session_factory())() as db:
+        return await get_overview_metrics_async(db)
+
+
+async def _refresh_overview() -> OverviewMetrics:
+    try:
+        metrics = await _compute_overview()
+        _overview_cache.metrics = metrics
+        _overview_cache.computed_at = time.monotonic()
+        return metrics
+    except Exception:
+        logger.exception("Overview metrics refresh failed")
+        raise
+    finally:
+        _overview_cache.refresh = None
+
+
+def _start_refresh() -> asyncio.Task:
+    """Единственный пересчёт на процесс: все промахи кэша ждут одну и ту же задачу."""
+
+    task = _overview_cache.refresh
+    # Задача другого (уже остановленного) event loop не завершится — запускаем заново
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.create_task(_refresh_overview())
+        # Ошибка фонового пересчёта уже залогирована; помечаем её полученной
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        _overview_cache.refresh = task
+    return _overview_cache.refresh
+
+
+async def get_cached_overview_metrics() -> OverviewMetrics:
+    """Метрики дашборда из кэша процесса.
+
+    - моложе TTL — отдаются как есть;
+    - старше TTL, но в пределах окна stale — отдаются сразу, а пересчёт идёт в фоне;
+    - иначе запрос ждёт пересчёта (один на все одновременные запросы).
+    generated_at — время расчёта снимка. TTL = 0 отключает кэш.
+    """
+
+    settings = get_settings()
+    ttl = settings.analytics_overview_cache_ttl_seconds
+    if ttl <= 0:
+        return await _compute_overview()
+
+    cached = _overview_cache.metrics
+    age = time.monotonic() - _overview_cache.computed_at
+    if cached is not None and age < ttl:
+        return cached
+    if cached is not None and age < ttl + settings.analytics_overview_stale_seconds:
+        _start_refresh()
+        return cached
+    # shield: отмена одного запроса не прерывает пересчёт, которого ждут остальные
+    return await asyncio.shield(_start_refresh())
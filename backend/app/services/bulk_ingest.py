@@ -0,0 +1,251 @@
+import io
+import json
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app.core.sla import sla_deadlines
+from app.models.message import AuthorType, Message
+from app.models.ticket import Ticket, TicketStatus
+from app.schemas.ticket import BulkIngestError, BulkIngestResult, BulkTicketRow
+from app.services.department_registry import resolve_department_ids
+from app.services.rollup_service import add_inserted_tickets
+
+DEFAULT_BATCH_SIZE = 1000
+# Ошибки считаются все, но в ответ попадают только первые N, чтобы не раздувать его
+MAX_REPORTED_ERRORS = 1000
+
+TICKET_COLUMNS = (
+    "id",
+    "subject",
+    "description",
+    "channel",
+    "language",
+    "customer_email",
+    "customer_username",
+    "external_user_id",
+    "request_type",
+    "category_code",
+    "priority",
+    "status",
+    "department_id",
+    "auto_closed_by_ai",
+    "ai_disabled",
+    "created_at",
+    "updated_at",
+    "status_updated_at",
+    "closed_at",
+    "first_response_due_at",
+    "sla_due_at",
+    "message_count",
+    "last_message_at",
+    "last_message_author_type",
+    "last_customer_message_at",
+)
+MESSAGE_COLUMNS = ("ticket_id", "author_type", "body", "language", "created_at")
+
+ParsedRow = Tuple[int, BulkTicketRow]
+
+
+def iter_ndjson_lines(lines: Iterable[str | bytes]) -> Iterator[Tuple[int, str]]:
+    """Нумерует непустые строки NDJSON (номер строки считается с 1)."""
+
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if line:
+            yield line_no, line
+
+
+def _ticket_values(row: BulkTicketRow, department_id: int | None, now: datetime) -> dict[str, Any]:
+    created_at = row.created_at or now
+    closed_at = row.closed_at
+    if closed_at is None and row.status in {TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value}:
+        closed_at = created_at
+    # Вставка идёт мимо ORM, поэтому сроки SLA считаем здесь
+    first_response_due_at, sla_due_at = sla_deadlines(created_at, row.priority, row.department_code)
+    return {
+        "subject": row.subject,
+        "description": row.description,
+        "channel": row.channel,
+        "language": row.language,
+        "customer_email": row.customer_email,
+        "customer_username": row.customer_username,
+        "external_user_id": row.external_user_id,
+        "request_type": row.request_type,
+        "category_code": row.category_code,
+        "priority": row.priority,
+        "status": row.status,
+        "department_id": department_id,
+        "auto_closed_by_ai": row.status == TicketStatus.AUTO_CLOSED.value,
+        "ai_disabled": False,
+        "created_at": created_at,
+        "updated_at": closed_at or created_at,
+        "status_updated_at": closed_at or created_at,
+        "closed_at": closed_at,
+        "first_response_due_at": first_response_due_at,
+        "sla_due_at": sla_due_at,
+        # Состояние диалога с единственным первым сообщением клиента (_message_values)
+        "message_count": 1,
+        "last_message_at": created_at,
+        "last_message_author_type": AuthorType.CUSTOMER.value,
+        "last_customer_message_at": created_at,
+    }
+
+
+def _message_values(ticket_id: int, ticket_values: dict[str, Any]) -> dict[str, Any]:
+    # Первое сообщение от клиента
+    return {
+        "ticket_id": ticket_id,
+        "author_type": AuthorType.CUSTOMER.value,
+        "body": ticket_values["description"],
+        "language": ticket_values["language"],
+        "created_at": ticket_values["created_at"],
+    }
+
+
+def _copy_value(value: Any) -> str:
+    # CSV для COPY: пустое поле без кавычек — NULL, "" — пустая строка
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, int):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_rows(db: Session, table: str, columns: Tuple[str, ...], rows: List[dict[str, Any]]) -> None:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_copy_value(row[col]) for col in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    raw_connection = db.connection().connection
+    cursor = raw_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _insert_rows_postgres(db: Session, ticket_rows: List[dict[str, Any]]) -> None:
+    # id заранее берём из последовательности, чтобы сразу связать сообщения с тикетами
+    ids = db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('tickets', 'id')) FROM generate_series(1, :n)"),
+        {"n": len(ticket_rows)},
+    ).scalars()
+    for ticket_id, values in zip(ids, ticket_rows):
+        values["id"] = ticket_id
+
+    _copy_rows(db, Ticket.__tablename__, TICKET_COLUMNS, ticket_rows)
+    _copy_rows(
+        db,
+        Message.__tablename__,
+        MESSAGE_COLUMNS,
+        [_message_values(values["id"], values) for values in ticket_rows],
+    )
+
+
+def _insert_rows_generic(db: Session, ticket_rows: List[dict[str, Any]]) -> None:
+    # SQLite (и прочие БД) без RETURNING для executemany: тикеты вставляются
+    # построчно в одной транзакции, сообщения — одним executemany.
+    ticket_insert = insert(Ticket.__table__)
+    message_rows = []
+    for values in ticket_rows:
+        result = db.execute(ticket_insert, values)
+        message_rows.append(_message_values(result.inserted_primary_key[0], values))
+    db.execute(insert(Message.__table__), message_rows)
+
+
+def _insert_rows(db: Session, ticket_rows: List[dict[str, Any]]) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        _insert_rows_postgres(db, ticket_rows)
+    else:
+        _insert_rows_generic(db, ticket_rows)
+    add_inserted_tickets(db, ticket_rows)
+
+
+def _record_error(result: BulkIngestResult, line: int, error: str) -> None:
+    result.failed += 1
+    if len(result.errors) < MAX_REPORTED_ERRORS:
+        result.errors.append(BulkIngestError(line=line, error=error))
+
+
+def ingest_batch(db: Session, lines: List[Tuple[int, str]], result: BulkIngestResult) -> None:
+    """Загружает одну пачку строк NDJSON одной транзакцией.
+
+    Невалидные строки и строки, на которых упала вставка, попадают в
+    result.errors и не прерывают загрузку остальной пачки.
+    """
+
+    result.received += len(lines)
+
+    parsed: List[ParsedRow] = []
+    for line_no, line in lines:
+        try:
+            parsed.append((line_no, BulkTicketRow(**json.loads(line))))
+        except (ValueError, TypeError, ValidationError) as exc:
+            _record_error(result, line_no, str(exc))
+    if not parsed:
+        return
+
+    department_ids = resolve_department_ids(
+        db, {row.department_code for _, row in parsed if row.department_code}
+    )
+    now = datetime.utcnow()
+    prepared = [
+        (
+            line_no,
+            _ticket_values(
+                row,
+                department_ids.get(row.department_code) if row.department_code else None,
+                now,
+            ),
+        )
+        for line_no, row in parsed
+    ]
+
+    try:
+        with db.begin_nested():
+            _insert_rows(db, [values for _, values in prepared])
+        result.inserted += len(prepared)
+    except Exception:
+        # Пачка не вставилась целиком — изолируем проблемные строки по одной
+        for line_no, values in prepared:
+            values.pop("id", None)
+            try:
+                with db.begin_nested():
+                    _insert_rows(db, [values])
+                result.inserted += 1
+            except Exception as exc:
+                _record_error(result, line_no, str(getattr(exc, "orig", exc)))
+
+    db.commit()
+
+
+def ingest_ndjson(
+    db: Session,
+    lines: Iterable[str | bytes],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> BulkIngestResult:
+    result = BulkIngestResult()
+    batch: List[Tuple[int, str]] = []
+    for item in iter_ndjson_lines(lines):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            ingest_batch(db, batch, result)
+            batch = []
+    if batch:
+        ingest_batch(db, batch, result)
+    return result
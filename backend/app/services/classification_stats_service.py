@@ -0,0 +1,325 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.archive import ArchivedTicket
+from app.models.classification_stats import (
+    CORRECTABLE_FIELDS,
+    MODEL_FIELDS,
+    ClassificationCalibration,
+    ClassificationConfusion,
+    ClassificationCorrection,
+)
+from app.models.model_log import ModelLog
+from app.models.ticket import Ticket
+from app.models.ticket_rollup import upsert_increments
+from app.schemas.ai import ClassificationResult
+from app.schemas.analytics import CalibrationBucket, CalibrationResponse, ConfusionCell, ConfusionMatrixResponse
+
+CALIBRATION_BUCKETS = 10
+# Пачка id для IN (...): у SQLite ограничено число параметров запроса
+ID_CHUNK = 500
+REBUILD_BATCH_SIZE = 1000
+
+# (ticket_id, поле, прежняя метка, новая метка)
+LabelChange = Tuple[int, str, str | None, str | None]
+
+
+def calibration_bucket(confidence: float | None) -> int | None:
+    if confidence is None:
+        return None
+    return min(max(int(confidence * CALIBRATION_BUCKETS), 0), CALIBRATION_BUCKETS - 1)
+
+
+def predicted_labels(classification: ClassificationResult, request_type: str | None) -> Dict[str, str | None]:
+    return {
+        "priority": classification.priority,
+        "department": classification.department_code,
+        "category": classification.category_code,
+        "request_type": request_type,
+    }
+
+
+def _apply_confusion(db: Session, deltas: Dict[Tuple[str, str, str], int]) -> None:
+    rows = [
+        {"field": field, "predicted": predicted, "actual": actual, "count": count}
+        for (field, predicted, actual), count in deltas.items()
+        if count
+    ]
+    upsert_increments(
+        db.connection(), ClassificationConfusion.__table__, ("field", "predicted", "actual"), ("count",), rows
+    )
+
+
+def _apply_calibration(db: Session, deltas: Dict[int, List[int]]) -> None:
+    rows = [
+        {"bucket": bucket, "classifications": classifications, "corrected": corrected}
+        for bucket, (classifications, corrected) in deltas.items()
+        if classifications or corrected
+    ]
+    upsert_increments(
+        db.connection(), ClassificationCalibration.__table__, ("bucket",), ("classifications", "corrected"), rows
+    )
+
+
+def record_classification(db: Session, log: ModelLog, classification: ClassificationResult, request_type: str | None) -> None:
+    """Учитывает новую классификацию в матрицах ошибок (диагональ) и калибровке. Без commit."""
+
+    confusion = {(field, label or "", label or ""): 1 for field, label in predicted_labels(classification, request_type).items()}
+    _apply_confusion(db, confusion)
+    bucket = calibration_bucket(classification.confidence)
+    if bucket is not None:
+        _apply_calibration(db, {bucket: [1, 0]})
+    log.in_classification_stats = True
+
+
+def _latest_classification_logs(db: Session, ticket_ids: List[int]) -> Dict[int, tuple]:
+    """Последний лог классификации тикетов: ticket_id -> (id, confidence, was_corrected, in_classification_stats)."""
+
+    result = {}
+    for start in range(0, len(ticket_ids), ID_CHUNK):
+        latest = (
+            select(func.max(ModelLog.id))
+            .where(ModelLog.input_type == "classification", ModelLog.ticket_id.in_(ticket_ids[start : start + ID_CHUNK]))
+            .group_by(ModelLog.ticket_id)
+        )
+        rows = db.execute(
+            select(
+                ModelLog.ticket_id,
+                ModelLog.id,
+                ModelLog.confidence,
+                ModelLog.was_corrected,
+                ModelLog.in_classification_stats,
+            ).where(ModelLog.id.in_(latest))
+        )
+        for ticket_id, *values in rows:
+            result[ticket_id] = tuple(values)
+    return result
+
+
+def _correction_chains(db: Session, log_ids: Iterable[int]) -> Dict[Tuple[int, str], Tuple[str | None, str | None]]:
+    """(model_log_id, поле) -> (исходное предсказание, последняя исправленная метка)."""
+
+    log_ids = list(log_ids)
+    chains: Dict[Tuple[int, str], Tuple[str | None, str | None]] = {}
+    for start in range(0, len(log_ids), ID_CHUNK):
+        rows = db.execute(
+            select(
+                ClassificationCorrection.model_log_id,
+                ClassificationCorrection.field,
+                ClassificationCorrection.predicted,
+                ClassificationCorrection.corrected,
+            )
+            .where(ClassificationCorrection.model_log_id.in_(log_ids[start : start + ID_CHUNK]))
+            .order_by(ClassificationCorrection.id)
+        )
+        for log_id, field, predicted, corrected in rows:
+            first = chains.get((log_id, field))
+            chains[(log_id, field)] = (first[0] if first else predicted, corrected)
+    return chains
+
+
+def _is_corrected(chains: Dict[Tuple[int, str], Tuple[str | None, str | None]], log_id: int) -> bool:
+    for field in MODEL_FIELDS:
+        chain = chains.get((log_id, field))
+        if chain is not None and (chain[0] or "") != (chain[1] or ""):
+            return True
+    return False
+
+
+def record_corrections(db: Session, changes: List[LabelChange]) -> int:
+    """Сохраняет исправления меток оператором и обновляет матрицы ошибок, калибровку и was_corrected.
+
+    Исправление относится к последней классификации тикета. Вызывается в той же
+    транзакции, что и изменение тикета, до commit. Возвращает число исправлений.
+    """
+
+    changes = [change for change in changes if (change[2] or "") != (change[3] or "")]
+    if not changes:
+        return 0
+
+    logs = _latest_classification_logs(db, sorted({ticket_id for ticket_id, *_ in changes}))
+    chains = _correction_chains(db, (log[0] for log in logs.values()))
+
+    rows = []
+    confusion: Dict[Tuple[str, str, str], int] = defaultdict(int)
+    for ticket_id, field, old, new in changes:
+        log = logs.get(ticket_id)
+        log_id, confidence = (log[0], log[1]) if log else (None, None)
+        chain = chains.get((log_id, field))
+        predicted = chain[0] if chain else old
+        chains[(log_id, field)] = (predicted, new)
+        rows.append(
+            {
+                "ticket_id": ticket_id,
+                "model_log_id": log_id,
+                "field": field,
+                "predicted": predicted,
+                "corrected": new,
+                "confidence": confidence,
+            }
+        )
+        if log and log[3]:
+            confusion[(field, predicted or "", old or "")] -= 1
+            confusion[(field, predicted or "", new or "")] += 1
+    db.execute(insert(ClassificationCorrection), rows)
+    _apply_confusion(db, confusion)
+
+    # was_corrected: хотя бы одно поле модели сейчас отличается от предсказания
+    calibration: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    for log_id, confidence, was_corrected, in_stats in logs.values():
+        corrected = int(_is_corrected(chains, log_id))
+        if corrected == (was_corrected or 0):
+            continue
+        db.execute(update(ModelLog).where(ModelLog.id == log_id).values(was_corrected=corrected))
+        bucket = calibration_bucket(confidence)
+        if in_stats and bucket is not None:
+            calibration[bucket][1] += 1 if corrected else -1
+    _apply_calibration(db, calibration)
+    return len(rows)
+
+
+def classification_stats_missing(db: Session) -> bool:
+    """Классификации с метками в колонках есть, а ни одна не учтена — например, первый запуск после обновления."""
+
+    classification = and_(ModelLog.input_type == "classification", ModelLog.priority.isnot(None))
+    if db.execute(select(ModelLog.id).where(classification).limit(1)).first() is None:
+        return False
+    counted = select(ModelLog.id).where(classification, ModelLog.in_classification_stats.is_(True)).limit(1)
+    return db.execute(counted).first() is None
+
+
+def _current_request_types(db: Session, ticket_ids: List[int]) -> Dict[int, str | None]:
+    result = {}
+    for model in (Ticket, ArchivedTicket):
+        for start in range(0, len(ticket_ids), ID_CHUNK):
+            rows = db.execute(
+                select(model.id, model.request_type).where(model.id.in_(ticket_ids[start : start + ID_CHUNK]))
+            )
+            result.update(rows.all())
+    return result
+
+
+def rebuild_classification_stats(db: Session, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """Пересобирает матрицы ошибок и калибровку по логам классификации и исправлениям.
+
+    Предсказанные метки берутся из колонок model_logs; логи без них (старые, до
+    backfill_classification_columns) не учитываются. Возвращает число учтённых классификаций.
+    """
+
+    db.execute(delete(ClassificationConfusion))
+    db.execute(delete(ClassificationCalibration))
+    db.execute(update(ModelLog).where(ModelLog.in_classification_stats.is_(True)).values(in_classification_stats=False))
+    db.commit()
+
+    total = 0
+    last_id = 0
+    while True:
+        logs = db.execute(
+            select(
+                ModelLog.id,
+                func.coalesce(ModelLog.ticket_id, ModelLog.archived_ticket_id),
+                ModelLog.confidence,
+                ModelLog.priority,
+                ModelLog.department_code,
+                ModelLog.category_code,
+            )
+            .where(ModelLog.input_type == "classification", ModelLog.priority.isnot(None), ModelLog.id > last_id)
+            .order_by(ModelLog.id)
+            .limit(batch_size)
+        ).all()
+        if not logs:
+            break
+        last_id = logs[-1][0]
+        log_ids = [log[0] for log in logs]
+        chains = _correction_chains(db, log_ids)
+        request_types = _current_request_types(db, sorted({log[1] for log in logs} - {None}))
+
+        confusion: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        calibration: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+        for log_id, ticket_id, confidence, priority, department_code, category_code in logs:
+            labels = {
+                "priority": priority,
+                "department": department_code,
+                "category": category_code,
+                "request_type": request_types.get(ticket_id),
+            }
+            for field, label in labels.items():
+                chain = chains.get((log_id, field))
+                predicted = chain[0] if chain else label
+                actual = chain[1] if chain else label
+                confusion[(field, predicted or "", actual or "")] += 1
+            bucket = calibration_bucket(confidence)
+            if bucket is not None:
+                calibration[bucket][0] += 1
+                calibration[bucket][1] += int(_is_corrected(chains, log_id))
+        _apply_confusion(db, confusion)
+        _apply_calibration(db, calibration)
+        for start in range(0, len(log_ids), ID_CHUNK):
+            db.execute(
+                update(ModelLog)
+                .where(ModelLog.id.in_(log_ids[start : start + ID_CHUNK]))
+                .values(in_classification_stats=True)
+            )
+        db.commit()
+        total += len(logs)
+    return total
+
+
+def get_confusion_matrix(db: Session, field: str) -> ConfusionMatrixResponse:
+    if field not in CORRECTABLE_FIELDS:
+        raise ValueError(f"field must be one of {', '.join(CORRECTABLE_FIELDS)}")
+    rows = db.execute(
+        select(ClassificationConfusion.predicted, ClassificationConfusion.actual, ClassificationConfusion.count)
+        .where(ClassificationConfusion.field == field, ClassificationConfusion.count > 0)
+        .order_by(ClassificationConfusion.predicted, ClassificationConfusion.actual)
+    ).all()
+    total = sum(count for _, _, count in rows)
+    correct = sum(count for predicted, actual, count in rows if predicted == actual)
+    return ConfusionMatrixResponse(
+        field=field,
+        total=total,
+        accuracy=round(correct / total * 100.0, 2) if total else None,
+        cells=[ConfusionCell(predicted=predicted or None, actual=actual or None, count=count) for predicted, actual, count in rows],
+    )
+
+
+def get_calibration(db: Session, threshold: float) -> CalibrationResponse:
+    """Гистограмма калибровки и доля верных классификаций при уверенности не ниже каждой границы."""
+
+    counts = {
+        bucket: (classifications, corrected)
+        for bucket, classifications, corrected in db.execute(
+            select(ClassificationCalibration.bucket, ClassificationCalibration.classifications, ClassificationCalibration.corrected)
+        )
+    }
+    buckets = []
+    above_total = above_correct = 0
+    for bucket in reversed(range(CALIBRATION_BUCKETS)):
+        classifications, corrected = counts.get(bucket, (0, 0))
+        above_total += classifications
+        above_correct += classifications - corrected
+        buckets.append(
+            CalibrationBucket(
+                confidence_from=bucket / CALIBRATION_BUCKETS,
+                confidence_to=(bucket + 1) / CALIBRATION_BUCKETS,
+                classifications=classifications,
+                corrected=corrected,
+                accuracy=round((classifications - corrected) / classifications * 100.0, 2) if classifications else None,
+                classifications_at_or_above=above_total,
+                accuracy_at_or_above=round(above_correct / above_total * 100.0, 2) if above_total else None,
+            )
+        )
+    buckets.reverse()
+    return CalibrationResponse(auto_close_confidence_threshold=threshold, buckets=buckets)
+
+
+async def get_confusion_matrix_async(db: AsyncSession, field: str) -> ConfusionMatrixResponse:
+    return await db.run_sync(lambda session: get_confusion_matrix(session, field))
+
+
+async def get_calibration_async(db: AsyncSession, threshold: float) -> CalibrationResponse:
+    return await db.run_sync(lambda session: get_calibration(session, threshold))
@@ -0,0 +1,82 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.department import Department
+
+# Кэш code -> id процесса. Департаменты не удаляются, поэтому инвалидация не нужна;
+# в кэш попадают только id из зафиксированных транзакций.
+_department_ids: Dict[str, int] = {}
+
+_PENDING_KEY = "department_ids"
+
+
+def warm_department_cache(db: Session) -> int:
+    """Загружает все департаменты в кэш (при старте процесса). Возвращает их число."""
+
+    rows = db.execute(select(Department.code, Department.id)).all()
+    _department_ids.update({code: dep_id for code, dep_id in rows})
+    return len(rows)
+
+
+def _select_ids(db: Session, codes: set[str]) -> Dict[str, int]:
+    rows = db.execute(select(Department.code, Department.id).where(Department.code.in_(codes)))
+    return {code: dep_id for code, dep_id in rows}
+
+
+def _upsert(db: Session, codes: set[str]) -> None:
+    values = [{"code": code, "name": code} for code in sorted(codes)]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = pg_insert(Department).on_conflict_do_nothing(index_elements=["code"])
+    elif dialect == "sqlite":
+        stmt = insert(Department).prefix_with("OR IGNORE")
+    else:
+        stmt = insert(Department)
+    db.execute(stmt, values)
+
+
+def resolve_department_ids(db: Session, codes: Iterable[str]) -> Dict[str, int]:
+    """Id департаментов по кодам; недостающие создаются upsert'ом в транзакции вызывающего кода.
+
+    Известные коды берутся из кэша без запросов. Новые id попадают в кэш
+    только после commit этой транзакции.
+    """
+
+    codes = set(codes)
+    result = {code: _department_ids[code] for code in codes if code in _department_ids}
+    missing = codes - result.keys()
+    if not missing:
+        return result
+
+    found = _select_ids(db, missing)
+    if missing - found.keys():
+        _upsert(db, missing - found.keys())
+        found = _select_ids(db, missing)
+
+    db.info.setdefault(_PENDING_KEY, {}).update(found)
+    result.update(found)
+    return result
+
+
+def get_department_id(db: Session, code: str) -> int:
+    return resolve_department_ids(db, (code,))[code]
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    # after_commit срабатывает и на RELEASE SAVEPOINT — ждём commit внешней транзакции
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _department_ids.update(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session: Session, previous_transaction) -> None:
+    # Откат (в том числе SAVEPOINT) мог убрать созданный департамент —
+    # не рискуем и не публикуем ничего из этой транзакции.
+    session.info.pop(_PENDING_KEY, None)
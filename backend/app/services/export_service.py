@@ -0,0 +1,176 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List, Sequence
+
+from sqlalchemy import Boolean, literal, select
+from sqlalchemy.sql import Select
+
+from app.core.config import get_settings
+from app.db.async_session import read_session_factory
+from app.models.archive import ArchivedMessage, ArchivedTicket
+from app.models.department import Department
+from app.models.message import Message
+from app.models.ticket import Ticket
+
+TICKET_FIELDS = (
+    "id",
+    "subject",
+    "description",
+    "channel",
+    "language",
+    "request_type",
+    "category_code",
+    "priority",
+    "status",
+    "customer_email",
+    "customer_username",
+    "auto_closed_by_ai",
+    "ai_disabled",
+    "created_at",
+    "updated_at",
+    "closed_at",
+    "first_response_due_at",
+    "sla_due_at",
+    "message_count",
+    "last_message_at",
+    "first_agent_response_at",
+)
+MESSAGE_FIELDS = ("id", "ticket_id", "author_type", "language", "created_at", "body")
+
+# Столбцы выгрузки в порядке CSV
+TICKET_COLUMNS = TICKET_FIELDS + ("department_code", "archived")
+MESSAGE_COLUMNS = MESSAGE_FIELDS + ("archived",)
+
+
+def tickets_export_query(
+    model,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    status: str | None = None,
+    channel: str | None = None,
+    priority: str | None = None,
+    request_type: str | None = None,
+    department_code: str | None = None,
+) -> Select:
+    """Тикеты (или архив) по created_at в [date_from, date_to), по возрастанию id."""
+
+    stmt = (
+        select(
+            *(getattr(model, name) for name in TICKET_FIELDS),
+            Department.code.label("department_code"),
+            literal(model is ArchivedTicket, Boolean).label("archived"),
+        )
+        .outerjoin(Department, Department.id == model.department_id)
+        .order_by(model.id)
+    )
+    if date_from:
+        stmt = stmt.where(model.created_at >= date_from)
+    if date_to:
+        stmt = stmt.where(model.created_at < date_to)
+    if status:
+        stmt = stmt.where(model.status == status)
+    if channel:
+        stmt = stmt.where(model.channel == channel)
+    if priority:
+        stmt = stmt.where(model.priority == priority)
+    if request_type:
+        stmt = stmt.where(model.request_type == request_type)
+    if department_code:
+        stmt = stmt.where(Department.code == department_code)
+    return stmt
+
+
+def messages_export_query(
+    model,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    ticket_id: int | None = None,
+    author_type: str | None = None,
+) -> Select:
+    """Сообщения (или архив) по created_at в [date_from, date_to), по возрастанию id."""
+
+    stmt = select(
+        *(getattr(model, name) for name in MESSAGE_FIELDS),
+        literal(model is ArchivedMessage, Boolean).label("archived"),
+    ).order_by(model.id)
+    if date_from:
+        stmt = stmt.where(model.created_at >= date_from)
+    if date_to:
+        stmt = stmt.where(model.created_at < date_to)
+    if ticket_id is not None:
+        stmt = stmt.where(model.ticket_id == ticket_id)
+    if author_type:
+        stmt = stmt.where(model.author_type == author_type)
+    return stmt
+
+
+def ticket_export_queries(include_archived: bool = False, **filters) -> List[Select]:
+    models = (Ticket, ArchivedTicket) if include_archived else (Ticket,)
+    return [tickets_export_query(model, **filters) for model in models]
+
+
+def message_export_queries(include_archived: bool = False, **filters) -> List[Select]:
+    models = (Message, ArchivedMessage) if include_archived else (Message,)
+    return [messages_export_query(model, **filters) for model in models]
+
+
+async def stream_rows(statements: Sequence[Select]) -> AsyncIterator[list]:
+    """Строки запросов пачками по export_batch_size через серверный курсор.
+
+    Сессия своя: ответ стримится уже после выхода из обработчика запроса.
+    В памяти одновременно находится не больше одной пачки.
+    """
+
+    batch_size = get_settings().export_batch_size
+    async with (await read_session_factory())() as db:
+        for stmt in statements:
+            result = await db.stream(stmt.execution_options(yield_per=batch_size))
+            async for partition in result.partitions(batch_size):
+                yield partition
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def csv_chunks(columns: Sequence[str], partitions: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for rows in partitions:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def ndjson_chunks(columns: Sequence[str], partitions: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    async for rows in partitions:
+        lines = (json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_value) for row in rows)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Сжатие gzip на лету, без буферизации всего ответа."""
+
+    compressor = zlib.compressobj(get_settings().export_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
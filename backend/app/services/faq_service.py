@@ -1,5 +1,7 @@
 from typing import List, Optional
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.models.faq import FAQ
@@ -7,13 +9,7 @@ from app.schemas.faq import FAQCreate, FAQUpdate
 
 
 def create_faq(db: Session, data: FAQCreate) -> FAQ:
-    faq = FAQ(
-        question=data.question,
-        answer=data.answer,
-        language=data.language,
-        category_code=data.category_code,
-        auto_resolvable=data.auto_resolvable,
-    )
+    faq = _new_faq(data)
     db.add(faq)
     db.commit()
     db.refresh(faq)
@@ -46,6 +42,16 @@ def delete_faq(db: Session, faq_id: int) -> None:
     db.commit()
 
 
+def _new_faq(data: FAQCreate) -> FAQ:
+    return FAQ(
+        question=data.question,
+        answer=data.answer,
+        language=data.language,
+        category_code=data.category_code,
+        auto_resolvable=data.auto_resolvable,
+    )
+
+
 def get_best_match(
     db: Session,
     category_code: str | None,
@@ -79,3 +85,52 @@ def get_best_match(
     # Если категория указана, но подходящего шаблона нет — лучше вернуть None,
     # чтобы ИИ сформировал ответ по тексту, а не использовать случайный шаблон.
     return None
+
+
+# --- Async-версии для ручек API ---
+
+
+async def create_faq_async(db: AsyncSession, data: FAQCreate) -> FAQ:
+    faq = _new_faq(data)
+    db.add(faq)
+    await db.commit()
+    await db.refresh(faq)
+    return faq
+
+
+async def list_faq_async(db: AsyncSession, language: Optional[str] = None) -> List[FAQ]:
+    stmt = select(FAQ)
+    if language:
+        stmt = stmt.where(FAQ.language == language)
+    result = await db.execute(stmt.order_by(FAQ.id.desc()))
+    return list(result.scalars().all())
+
+
+async def update_faq_async(db: AsyncSession, faq_id: int, data: FAQUpdate) -> FAQ:
+    faq: FAQ | None = await db.get(FAQ, faq_id)
+    if not faq:
+        raise ValueError("FAQ not found")
+    for field, value in data.dict(exclude_unset=True).items():
+        setattr(faq, field, value)
+    await db.commit()
+    await db.refresh(faq)
+    return faq
+
+
+async def delete_faq_async(db: AsyncSession, faq_id: int) -> None:
+    faq: FAQ | None = await db.get(FAQ, faq_id)
+    if not faq:
+        raise ValueError("FAQ not found")
+    await db.delete(faq)
+    await db.commit()
+
+
+async def get_best_match_async(
+    db: AsyncSession,
+    category_code: str | None,
+    language: str,
+    request_type: str | None = None,
+) -> Optional[FAQ]:
+    """Async-вариант get_best_match: та же логика выполняется через run_sync."""
+
+    return await db.run_sync(get_best_match, category_code, language, request_type)
@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.write_coordinator import WriteUnit, execute_write, execute_write_async
+from app.models.idempotency_key import IdempotencyKey
+from app.models.ticket import Ticket
+
+SCOPE_API = "api"
+SCOPE_API_EXTERNAL = "api_external"
+SCOPE_IMAP = "imap"
+SCOPE_TELEGRAM = "telegram"
+
+
+class IdempotencyConflict(Exception):
+    """Запрос с этим ключом ещё обрабатывается."""
+
+
+def _reserve_unit(scope: str, key: str) -> WriteUnit[Optional[Tuple[Optional[int], bool, Optional[int]]]]:
+    def unit(db: Session) -> Optional[Tuple[Optional[int], bool, Optional[int]]]:
+        settings = get_settings()
+        now = datetime.utcnow()
+        record = (
+            db.query(IdempotencyKey)
+            .filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+            .first()
+        )
+        if record is not None and record.expires_at > now:
+            if record.completed_at is None:
+                raise IdempotencyConflict(key)
+            return None, True, record.ticket_id
+
+        try:
+            with db.begin_nested():
+                if record is not None:
+                    db.delete(record)
+                    db.flush()
+                record = IdempotencyKey(
+                    scope=scope,
+                    key=key,
+                    expires_at=now + timedelta(seconds=settings.idempotency_pending_seconds),
+                )
+                db.add(record)
+                db.flush()
+        except IntegrityError:
+            # Параллельный запрос успел занять ключ — перечитываем в следующей попытке
+            return None
+        return record.id, False, None
+
+    return unit
+
+
+def _lookup_or_reserve(db: Session, scope: str, key: str) -> Tuple[Optional[int], bool, Optional[int]]:
+    """Возвращает (id резерва, был ли уже результат, ticket_id результата).
+
+    Если ключ уже выполнен — отдаёт сохранённый ticket_id. Если ключ свободен
+    (или истёк) — резервирует его отдельной записью (execute_write), чтобы
+    конкурентный повтор увидел резерв.
+    """
+
+    for _ in range(2):
+        result = execute_write(db, _reserve_unit(scope, key))
+        if result is not None:
+            return result
+    raise IdempotencyConflict(key)
+
+
+async def _lookup_or_reserve_async(
+    db: AsyncSession, scope: str, key: str
+) -> Tuple[Optional[int], bool, Optional[int]]:
+    for _ in range(2):
+        result = await execute_write_async(db, _reserve_unit(scope, key))
+        if result is not None:
+            return result
+    raise IdempotencyConflict(key)
+
+
+def reserve_key(db: Session, scope: str, key: str) -> Optional[int]:
+    """Резервирует ключ и возвращает id резерва; None — ключ уже обработан или обрабатывается."""
+
+    try:
+        record_id, replayed, _ = _lookup_or_reserve(db, scope, key[:255])
+    except IdempotencyConflict:
+        return None
+    return None if replayed else record_id
+
+
+def _complete_unit(record_id: int, ticket_id: Optional[int]) -> WriteUnit[None]:
+    def unit(db: Session) -> None:
+        settings = get_settings()
+        record = db.query(IdempotencyKey).get(record_id)
+        if record is None:
+            return
+        now = datetime.utcnow()
+        record.ticket_id = ticket_id
+        record.completed_at = now
+        record.expires_at = now + timedelta(hours=settings.idempotency_ttl_hours)
+
+    return unit
+
+
+def _release_unit(record_id: int) -> WriteUnit[None]:
+    def unit(db: Session) -> None:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.id == record_id))
+
+    return unit
+
+
+def complete_key(db: Session, record_id: int, ticket_id: Optional[int]) -> None:
+    execute_write(db, _complete_unit(record_id, ticket_id))
+
+
+def release_key(db: Session, record_id: int) -> None:
+    db.rollback()
+    execute_write(db, _release_unit(record_id))
+
+
+def run_idempotent(
+    db: Session,
+    scope: str,
+    key: Optional[str],
+    action: Callable[[], Optional[Ticket]],
+) -> Tuple[Optional[int], bool]:
+    """Выполняет action не более одного раза на ключ. Возвращает (ticket_id, повтор ли это).
+
+    При повторе action не вызывается, возвращается ticket_id первой обработки.
+    Если action упал, резерв снимается и запрос можно повторить.
+    """
+
+    if not key:
+        ticket = action()
+        return (ticket.id if ticket else None), False
+
+    record_id, replayed, ticket_id = _lookup_or_reserve(db, scope, key[:255])
+    if replayed:
+        return ticket_id, True
+
+    try:
+        ticket = action()
+    except Exception:
+        release_key(db, record_id)
+        raise
+    ticket_id = ticket.id if ticket else None
+    complete_key(db, record_id, ticket_id)
+    return ticket_id, False
+
+
+async def run_idempotent_async(
+    db: AsyncSession,
+    scope: str,
+    key: Optional[str],
+    action: Callable[[], Awaitable[Optional[Ticket]]],
+) -> Tuple[Optional[int], bool]:
+    if not key:
+        ticket = await action()
+        return (ticket.id if ticket else None), False
+
+    record_id, replayed, ticket_id = await _lookup_or_reserve_async(db, scope, key[:255])
+    if replayed:
+        return ticket_id, True
+
+    try:
+        ticket = await action()
+    except Exception:
+        await db.rollback()
+        await execute_write_async(db, _release_unit(record_id))
+        raise
+    ticket_id = ticket.id if ticket else None
+    await execute_write_async(db, _complete_unit(record_id, ticket_id))
+    return ticket_id, False
+
+
+def purge_expired_keys(db: Session) -> int:
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    db.commit()
+    return result.rowcount
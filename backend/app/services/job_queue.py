@@ -0,0 +1,138 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.job import Job, JobStatus
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    ticket_id: int | None = None,
+    payload: Optional[dict[str, Any]] = None,
+) -> Job:
+    """Ставит задачу в очередь в текущей транзакции (commit делает вызывающий код)."""
+
+    settings = get_settings()
+    job = Job(
+        kind=kind,
+        ticket_id=ticket_id,
+        payload=json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+        status=JobStatus.QUEUED.value,
+        attempts=0,
+        max_attempts=settings.job_max_attempts,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+def _claimable(now: datetime):
+    # Готовые к запуску задачи и задачи, чья аренда истекла (воркер упал или завис)
+    return or_(
+        and_(Job.status == JobStatus.QUEUED.value, Job.run_after <= now),
+        and_(Job.status == JobStatus.RUNNING.value, Job.locked_until < now),
+    )
+
+
+def claim_jobs(db: Session, worker_id: str, limit: int = 1) -> List[Job]:
+    """Захватывает до limit задач в аренду на job_lease_seconds.
+
+    На Postgres используется SELECT ... FOR UPDATE SKIP LOCKED, чтобы воркеры
+    не ждали друг друга. На SQLite запись сериализуется самой БД, поэтому
+    захват делается одним условным UPDATE с уникальным токеном аренды.
+    """
+
+    settings = get_settings()
+    now = datetime.utcnow()
+    locked_until = now + timedelta(seconds=settings.job_lease_seconds)
+
+    if db.get_bind().dialect.name == "postgresql":
+        jobs = (
+            db.execute(
+                select(Job)
+                .where(_claimable(now))
+                .order_by(Job.run_after, Job.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            .scalars()
+            .all()
+        )
+        for job in jobs:
+            job.status = JobStatus.RUNNING.value
+            job.locked_by = worker_id
+            job.locked_until = locked_until
+            job.attempts = (job.attempts or 0) + 1
+        db.commit()
+    else:
+        lease_token = f"{worker_id}:{uuid.uuid4().hex}"
+        candidate_ids = (
+            select(Job.id)
+            .where(_claimable(now))
+            .order_by(Job.run_after, Job.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        db.execute(
+            update(Job)
+            .where(Job.id.in_(candidate_ids), _claimable(now))
+            .values(
+                status=JobStatus.RUNNING.value,
+                locked_by=lease_token,
+                locked_until=locked_until,
+                attempts=Job.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        jobs = db.query(Job).filter(Job.locked_by == lease_token).all()
+
+    # Задачи, исчерпавшие попытки из‑за истёкших аренд, больше не запускаем
+    claimed: List[Job] = []
+    for job in jobs:
+        if job.attempts > job.max_attempts:
+            _mark_failed(job, "Lease expired after the last attempt")
+        else:
+            claimed.append(job)
+    if len(claimed) != len(jobs):
+        db.commit()
+    return claimed
+
+
+def complete_job(db: Session, job: Job) -> None:
+    job.status = JobStatus.DONE.value
+    job.locked_by = None
+    job.locked_until = None
+    job.last_error = None
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def _mark_failed(job: Job, error: str) -> None:
+    job.status = JobStatus.FAILED.value
+    job.locked_by = None
+    job.locked_until = None
+    job.last_error = error
+    job.finished_at = datetime.utcnow()
+
+
+def fail_job(db: Session, job: Job, error: str) -> None:
+    """Возвращает задачу в очередь с экспоненциальной задержкой или помечает failed."""
+
+    if job.attempts >= job.max_attempts:
+        _mark_failed(job, error)
+    else:
+        settings = get_settings()
+        delay = settings.job_retry_backoff_seconds * (2 ** max(job.attempts - 1, 0))
+        job.status = JobStatus.QUEUED.value
+        job.locked_by = None
+        job.locked_until = None
+        job.last_error = error
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+    db.commit()
@@ -0,0 +1,193 @@
+import uuid
+from datetime import datetime, timedelta
+from email.utils import make_msgid
+from typing import List
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.outbound_email import OutboundEmail, OutboundEmailStatus
+
+
+def new_message_id() -> str:
+    """Уникальный Message-ID (время, pid, случайная часть) в домене почтового ящика."""
+
+    domain = (get_settings().email_username or "").rpartition("@")[2] or "helpdesk.local"
+    return make_msgid(domain=domain)
+
+
+def enqueue_email(db: Session, to_address: str, subject: str, body: str, ticket_id: int | None = None) -> OutboundEmail:
+    """Ставит письмо в очередь отправки в текущей транзакции (commit делает вызывающий код)."""
+
+    settings = get_settings()
+    outbound = OutboundEmail(
+        ticket_id=ticket_id,
+        to_address=to_address,
+        subject=subject,
+        body=body,
+        message_id=new_message_id(),
+        status=OutboundEmailStatus.QUEUED.value,
+        attempts=0,
+        max_attempts=settings.email_outbox_max_attempts,
+        run_after=datetime.utcnow(),
+    )
+    db.add(outbound)
+    return outbound
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(OutboundEmail.status == OutboundEmailStatus.QUEUED.value, OutboundEmail.run_after <= now),
+        and_(OutboundEmail.status == OutboundEmailStatus.SENDING.value, OutboundEmail.locked_until < now),
+    )
+
+
+def claim_emails(db: Session, sender_id: str, limit: int) -> List[OutboundEmail]:
+    """Захватывает до limit писем в аренду на email_outbox_lease_seconds (как claim_jobs).
+
+    locked_by — уникальный токен аренды; пока письмо отправляется, аренду
+    продлевает renew_lease, а mark_sent/fail_email/release_emails меняют
+    письмо только при совпадении токена.
+    """
+
+    settings = get_settings()
+    now = datetime.utcnow()
+    locked_until = now + timedelta(seconds=settings.email_outbox_lease_seconds)
+    # locked_by — String(64): 31 символ id отправителя + ":" + 32 hex
+    lease_token = f"{sender_id[:31]}:{uuid.uuid4().hex}"
+
+    if db.get_bind().dialect.name == "postgresql":
+        emails = (
+            db.execute(
+                select(OutboundEmail)
+                .where(_claimable(now))
+                .order_by(OutboundEmail.run_after, OutboundEmail.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            .scalars()
+            .all()
+        )
+        for outbound in emails:
+            outbound.status = OutboundEmailStatus.SENDING.value
+            outbound.locked_by = lease_token
+            outbound.locked_until = locked_until
+            outbound.attempts = (outbound.attempts or 0) + 1
+        db.commit()
+    else:
+        candidate_ids = (
+            select(OutboundEmail.id)
+            .where(_claimable(now))
+            .order_by(OutboundEmail.run_after, OutboundEmail.id)
+            .limit(limit)
+            .scalar_subquery()
+        )
+        db.execute(
+            update(OutboundEmail)
+            .where(OutboundEmail.id.in_(candidate_ids), _claimable(now))
+            .values(
+                status=OutboundEmailStatus.SENDING.value,
+                locked_by=lease_token,
+                locked_until=locked_until,
+                attempts=OutboundEmail.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        emails = (
+            db.query(OutboundEmail).filter(OutboundEmail.locked_by == lease_token).order_by(OutboundEmail.id).all()
+        )
+
+    # Письма, исчерпавшие попытки из‑за истёкших аренд, больше не отправляем
+    claimed: List[OutboundEmail] = []
+    changed = False
+    for outbound in emails:
+        outbound.lease_token = lease_token
+        if outbound.attempts > outbound.max_attempts:
+            _mark_dead(outbound, "Lease expired after the last attempt")
+            changed = True
+            continue
+        if not outbound.message_id:
+            # Письмо поставлено в очередь до появления колонки message_id
+            outbound.message_id = new_message_id()
+            changed = True
+        claimed.append(outbound)
+    if changed:
+        db.commit()
+    return claimed
+
+
+def _update_leased(db: Session, outbound: OutboundEmail, values: dict) -> bool:
+    """UPDATE письма, только если аренда всё ещё наша. False — письмо перехватил другой отправитель."""
+
+    updated = db.execute(
+        update(OutboundEmail)
+        .where(
+            OutboundEmail.id == outbound.id,
+            OutboundEmail.status == OutboundEmailStatus.SENDING.value,
+            OutboundEmail.locked_by == outbound.lease_token,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return updated == 1
+
+
+def renew_lease(db: Session, outbound: OutboundEmail) -> bool:
+    """Продлевает аренду перед отправкой: медленный SMTP не должен отдать письмо второму отправителю."""
+
+    locked_until = datetime.utcnow() + timedelta(seconds=get_settings().email_outbox_lease_seconds)
+    return _update_leased(db, outbound, {"locked_until": locked_until})
+
+
+def mark_sent(db: Session, outbound: OutboundEmail) -> bool:
+    return _update_leased(
+        db,
+        outbound,
+        {
+            "status": OutboundEmailStatus.SENT.value,
+            "locked_by": None,
+            "locked_until": None,
+            "last_error": None,
+            "sent_at": datetime.utcnow(),
+        },
+    )
+
+
+def _mark_dead(outbound: OutboundEmail, error: str) -> None:
+    outbound.status = OutboundEmailStatus.DEAD.value
+    outbound.locked_by = None
+    outbound.locked_until = None
+    outbound.last_error = error
+
+
+def fail_email(db: Session, outbound: OutboundEmail, error: str, permanent: bool = False) -> bool:
+    """Возвращает письмо в очередь с экспоненциальной задержкой или переводит в dead."""
+
+    values = {"locked_by": None, "locked_until": None, "last_error": error}
+    if permanent or outbound.attempts >= outbound.max_attempts:
+        values["status"] = OutboundEmailStatus.DEAD.value
+    else:
+        settings = get_settings()
+        delay = settings.email_outbox_retry_backoff_seconds * (2 ** max(outbound.attempts - 1, 0))
+        values["status"] = OutboundEmailStatus.QUEUED.value
+        values["run_after"] = datetime.utcnow() + timedelta(seconds=delay)
+    return _update_leased(db, outbound, values)
+
+
+def release_emails(db: Session, emails: List[OutboundEmail]) -> None:
+    """Возвращает захваченные, но не отправленные письма в очередь без траты попытки."""
+
+    for outbound in emails:
+        _update_leased(
+            db,
+            outbound,
+            {
+                "status": OutboundEmailStatus.QUEUED.value,
+                "locked_by": None,
+                "locked_until": None,
+                "attempts": OutboundEmail.attempts - 1,
+            },
+        )
@@ -0,0 +1,270 @@
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.model_log import ModelLog, decompress_payload
+
+ARCHIVE_BATCH_SIZE = 1000
+_PARTITION_PREFIX = "model_logs-"
+_PARTITION_SUFFIX = ".ndjson.gz"
+
+
+def _archive_dir(archive_dir: str | None) -> Path:
+    return Path(archive_dir or get_settings().model_log_archive_dir)
+
+
+def partition_path(archive_dir: Path, day: date) -> Path:
+    """Файл архива за день: <dir>/YYYY/MM/model_logs-YYYY-MM-DD.ndjson.gz."""
+
+    return archive_dir / f"{day:%Y}" / f"{day:%m}" / f"{_PARTITION_PREFIX}{day.isoformat()}{_PARTITION_SUFFIX}"
+
+
+def _archive_record(log: ModelLog) -> Dict[str, Any]:
+    return {
+        "id": log.id,
+        "ticket_id": log.ticket_id,
+        "model_name": log.model_name,
+        "input_type": log.input_type,
+        "request_payload": log.request_payload,
+        "response_payload": log.response_payload,
+        "confidence": log.confidence,
+        "was_corrected": log.was_corrected,
+        "created_at": log.created_at.isoformat() if log.created_at else None,
+    }
+
+
+def _append_partition(path: Path, records: List[Dict[str, Any]]) -> None:
+    # Дозапись — новый gzip‑member в конец файла; gzip читает такие файлы целиком.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+            for record in records:
+                gz.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_model_logs(
+    db: Session,
+    older_than_days: int | None = None,
+    archive_dir: str | None = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Переносит полезную нагрузку логов старше N дней в архив по дням. Возвращает число записей.
+
+    Сначала пачка дописывается в файлы архива (с fsync), затем в таблице
+    очищаются payload‑колонки и ставится archived_at. Структурные поля
+    (тикет, тип, уверенность, was_corrected, дата) остаются в таблице для аналитики.
+    Если процесс упадёт между этими шагами, следующий запуск допишет те же записи
+    повторно — восстановление берёт последнюю копию по id.
+    """
+
+    settings = get_settings()
+    days = settings.model_log_retention_days if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    root = _archive_dir(archive_dir)
+
+    total = 0
+    while True:
+        logs = (
+            db.query(ModelLog)
+            .filter(ModelLog.archived_at.is_(None), ModelLog.created_at < cutoff)
+            .order_by(ModelLog.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not logs:
+            break
+
+        by_day: Dict[date, List[Dict[str, Any]]] = defaultdict(list)
+        for log in logs:
+            by_day[log.created_at.date()].append(_archive_record(log))
+        for day, records in sorted(by_day.items()):
+            _append_partition(partition_path(root, day), records)
+
+        db.execute(
+            update(ModelLog)
+            .where(ModelLog.id.in_([log.id for log in logs]))
+            .values(
+                {
+                    ModelLog.request_payload_text: "",
+                    ModelLog.response_payload_text: "",
+                    ModelLog.request_payload_z: None,
+                    ModelLog.response_payload_z: None,
+                    ModelLog.archived_at: datetime.utcnow(),
+                }
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        db.expunge_all()
+        total += len(logs)
+    return total
+
+
+def _partition_day(path: Path) -> date | None:
+    name = path.name
+    if not (name.startswith(_PARTITION_PREFIX) and name.endswith(_PARTITION_SUFFIX)):
+        return None
+    try:
+        return date.fromisoformat(name[len(_PARTITION_PREFIX) : -len(_PARTITION_SUFFIX)])
+    except ValueError:
+        return None
+
+
+def iter_archived_records(
+    archive_dir: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    ticket_id: int | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """Записи из архива за период [date_from, date_to] (границы включительно), по дням."""
+
+    root = _archive_dir(archive_dir)
+    partitions = []
+    for path in root.glob(f"*/*/{_PARTITION_PREFIX}*{_PARTITION_SUFFIX}"):
+        day = _partition_day(path)
+        if day is None or (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        partitions.append((day, path))
+
+    for _, path in sorted(partitions):
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if ticket_id is not None and record.get("ticket_id") != ticket_id:
+                    continue
+                yield record
+
+
+def restore_model_logs(
+    db: Session,
+    archive_dir: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    ticket_id: int | None = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Возвращает полезную нагрузку из архива в model_logs (для аудита). Возвращает число записей.
+
+    Записи, удалённые из таблицы, создаются заново с исходным id.
+    """
+
+    latest: Dict[int, Dict[str, Any]] = {}
+    for record in iter_archived_records(archive_dir, date_from, date_to, ticket_id):
+        latest[record["id"]] = record
+
+    ids = sorted(latest)
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start : start + batch_size]
+        existing = {log.id: log for log in db.query(ModelLog).filter(ModelLog.id.in_(chunk))}
+        for log_id in chunk:
+            record = latest[log_id]
+            log = existing.get(log_id)
+            if log is None:
+                log = ModelLog(
+                    id=log_id,
+                    ticket_id=record["ticket_id"],
+                    model_name=record["model_name"],
+                    input_type=record["input_type"],
+                    confidence=record["confidence"],
+                    was_corrected=record["was_corrected"],
+                    created_at=datetime.fromisoformat(record["created_at"]) if record["created_at"] else None,
+                )
+                db.add(log)
+            log.request_payload = record["request_payload"]
+            log.response_payload = record["response_payload"]
+            log.archived_at = None
+        db.commit()
+        db.expunge_all()
+    return len(ids)
+
+
+def compress_legacy_payloads(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Пережимает записи, сохранённые до появления сжатия (открытый текст). Возвращает их число."""
+
+    total = 0
+    last_id = 0
+    while True:
+        logs = (
+            db.query(ModelLog)
+            .filter(
+                ModelLog.id > last_id,
+                ModelLog.archived_at.is_(None),
+                ModelLog.request_payload_z.is_(None),
+            )
+            .order_by(ModelLog.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not logs:
+            break
+        for log in logs:
+            request_text, response_text = log.request_payload, log.response_payload
+            log.request_payload = request_text
+            log.response_payload = response_text
+        last_id = logs[-1].id
+        db.commit()
+        db.expunge_all()
+        total += len(logs)
+    return total
+
+
+# Поля ClassificationResult, которые хранятся в одноимённых колонках model_logs
+CLASSIFICATION_COLUMNS = ("category_code", "department_code", "priority", "language", "auto_resolvable", "latency_ms")
+
+
+def backfill_classification_columns(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Заполняет колонки результата классификации у старых логов из JSON ответа модели.
+
+    Берутся логи без priority, чья нагрузка ещё в таблице (архивные сначала
+    восстанавливаются restore). Неразбираемые записи пропускаются. После
+    первого прогона — пустой запрос. Возвращает число заполненных записей.
+    """
+
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(ModelLog.id, ModelLog.response_payload_text, ModelLog.response_payload_z)
+            .where(
+                ModelLog.id > last_id,
+                ModelLog.input_type == "classification",
+                ModelLog.priority.is_(None),
+                ModelLog.archived_at.is_(None),
+            )
+            .order_by(ModelLog.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        values = []
+        for log_id, text, compressed in rows:
+            try:
+                data = json.loads(decompress_payload(compressed) if compressed is not None else text)
+            except ValueError:
+                continue
+            if not isinstance(data, dict) or not data.get("priority"):
+                continue
+            values.append({"_id": log_id, **{f"_{column}": data.get(column) for column in CLASSIFICATION_COLUMNS}})
+        if values:
+            db.execute(
+                update(ModelLog.__table__)
+                .where(ModelLog.__table__.c.id == bindparam("_id"))
+                .values({column: bindparam(f"_{column}") for column in CLASSIFICATION_COLUMNS}),
+                values,
+            )
+        db.commit()
+        total += len(values)
+        last_id = rows[-1][0]
+    return total
@@ -0,0 +1,289 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.quantile_sketch import quantile
+from app.models.archive import ArchivedTicket
+from app.models.department import Department
+from app.models.ticket import ROLLUP_ATTRIBUTES, Ticket, TicketStatus, rollup_state
+from app.models.ticket_latency_sketch import (
+    SketchKey,
+    TicketLatencySketch,
+    add_sketch_contributions,
+    apply_sketch_deltas,
+    sketch_rows,
+)
+from app.models.ticket_rollup import (
+    KEY_COLUMNS,
+    RollupKey,
+    RollupState,
+    TicketRollup,
+    add_rollup_contributions,
+    apply_rollup_deltas,
+)
+from app.schemas.analytics import LatencyPercentiles, LatencyPercentilesResponse, TimeseriesPoint, TimeseriesResponse
+
+# Пачка id для IN (...): у SQLite ограничено число параметров запроса
+ID_CHUNK = 500
+REBUILD_INSERT_CHUNK = 5000
+# Максимальная длина запрашиваемого ряда
+MAX_RANGE = {"day": timedelta(days=366), "hour": timedelta(days=31)}
+DEFAULT_RANGE = {"day": timedelta(days=30), "hour": timedelta(hours=48)}
+GROUP_COLUMNS = {
+    "channel": TicketRollup.channel,
+    "department": Department.code,
+    "priority": TicketRollup.priority,
+    "request_type": TicketRollup.request_type,
+    "status": TicketRollup.status,
+}
+SKETCH_GROUP_COLUMNS = {
+    "channel": TicketLatencySketch.channel,
+    "department": Department.code,
+    "priority": TicketLatencySketch.priority,
+}
+SKETCH_MAX_RANGE = timedelta(days=366)
+SKETCH_DEFAULT_RANGE = timedelta(days=30)
+
+
+def ticket_rollup_states(db: Session, ticket_ids: List[int]) -> Dict[int, RollupState]:
+    columns = [Ticket.id] + [getattr(Ticket, name) for name in ROLLUP_ATTRIBUTES]
+    states: Dict[int, RollupState] = {}
+    for start in range(0, len(ticket_ids), ID_CHUNK):
+        chunk = ticket_ids[start : start + ID_CHUNK]
+        for ticket_id, *values in db.execute(select(*columns).where(Ticket.id.in_(chunk))):
+            states[ticket_id] = rollup_state(*values)
+    return states
+
+
+def apply_rollup_changes(db: Session, old: Dict[int, RollupState], new: Dict[int, RollupState]) -> None:
+    """Переносит вклад тикетов в rollup и скетчи после изменения в обход ORM (set‑based UPDATE, Core INSERT)."""
+
+    totals: Dict[RollupKey, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    sketches: Dict[SketchKey, int] = defaultdict(int)
+    for ticket_id in old.keys() | new.keys():
+        if old.get(ticket_id) == new.get(ticket_id):
+            continue
+        if ticket_id in old:
+            add_rollup_contributions(totals, old[ticket_id], -1)
+            add_sketch_contributions(sketches, old[ticket_id], -1)
+        if ticket_id in new:
+            add_rollup_contributions(totals, new[ticket_id], 1)
+            add_sketch_contributions(sketches, new[ticket_id], 1)
+    apply_rollup_deltas(db.connection(), {key: values for key, values in totals.items() if any(values)})
+    apply_sketch_deltas(db.connection(), {key: count for key, count in sketches.items() if count})
+
+
+def add_inserted_tickets(db: Session, ticket_rows: List[dict]) -> None:
+    """Учитывает в rollup и скетчах тикеты, вставленные Core INSERT/COPY (словари значений колонок)."""
+
+    totals: Dict[RollupKey, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    sketches: Dict[SketchKey, int] = defaultdict(int)
+    for values in ticket_rows:
+        state = rollup_state(*(values.get(name) for name in ROLLUP_ATTRIBUTES))
+        add_rollup_contributions(totals, state, 1)
+        add_sketch_contributions(sketches, state, 1)
+    apply_rollup_deltas(db.connection(), totals)
+    apply_sketch_deltas(db.connection(), sketches)
+
+
+def rollups_missing(db: Session) -> bool:
+    """Тикеты есть, а rollup или скетчи пусты — например, первый запуск после обновления."""
+
+    if db.execute(select(Ticket.id).limit(1)).first() is None:
+        return False
+    return any(db.execute(select(model.id).limit(1)).first() is None for model in (TicketRollup, TicketLatencySketch))
+
+
+def rebuild_rollups(db: Session) -> tuple[int, int]:
+    """Пересобирает ticket_rollups и ticket_latency_sketches с нуля по tickets и tickets_archive.
+
+    Возвращает число строк rollup и скетчей. Выполняется одной транзакцией; на
+    Postgres лучше запускать в тихое время, иначе тикеты, созданные во время
+    пересборки, могут учесться дважды.
+    """
+
+    totals: Dict[RollupKey, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    sketches: Dict[SketchKey, int] = defaultdict(int)
+    for model in (Ticket, ArchivedTicket):
+        columns = [getattr(model, name) for name in ROLLUP_ATTRIBUTES]
+        for values in db.execute(select(*columns).execution_options(yield_per=REBUILD_INSERT_CHUNK)):
+            state = rollup_state(*values)
+            add_rollup_contributions(totals, state, 1)
+            add_sketch_contributions(sketches, state, 1)
+
+    rows = [
+        dict(zip(KEY_COLUMNS, key), created=created, closed=closed, resolution_seconds=seconds)
+        for key, (created, closed, seconds) in totals.items()
+    ]
+    db.execute(delete(TicketRollup))
+    for start in range(0, len(rows), REBUILD_INSERT_CHUNK):
+        db.execute(insert(TicketRollup), rows[start : start + REBUILD_INSERT_CHUNK])
+    sketch_values = sketch_rows(sketches)
+    db.execute(delete(TicketLatencySketch))
+    for start in range(0, len(sketch_values), REBUILD_INSERT_CHUNK):
+        db.execute(insert(TicketLatencySketch), sketch_values[start : start + REBUILD_INSERT_CHUNK])
+    db.commit()
+    return len(rows), len(sketch_values)
+
+
+def get_timeseries(
+    db: Session,
+    granularity: str = "day",
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    group_by: str | None = None,
+    channel: str | None = None,
+    department_code: str | None = None,
+    priority: str | None = None,
+    request_type: str | None = None,
+    status: str | None = None,
+) -> TimeseriesResponse:
+    """Ряд по интервалам [date_from, date_to) из ticket_rollups.
+
+    Читаются только строки нужного диапазона (по ключу granularity, bucket_start),
+    поэтому время не зависит от объёма истории. Пустые интервалы не возвращаются.
+    """
+
+    date_to = date_to or datetime.utcnow()
+    date_from = date_from or date_to - DEFAULT_RANGE[granularity]
+    if date_to - date_from > MAX_RANGE[granularity]:
+        raise ValueError(f"range for granularity={granularity} must not exceed {MAX_RANGE[granularity].days} days")
+
+    group_column = GROUP_COLUMNS[group_by] if group_by else None
+    columns = [
+        TicketRollup.bucket_start,
+        func.sum(TicketRollup.created).label("created"),
+        func.sum(TicketRollup.closed).label("closed"),
+        func.sum(
+            case((TicketRollup.status == TicketStatus.AUTO_CLOSED.value, TicketRollup.closed), else_=0)
+        ).label("auto_closed"),
+        func.sum(TicketRollup.resolution_seconds).label("resolution_seconds"),
+    ]
+    if group_column is not None:
+        columns.append(group_column.label("group"))
+
+    stmt = select(*columns).where(
+        TicketRollup.granularity == granularity,
+        TicketRollup.bucket_start >= date_from,
+        TicketRollup.bucket_start < date_to,
+    )
+    if group_by == "department" or department_code:
+        stmt = stmt.outerjoin(Department, Department.id == TicketRollup.department_id)
+    if department_code:
+        stmt = stmt.where(Department.code == department_code)
+    if channel:
+        stmt = stmt.where(TicketRollup.channel == channel)
+    if priority:
+        stmt = stmt.where(TicketRollup.priority == priority)
+    if request_type:
+        stmt = stmt.where(TicketRollup.request_type == request_type)
+    if status:
+        stmt = stmt.where(TicketRollup.status == status)
+
+    group_keys = [TicketRollup.bucket_start] + ([group_column] if group_column is not None else [])
+    stmt = stmt.group_by(*group_keys).order_by(*group_keys)
+
+    points = []
+    for row in db.execute(stmt):
+        created, closed = int(row.created or 0), int(row.closed or 0)
+        if not (created or closed):
+            # Строки, обнулённые после переноса вклада тикетов в другой ключ
+            continue
+        points.append(
+            TimeseriesPoint(
+                bucket_start=row.bucket_start,
+                group=(row.group or None) if group_column is not None else None,
+                created=created,
+                closed=closed,
+                auto_closed=int(row.auto_closed or 0),
+                avg_resolution_minutes=(row.resolution_seconds / 60.0 / closed) if closed else None,
+            )
+        )
+    return TimeseriesResponse(
+        granularity=granularity,
+        date_from=date_from,
+        date_to=date_to,
+        group_by=group_by,
+        points=points,
+    )
+
+
+async def get_timeseries_async(db: AsyncSession, **params) -> TimeseriesResponse:
+    return await db.run_sync(lambda session: get_timeseries(session, **params))
+
+
+def get_latency_percentiles(
+    db: Session,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    group_by: str | None = None,
+    channel: str | None = None,
+    department_code: str | None = None,
+    priority: str | None = None,
+) -> LatencyPercentilesResponse:
+    """p50/p90/p99 времени первого ответа и решения за дни, пересекающиеся с [date_from, date_to).
+
+    Дневные скетчи из ticket_latency_sketches сливаются сложением счётчиков корзин:
+    читается не больше «дни × разрезы × корзины» строк, независимо от числа тикетов.
+    Погрешность квантилей — app.core.quantile_sketch.RELATIVE_ACCURACY.
+    """
+
+    date_to = date_to or datetime.utcnow()
+    date_from = date_from or date_to - SKETCH_DEFAULT_RANGE
+    if date_to - date_from > SKETCH_MAX_RANGE:
+        raise ValueError(f"range must not exceed {SKETCH_MAX_RANGE.days} days")
+
+    group_column = SKETCH_GROUP_COLUMNS[group_by] if group_by else None
+    columns = [TicketLatencySketch.metric, TicketLatencySketch.bucket, func.sum(TicketLatencySketch.count).label("count")]
+    if group_column is not None:
+        columns.append(group_column.label("group"))
+
+    stmt = select(*columns).where(
+        TicketLatencySketch.day >= date_from.date(),
+        # День, в который попадает конец интервала (не включительно), тоже учитывается
+        TicketLatencySketch.day <= (date_to - timedelta(microseconds=1)).date(),
+    )
+    if group_by == "department" or department_code:
+        stmt = stmt.outerjoin(Department, Department.id == TicketLatencySketch.department_id)
+    if department_code:
+        stmt = stmt.where(Department.code == department_code)
+    if channel:
+        stmt = stmt.where(TicketLatencySketch.channel == channel)
+    if priority:
+        stmt = stmt.where(TicketLatencySketch.priority == priority)
+    group_keys = [TicketLatencySketch.metric, TicketLatencySketch.bucket]
+    if group_column is not None:
+        group_keys.append(group_column)
+    stmt = stmt.group_by(*group_keys)
+
+    merged: Dict[tuple, Dict[int, int]] = defaultdict(dict)
+    for row in db.execute(stmt):
+        if row.count:
+            group = (row.group or None) if group_column is not None else None
+            merged[(group, row.metric)][row.bucket] = int(row.count)
+
+    items = []
+    for (group, metric), sketch in sorted(merged.items(), key=lambda item: (item[0][0] or "", item[0][1])):
+        count = sum(sketch.values())
+        if count <= 0:
+            continue
+        p50, p90, p99 = (quantile(sketch, q) / 60.0 for q in (0.5, 0.9, 0.99))
+        items.append(
+            LatencyPercentiles(
+                group=group,
+                metric=metric,
+                count=count,
+                p50_minutes=round(p50, 2),
+                p90_minutes=round(p90, 2),
+                p99_minutes=round(p99, 2),
+            )
+        )
+    return LatencyPercentilesResponse(date_from=date_from, date_to=date_to, group_by=group_by, items=items)
+
+
+async def get_latency_percentiles_async(db: AsyncSession, **params) -> LatencyPercentilesResponse:
+    return await db.run_sync(lambda session: get_latency_percentiles(session, **params))
@@ -1,65 +1,87 @@
 from datetime import datetime
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.ai.classifier import classify_text
-from app.ai.answer_generator import generate_answer
-from app.models.department import Department
+from app.ai.classifier import classify_text, classify_text_async
+from app.ai.answer_generator import generate_answer, generate_answer_async
+from app.db.write_coordinator import execute_write, execute_write_async
+from app.models.job import JobKind
 from app.models.message import AuthorType, Message
 from app.models.model_log import ModelLog
 from app.models.ticket import Ticket, TicketStatus
+from app.schemas.ai import ClassificationResult
 from app.schemas.ticket import ExternalTicketCreate, TicketCreate
-from app.services.faq_service import get_best_match
+from app.services.classification_stats_service import record_classification
+from app.services.department_registry import get_department_id
+from app.services.faq_service import get_best_match, get_best_match_async
+from app.services.job_queue import enqueue_job
 
 
 AUTO_CLOSE_CONFIDENCE_THRESHOLD = 0.8
 
+# Готовый ответ для авто‑закрытия: (текст, язык)
+AutoCloseAnswer = tuple[str, str]
 
-def _get_or_create_department(db: Session, code: str) -> Department:
-    department = db.query(Department).filter(Department.code == code).first()
-    if department:
-        return department
 
-    department = Department(code=code, name=code)
-    db.add(department)
-    db.commit()
-    db.refresh(department)
-    return department
+def _classification_text(subject: str, body: str) -> str:
+    return f"{subject}\n\n{body}"
 
 
-def process_new_ticket(db: Session, data: TicketCreate) -> Ticket:
-    """Создание тикета с автоматической классификацией и возможным авто‑закрытием."""
-
-    text = f"{data.subject}\n\n{data.description}"
-    classification = classify_text(text, request_type=data.request_type)
-
+def _apply_keyword_overrides(text: str, classification: ClassificationResult) -> ClassificationResult:
     # Небольшая коррекция категории по ключевым словам,
     # чтобы, например, запросы про телевидение не попадали в интернет-шаблоны.
     lower_text = text.lower()
     if any(kw in lower_text for kw in ("телевиден", "тв ", "iptv", "tv ", "телеканал", "канал ")):
         if "интернет" not in lower_text:
             classification.category_code = "CONNECTION_TV"
+    return classification
 
-    department = _get_or_create_department(db, classification.department_code)
 
-    now = datetime.utcnow()
-    ticket = Ticket(
+def _is_auto_closable(classification: ClassificationResult) -> bool:
+    return classification.auto_resolvable and classification.confidence >= AUTO_CLOSE_CONFIDENCE_THRESHOLD
+
+
+def _log_classification(
+    db: Session, ticket_id: int, text: str, classification: ClassificationResult, request_type: str | None
+) -> None:
+    log = ModelLog(
+        ticket_id=ticket_id,
+        model_name="deepseek",
+        input_type="classification",
+        request_payload=text,
+        response_payload=classification.json(),
+        confidence=classification.confidence,
+        category_code=classification.category_code,
+        department_code=classification.department_code,
+        priority=classification.priority,
+        language=classification.language,
+        auto_resolvable=classification.auto_resolvable,
+        latency_ms=classification.latency_ms,
+        was_corrected=0,
+    )
+    db.add(log)
+    record_classification(db, log, classification, request_type)
+
+
+def _new_ticket(data: TicketCreate, **fields) -> Ticket:
+    return Ticket(
         subject=data.subject,
         description=data.description,
         channel=data.channel,
-        language=classification.language or data.language,
         customer_email=data.customer_email,
         customer_username=data.customer_username,
         external_user_id=data.external_user_id,
         request_type=data.request_type,
-        category_code=classification.category_code,
-        priority=classification.priority,
         status=TicketStatus.NEW.value,
-        department_id=department.id,
         auto_closed_by_ai=False,
         ai_disabled=False,
-        status_updated_at=now,
+        status_updated_at=datetime.utcnow(),
+        **fields,
     )
+
+
+def _add_ticket_with_first_message(db: Session, ticket: Ticket, data: TicketCreate) -> Ticket:
     db.add(ticket)
     db.flush()
 
@@ -71,60 +93,228 @@ def process_new_ticket(db: Session, data: TicketCreate) -> Ticket:
         language=data.language,
     )
     db.add(message)
+    return ticket
+
+
+def _create_classified_ticket(
+    db: Session,
+    data: TicketCreate,
+    text: str,
+    classification: ClassificationResult,
+) -> Ticket:
+    """Создаёт тикет, первое сообщение клиента и лог классификации (без commit)."""
+
+    ticket = _new_ticket(
+        data,
+        language=classification.language or data.language,
+        category_code=classification.category_code,
+        priority=classification.priority,
+        department_id=get_department_id(db, classification.department_code),
+    )
+    _add_ticket_with_first_message(db, ticket, data)
 
     # Логируем запрос к модели
-    db.add(
-        ModelLog(
-            ticket_id=ticket.id,
-            model_name="deepseek",
-            input_type="classification",
-            request_payload=text,
-            response_payload=classification.json(),
-            confidence=classification.confidence,
-            was_corrected=0,
-        )
+    _log_classification(db, ticket.id, text, classification, data.request_type)
+    return ticket
+
+
+def _auto_close_answer(
+    db: Session,
+    text: str,
+    classification: ClassificationResult,
+    request_type: str | None,
+) -> AutoCloseAnswer:
+    """Ответ для авто‑закрытия: шаблон FAQ, а если его нет — ответ модели."""
+
+    faq = get_best_match(
+        db,
+        classification.category_code,
+        classification.language,
+        request_type=request_type,
+    )
+    if faq:
+        # Если есть подходящий шаблон, используем его напрямую
+        return faq.answer, faq.language
+
+    suggestion = generate_answer(
+        text,
+        language=classification.language,
+        faq_snippet=None,
+        request_type=request_type,
     )
+    return suggestion.answer, suggestion.answer_language
+
+
+def _auto_close_ticket(ticket: Ticket, answer_text: str, answer_lang: str) -> Message:
+    """Переводит тикет в auto_closed и возвращает AI‑сообщение с ответом."""
+
+    now = datetime.utcnow()
+    ticket.status = TicketStatus.AUTO_CLOSED.value
+    ticket.auto_closed_by_ai = True
+    ticket.closed_at = now
+    ticket.status_updated_at = now
+    return Message(
+        ticket_id=ticket.id,
+        author_type=AuthorType.AI.value,
+        body=answer_text,
+        language=answer_lang,
+    )
+
+
+async def _auto_close_answer_async(
+    db: AsyncSession,
+    text: str,
+    classification: ClassificationResult,
+    request_type: str | None,
+) -> AutoCloseAnswer:
+    faq = await get_best_match_async(
+        db,
+        classification.category_code,
+        classification.language,
+        request_type=request_type,
+    )
+    if faq:
+        return faq.answer, faq.language
+
+    suggestion = await generate_answer_async(
+        text,
+        language=classification.language,
+        faq_snippet=None,
+        request_type=request_type,
+    )
+    return suggestion.answer, suggestion.answer_language
+
+
+def _persist_new_ticket(
+    db: Session,
+    data: TicketCreate,
+    text: str,
+    classification: ClassificationResult,
+    answer: AutoCloseAnswer | None,
+) -> int:
+    """Единица записи: тикет, первое сообщение, лог и, при наличии ответа, авто‑закрытие."""
+
+    ticket = _create_classified_ticket(db, data, text, classification)
+    if answer is not None:
+        db.add(_auto_close_ticket(ticket, *answer))
+    return ticket.id
+
+
+def process_new_ticket(db: Session, data: TicketCreate) -> Ticket:
+    """Создание тикета с автоматической классификацией и возможным авто‑закрытием.
+
+    Вызовы модели выполняются до записи, чтобы не держать транзакцию
+    (и очередь писателя) на время ответа модели.
+    """
+
+    text = _classification_text(data.subject, data.description)
+    classification = _apply_keyword_overrides(text, classify_text(text, request_type=data.request_type))
 
     # Попытка авто‑закрытия
-    if classification.auto_resolvable and classification.confidence >= AUTO_CLOSE_CONFIDENCE_THRESHOLD:
-        faq = get_best_match(
-            db,
-            classification.category_code,
-            classification.language,
-            request_type=data.request_type,
-        )
-        if faq:
-            # Если есть подходящий шаблон, используем его напрямую
-            answer_text = faq.answer
-            answer_lang = faq.language
-        else:
-            faq_snippet = None
-            suggestion = generate_answer(
-                text,
-                language=classification.language,
-                faq_snippet=faq_snippet,
-                request_type=data.request_type,
-            )
-            answer_text = suggestion.answer
-            answer_lang = suggestion.answer_language
+    answer = None
+    if _is_auto_closable(classification):
+        answer = _auto_close_answer(db, text, classification, data.request_type)
 
-        ai_message = Message(
-            ticket_id=ticket.id,
-            author_type=AuthorType.AI.value,
-            body=answer_text,
-            language=answer_lang,
-        )
-        db.add(ai_message)
+    ticket_id = execute_write(db, lambda s: _persist_new_ticket(s, data, text, classification, answer))
+    return db.query(Ticket).get(ticket_id)
 
-        now = datetime.utcnow()
-        ticket.status = TicketStatus.AUTO_CLOSED.value
-        ticket.auto_closed_by_ai = True
-        ticket.closed_at = now
-        ticket.status_updated_at = now
 
-    db.commit()
-    db.refresh(ticket)
-    return ticket
+async def process_new_ticket_async(db: AsyncSession, data: TicketCreate) -> Ticket:
+    """Async-вариант process_new_ticket для API.
+
+    Вызовы модели не блокируют event loop, а работа с БД переиспользует
+    sync-хелперы через run_sync.
+    """
+
+    text = _classification_text(data.subject, data.description)
+    classification = _apply_keyword_overrides(
+        text, await classify_text_async(text, request_type=data.request_type)
+    )
+
+    answer = None
+    if _is_auto_closable(classification):
+        answer = await _auto_close_answer_async(db, text, classification, data.request_type)
+
+    ticket_id = await execute_write_async(
+        db, lambda s: _persist_new_ticket(s, data, text, classification, answer)
+    )
+    return await db.get(Ticket, ticket_id, populate_existing=True)
+
+
+def _persist_deferred_ticket(db: Session, data: TicketCreate) -> int:
+    ticket = _new_ticket(
+        data,
+        language=data.language,
+        category_code=None,
+        priority="P3",
+        department_id=None,
+    )
+    _add_ticket_with_first_message(db, ticket, data)
+    enqueue_job(db, JobKind.PROCESS_TICKET.value, ticket_id=ticket.id)
+    return ticket.id
+
+
+def create_deferred_ticket(db: Session, data: TicketCreate) -> Ticket:
+    """Сохраняет тикет без классификации и ставит AI‑обработку в очередь.
+
+    Тикет и задача создаются в одной транзакции, поэтому задача не потеряется,
+    даже если процесс API упадёт сразу после ответа клиенту.
+    """
+
+    ticket_id = execute_write(db, lambda s: _persist_deferred_ticket(s, data))
+    return db.query(Ticket).get(ticket_id)
+
+
+async def create_deferred_ticket_async(db: AsyncSession, data: TicketCreate) -> Ticket:
+    ticket_id = await execute_write_async(db, lambda s: _persist_deferred_ticket(s, data))
+    return await db.get(Ticket, ticket_id, populate_existing=True)
+
+
+def _apply_deferred_classification(
+    db: Session,
+    ticket_id: int,
+    text: str,
+    classification: ClassificationResult,
+    answer: AutoCloseAnswer | None,
+) -> int:
+    ticket: Ticket = db.query(Ticket).get(ticket_id)
+    ticket.language = classification.language or ticket.language
+    ticket.category_code = classification.category_code
+    ticket.priority = classification.priority
+    ticket.department_id = get_department_id(db, classification.department_code)
+    _log_classification(db, ticket.id, text, classification, ticket.request_type)
+
+    # Статус перепроверяем уже в транзакции записи
+    if answer is not None and ticket.status == TicketStatus.NEW.value and not ticket.ai_disabled:
+        db.add(_auto_close_ticket(ticket, *answer))
+    return ticket.id
+
+
+def process_deferred_ticket(db: Session, ticket_id: int) -> Ticket | None:
+    """AI‑обработка тикета, созданного через create_deferred_ticket (выполняет воркер очереди)."""
+
+    ticket: Ticket | None = db.query(Ticket).get(ticket_id)
+    if ticket is None:
+        return None
+
+    # Повторный запуск после сбоя воркера: классификация уже сохранена
+    if ticket.category_code is not None:
+        return ticket
+
+    text = _classification_text(ticket.subject, ticket.description)
+    classification = _apply_keyword_overrides(text, classify_text(text, request_type=ticket.request_type))
+
+    # Пока задача ждала в очереди, оператор мог взять тикет в работу или отключить ИИ
+    answer = None
+    if (
+        ticket.status == TicketStatus.NEW.value
+        and not ticket.ai_disabled
+        and _is_auto_closable(classification)
+    ):
+        answer = _auto_close_answer(db, text, classification, ticket.request_type)
+
+    execute_write(db, lambda s: _apply_deferred_classification(s, ticket_id, text, classification, answer))
+    return db.query(Ticket).get(ticket_id)
 
 
 def create_placeholder_telegram_ticket(
@@ -140,66 +330,60 @@ def create_placeholder_telegram_ticket(
     Описание и классификация появятся после первого сообщения пользователя.
     """
 
-    ticket = Ticket(
-        subject=subject,
-        description="",
-        channel="telegram",
-        language=language,
-        customer_email=None,
-        customer_username=username,
-        external_user_id=str(chat_id),
-        request_type=request_type,
-        category_code=None,
-        priority="P3",
-        status=TicketStatus.NEW.value,
-        department_id=None,
-        auto_closed_by_ai=False,
-        ai_disabled=False,
-        status_updated_at=datetime.utcnow(),
-    )
-    db.add(ticket)
-    db.commit()
-    db.refresh(ticket)
-    return ticket
+    def _persist(db: Session) -> int:
+        ticket = Ticket(
+            subject=subject,
+            description="",
+            channel="telegram",
+            language=language,
+            customer_email=None,
+            customer_username=username,
+            external_user_id=str(chat_id),
+            request_type=request_type,
+            category_code=None,
+            priority="P3",
+            status=TicketStatus.NEW.value,
+            department_id=None,
+            auto_closed_by_ai=False,
+            ai_disabled=False,
+            status_updated_at=datetime.utcnow(),
+        )
+        db.add(ticket)
+        db.flush()
+        return ticket.id
 
+    ticket_id = execute_write(db, _persist)
+    return db.query(Ticket).get(ticket_id)
 
-def continue_telegram_ticket(
+
+def _apply_telegram_message(
     db: Session,
-    ticket: Ticket,
+    ticket_id: int,
     message_text: str,
     language: str,
-) -> Ticket:
-    """Обрабатывает новое сообщение пользователя в существующем Telegram‑тикете.
-
-    Выполняет классификацию, создаёт сообщение клиента, ищет FAQ и формирует
-    ответ от ИИ, но не закрывает тикет автоматически.
-    """
+    ticket_language: str,
+    text: str,
+    classification: ClassificationResult,
+    answer: AutoCloseAnswer | None,
+) -> int:
+    ticket: Ticket = db.query(Ticket).get(ticket_id)
 
     # Сообщение от клиента
-    msg = Message(
-        ticket_id=ticket.id,
-        author_type=AuthorType.CUSTOMER.value,
-        body=message_text,
-        language=language,
+    db.add(
+        Message(
+            ticket_id=ticket.id,
+            author_type=AuthorType.CUSTOMER.value,
+            body=message_text,
+            language=language,
+        )
     )
-    db.add(msg)
-
-    text = f"{ticket.subject}\n\n{message_text}"
-    classification = classify_text(text, request_type=ticket.request_type)
-
-    lower_text = text.lower()
-    if any(kw in lower_text for kw in ("телевиден", "тв ", "iptv", "tv ", "телеканал", "канал ")):
-        if "интернет" not in lower_text:
-            classification.category_code = "CONNECTION_TV"
 
     # Обновляем департамент и параметры тикета
-    department = _get_or_create_department(db, classification.department_code)
-
     ticket.description = message_text
-    ticket.language = language or classification.language or ticket.language or "ru"
+    ticket.language = ticket_language
     ticket.category_code = classification.category_code
     ticket.priority = classification.priority
-    ticket.department_id = department.id
+    ticket.department_id = get_department_id(db, classification.department_code)
 
     # Переводим тикет в работу только один раз, чтобы
     # корректно считать время в этом статусе.
@@ -208,65 +392,71 @@ def continue_telegram_ticket(
         ticket.status_updated_at = datetime.utcnow()
 
     # Логируем классификацию
-    db.add(
-        ModelLog(
-            ticket_id=ticket.id,
-            model_name="deepseek",
-            input_type="classification",
-            request_payload=text,
-            response_payload=classification.json(),
-            confidence=classification.confidence,
-            was_corrected=0,
+    _log_classification(db, ticket.id, text, classification, ticket.request_type)
+
+    if answer is not None:
+        answer_text, answer_lang = answer
+        db.add(
+            Message(
+                ticket_id=ticket.id,
+                author_type=AuthorType.AI.value,
+                body=answer_text,
+                language=answer_lang,
+            )
         )
-    )
+    return ticket.id
+
+
+def continue_telegram_ticket(
+    db: Session,
+    ticket: Ticket,
+    message_text: str,
+    language: str,
+) -> Ticket:
+    """Обрабатывает новое сообщение пользователя в существующем Telegram‑тикете.
+
+    Выполняет классификацию, создаёт сообщение клиента, ищет FAQ и формирует
+    ответ от ИИ, но не закрывает тикет автоматически.
+    """
+
+    ticket_id = ticket.id
+    text = _classification_text(ticket.subject, message_text)
+    classification = _apply_keyword_overrides(text, classify_text(text, request_type=ticket.request_type))
+    ticket_language = language or classification.language or ticket.language or "ru"
 
     # Если для тикета отключены авто‑ответы ИИ, не формируем AI‑сообщение
+    answer = None
     if not ticket.ai_disabled:
         # FAQ и ответ: сначала пробуем шаблон, затем ИИ
         faq = get_best_match(
             db,
             classification.category_code,
-            ticket.language,
+            ticket_language,
             request_type=ticket.request_type,
         )
 
         if faq:
-            answer_text = faq.answer
-            answer_lang = faq.language
+            answer = faq.answer, faq.language
         else:
-            faq_snippet = None
             suggestion = generate_answer(
                 text,
-                language=ticket.language,
-                faq_snippet=faq_snippet,
+                language=ticket_language,
+                faq_snippet=None,
                 request_type=ticket.request_type,
             )
-            answer_text = suggestion.answer
-            answer_lang = suggestion.answer_language
-
-        ai_message = Message(
-            ticket_id=ticket.id,
-            author_type=AuthorType.AI.value,
-            body=answer_text,
-            language=answer_lang,
-        )
-        db.add(ai_message)
-
-    db.commit()
-    db.refresh(ticket)
-    return ticket
+            answer = suggestion.answer, suggestion.answer_language
 
+    execute_write(
+        db,
+        lambda s: _apply_telegram_message(
+            s, ticket_id, message_text, language, ticket_language, text, classification, answer
+        ),
+    )
+    return db.query(Ticket).get(ticket_id)
 
-def create_ticket_from_external(db: Session, data: ExternalTicketCreate) -> Ticket:
-    """Создание тикета внешним источником (например, обработчиком почты).
-
-    Классификация и статусы уже определены внешней системой.
-    """
 
-    department_id = None
-    if data.department_code:
-        department = _get_or_create_department(db, data.department_code)
-        department_id = department.id
+def _persist_external_ticket(db: Session, data: ExternalTicketCreate) -> int:
+    department_id = get_department_id(db, data.department_code) if data.department_code else None
 
     now = datetime.utcnow()
     ticket = Ticket(
@@ -297,7 +487,19 @@ def create_ticket_from_external(db: Session, data: ExternalTicketCreate) -> Tick
         language=data.language,
     )
     db.add(message)
+    return ticket.id
 
-    db.commit()
-    db.refresh(ticket)
-    return ticket
+
+def create_ticket_from_external(db: Session, data: ExternalTicketCreate) -> Ticket:
+    """Создание тикета внешним источником (например, обработчиком почты).
+
+    Классификация и статусы уже определены внешней системой.
+    """
+
+    ticket_id = execute_write(db, lambda s: _persist_external_ticket(s, data))
+    return db.query(Ticket).get(ticket_id)
+
+
+async def create_ticket_from_external_async(db: AsyncSession, data: ExternalTicketCreate) -> Ticket:
+    ticket_id = await execute_write_async(db, lambda s: _persist_external_ticket(s, data))
+    return await db.get(Ticket, ticket_id, populate_existing=True)
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.sla import has_department_policies, sla_deadlines
+from app.models.department import Department
+from app.models.ticket import Ticket, TicketStatus
+
+OPEN_STATUSES = (TicketStatus.NEW.value, TicketStatus.IN_PROGRESS.value)
+BACKFILL_BATCH_SIZE = 1000
+# Пачка id для IN (...): у SQLite ограничено число параметров запроса
+ID_CHUNK = 500
+
+
+def at_risk_tickets_query(now: datetime, within_minutes: int, include_breached: bool = False) -> Select:
+    """Открытые тикеты, у которых срок SLA истекает в ближайшие N минут, по возрастанию срока."""
+
+    conditions = [Ticket.status.in_(OPEN_STATUSES), Ticket.sla_due_at < now + timedelta(minutes=within_minutes)]
+    if not include_breached:
+        conditions.append(Ticket.sla_due_at >= now)
+    return select(Ticket).where(*conditions).order_by(Ticket.sla_due_at.asc(), Ticket.id.asc())
+
+
+def _department_codes(db: Session) -> Dict[int, str]:
+    if not has_department_policies():
+        return {}
+    return {dep_id: code for dep_id, code in db.execute(select(Department.id, Department.code))}
+
+
+def _update_deadlines(db: Session, rows: Iterable[tuple], department_codes: Dict[int, str]) -> int:
+    values = []
+    for ticket_id, created_at, priority, department_id in rows:
+        first_response_due_at, sla_due_at = sla_deadlines(
+            created_at or datetime.utcnow(), priority, department_codes.get(department_id)
+        )
+        values.append({"_id": ticket_id, "_first": first_response_due_at, "_due": sla_due_at})
+    if values:
+        db.execute(
+            update(Ticket.__table__)
+            .where(Ticket.__table__.c.id == bindparam("_id"))
+            .values(first_response_due_at=bindparam("_first"), sla_due_at=bindparam("_due")),
+            values,
+        )
+    return len(values)
+
+
+def refresh_sla_deadlines(db: Session, ticket_ids: List[int]) -> int:
+    """Пересчитывает сроки SLA у тикетов (после set‑based смены приоритета). Без commit."""
+
+    department_codes = _department_codes(db)
+    total = 0
+    for start in range(0, len(ticket_ids), ID_CHUNK):
+        rows = db.execute(
+            select(Ticket.id, Ticket.created_at, Ticket.priority, Ticket.department_id).where(
+                Ticket.id.in_(ticket_ids[start : start + ID_CHUNK])
+            )
+        ).all()
+        total += _update_deadlines(db, rows, department_codes)
+    return total
+
+
+def backfill_sla_deadlines(db: Session, recompute_open: bool = False, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Проставляет сроки SLA тикетам без них (созданным до появления колонок).
+
+    recompute_open — пересчитать и все открытые тикеты, например после
+    изменения политик. Возвращает число обновлённых тикетов.
+    """
+
+    condition = Ticket.sla_due_at.is_(None)
+    if recompute_open:
+        condition = condition | Ticket.status.in_(OPEN_STATUSES)
+    department_codes = _department_codes(db)
+
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Ticket.id, Ticket.created_at, Ticket.priority, Ticket.department_id)
+            .where(condition, Ticket.id > last_id)
+            .order_by(Ticket.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        total += _update_deadlines(db, rows, department_codes)
+        db.commit()
+        last_id = rows[-1][0]
+    return total
@@ -0,0 +1,209 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import DateTime, Table, delete, exists, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.archive import ArchivedMessage, ArchivedTicket, TicketArchiveStats
+from app.models.idempotency_key import IdempotencyKey
+from app.models.job import Job, JobStatus
+from app.models.message import Message
+from app.models.model_log import ModelLog
+from app.models.ticket import Ticket, TicketStatus
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = (TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value)
+
+StatsKey = Tuple[str | None, str, str, bool, bool]
+
+
+def _copy_rows(db: Session, source: Table, target: Table, where, now: datetime) -> None:
+    """INSERT ... SELECT общих колонок source → target с archived_at (если есть) = now."""
+
+    names = [column.name for column in source.columns if column.name in target.columns]
+    columns = [source.c[name] for name in names]
+    if "archived_at" in target.columns:
+        names.append("archived_at")
+        columns.append(literal(now, DateTime))
+    db.execute(insert(target).from_select(names, select(*columns).where(where)))
+
+
+def _archive_conflict():
+    """Тикет, чей id или id одного из сообщений уже занят в архиве.
+
+    Такое остаётся от старых БД, где SQLite успел выдать id архивного тикета
+    заново. Переносить его нельзя (INSERT упадёт на первичном ключе).
+    """
+
+    return exists().where(ArchivedTicket.id == Ticket.id) | exists().where(
+        Message.ticket_id == Ticket.id, ArchivedMessage.id == Message.id
+    )
+
+
+def _id_keepers(db: Session) -> List[int]:
+    """Тикеты, которые держат максимальные tickets.id и messages.id.
+
+    Без AUTOINCREMENT SQLite выдаёт новой строке max(id) + 1: если удалить
+    строку с максимальным id, тот же id достанется новому тикету или сообщению
+    и столкнётся с архивом. Пока эти строки на месте, id только растут.
+    """
+
+    max_ticket_id = db.execute(select(func.max(Ticket.id))).scalar()
+    max_message_ticket_id = db.execute(
+        select(Message.ticket_id).where(Message.id == select(func.max(Message.id)).scalar_subquery())
+    ).scalar()
+    return [ticket_id for ticket_id in (max_ticket_id, max_message_ticket_id) if ticket_id is not None]
+
+
+def _archivable(cutoff: datetime, keepers: List[int]) -> list:
+    active_job = exists().where(
+        Job.ticket_id == Ticket.id,
+        Job.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]),
+    )
+    conditions = [
+        Ticket.status.in_(CLOSED_STATUSES),
+        Ticket.closed_at.isnot(None),
+        Ticket.closed_at < cutoff,
+        ~active_job,
+    ]
+    if keepers:
+        conditions.append(Ticket.id.notin_(keepers))
+    return conditions
+
+
+def _select_batch(db: Session, cutoff: datetime, batch_size: int, keepers: List[int]) -> List[int]:
+    rows = db.execute(
+        select(Ticket.id)
+        .where(*_archivable(cutoff, keepers), ~_archive_conflict())
+        .order_by(Ticket.id)
+        .limit(batch_size)
+    )
+    return [ticket_id for (ticket_id,) in rows]
+
+
+def _add_stats(db: Session, ticket_ids: List[int]) -> None:
+    rows = db.execute(
+        select(
+            Ticket.request_type,
+            Ticket.priority,
+            Ticket.status,
+            Ticket.auto_closed_by_ai,
+            Ticket.first_agent_response_at.isnot(None),
+            Ticket.created_at,
+            Ticket.closed_at,
+        ).where(Ticket.id.in_(ticket_ids))
+    )
+
+    totals: Dict[StatsKey, List[float]] = defaultdict(lambda: [0, 0.0, 0])
+    for request_type, priority, status, auto_closed, agent_involved, created_at, closed_at in rows:
+        key = (request_type, priority, status, bool(auto_closed), bool(agent_involved))
+        entry = totals[key]
+        entry[0] += 1
+        if status == TicketStatus.AUTO_CLOSED.value and created_at and closed_at and closed_at >= created_at:
+            entry[1] += (closed_at - created_at).total_seconds()
+            entry[2] += 1
+
+    for (request_type, priority, status, auto_closed, agent_involved), (count, seconds, samples) in totals.items():
+        stats = (
+            db.query(TicketArchiveStats)
+            .filter(
+                TicketArchiveStats.request_type.is_(None)
+                if request_type is None
+                else TicketArchiveStats.request_type == request_type,
+                TicketArchiveStats.priority == priority,
+                TicketArchiveStats.status == status,
+                TicketArchiveStats.auto_closed_by_ai.is_(auto_closed),
+                TicketArchiveStats.agent_involved.is_(agent_involved),
+            )
+            .first()
+        )
+        if stats is None:
+            stats = TicketArchiveStats(
+                request_type=request_type,
+                priority=priority,
+                status=status,
+                auto_closed_by_ai=auto_closed,
+                agent_involved=agent_involved,
+                tickets=0,
+                auto_close_seconds=0.0,
+                auto_close_samples=0,
+            )
+            db.add(stats)
+        stats.tickets += count
+        stats.auto_close_seconds += seconds
+        stats.auto_close_samples += samples
+    db.flush()
+
+
+def archive_batch(db: Session, ticket_ids: List[int]) -> None:
+    """Переносит тикеты с сообщениями в архивные таблицы одной транзакцией (без commit).
+
+    Ссылки на тикет из остальных таблиц: задачи очереди (к этому моменту только
+    завершённые) и ключи идемпотентности удаляются, у логов модели id тикета
+    переезжает в archived_ticket_id.
+    """
+
+    now = datetime.utcnow()
+    in_batch = Ticket.id.in_(ticket_ids)
+    _add_stats(db, ticket_ids)
+    _copy_rows(db, Ticket.__table__, ArchivedTicket.__table__, in_batch, now)
+    _copy_rows(db, Message.__table__, ArchivedMessage.__table__, Message.ticket_id.in_(ticket_ids), now)
+
+    db.execute(
+        update(ModelLog)
+        .where(ModelLog.ticket_id.in_(ticket_ids))
+        .values({ModelLog.archived_ticket_id: ModelLog.ticket_id, ModelLog.ticket_id: None})
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(delete(Job).where(Job.ticket_id.in_(ticket_ids)).execution_options(synchronize_session=False))
+    db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.ticket_id.in_(ticket_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        delete(Message).where(Message.ticket_id.in_(ticket_ids)).execution_options(synchronize_session=False)
+    )
+    db.execute(delete(Ticket).where(in_batch).execution_options(synchronize_session=False))
+
+
+def archive_closed_tickets(
+    db: Session,
+    older_than_days: int | None = None,
+    batch_size: int | None = None,
+) -> int:
+    """Архивирует тикеты, закрытые раньше чем N дней назад, пачками. Возвращает их число."""
+
+    settings = get_settings()
+    days = settings.ticket_archive_after_days if older_than_days is None else older_than_days
+    batch_size = batch_size or settings.ticket_archive_batch_size
+    # Меньше суток нельзя: closed_today в аналитике считается по горячей таблице
+    cutoff = datetime.utcnow() - timedelta(days=max(days, 1))
+
+    keepers = _id_keepers(db)
+    conflicts = [
+        ticket_id
+        for (ticket_id,) in db.execute(
+            select(Ticket.id).where(*_archivable(cutoff, keepers), _archive_conflict()).order_by(Ticket.id)
+        )
+    ]
+    if conflicts:
+        logger.warning(
+            "Skipping %s tickets whose ids are already taken in the archive: %s",
+            len(conflicts),
+            conflicts[:20],
+        )
+
+    total = 0
+    while True:
+        ticket_ids = _select_batch(db, cutoff, batch_size, keepers)
+        if not ticket_ids:
+            break
+        archive_batch(db, ticket_ids)
+        db.commit()
+        total += len(ticket_ids)
+    return total
@@ -0,0 +1,326 @@
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Update
+
+from app.db.write_coordinator import execute_write, execute_write_async
+from app.models.department import Department
+from app.models.message import AuthorType, Message
+from app.models.ticket import Ticket, TicketStatus
+from app.schemas.ticket import TicketBulkFilter, TicketBulkUpdate, TicketStatusUpdate
+from app.services.classification_stats_service import record_corrections
+from app.services.department_registry import get_department_id
+from app.services.rollup_service import apply_rollup_changes, ticket_rollup_states
+from app.services.sla_service import refresh_sla_deadlines
+
+SUPPORTED_STATUSES = {status.value for status in TicketStatus}
+CLOSED_STATUSES = {TicketStatus.CLOSED.value, TicketStatus.AUTO_CLOSED.value}
+
+
+def _filter_conditions(ticket_filter: TicketBulkFilter) -> list:
+    conditions = []
+    if ticket_filter.status:
+        conditions.append(Ticket.status == ticket_filter.status)
+    if ticket_filter.channel:
+        conditions.append(Ticket.channel == ticket_filter.channel)
+    if ticket_filter.priority:
+        conditions.append(Ticket.priority == ticket_filter.priority)
+    if ticket_filter.request_type:
+        conditions.append(Ticket.request_type == ticket_filter.request_type)
+    if ticket_filter.category_code:
+        conditions.append(Ticket.category_code == ticket_filter.category_code)
+    if ticket_filter.department_code:
+        conditions.append(
+            Ticket.department_id.in_(
+                select(Department.id).where(Department.code == ticket_filter.department_code)
+            )
+        )
+    if ticket_filter.created_from:
+        conditions.append(Ticket.created_at >= ticket_filter.created_from)
+    if ticket_filter.created_to:
+        conditions.append(Ticket.created_at < ticket_filter.created_to)
+    return conditions
+
+
+def build_bulk_update(data: TicketBulkUpdate, now: datetime) -> Update:
+    """Один set‑based UPDATE с той же семантикой, что и PUT /tickets/{id}/status.
+
+    - закрытие проставляет closed_at/status_updated_at (у уже закрытых тикетов
+      исходный closed_at сохраняется);
+    - перевод в открытый статус сбрасывает closed_at, а status_updated_at
+      меняется только у тикетов, чей статус действительно изменился;
+    - любой статус, кроме auto_closed, снимает признак auto_closed_by_ai.
+    """
+
+    if data.ids is not None:
+        where = Ticket.id.in_(data.ids)
+    else:
+        conditions = _filter_conditions(data.filter)
+        # Пустой and_() даёт UPDATE без WHERE — по всей таблице
+        if not conditions:
+            raise ValueError("bulk update filter produced no conditions")
+        where = and_(*conditions)
+
+    values: dict = {}
+    if data.status is not None:
+        values["status"] = data.status
+        if data.status in CLOSED_STATUSES:
+            values["closed_at"] = case(
+                (and_(Ticket.status.in_(CLOSED_STATUSES), Ticket.closed_at.isnot(None)), Ticket.closed_at),
+                else_=now,
+            )
+            values["status_updated_at"] = case(
+                (Ticket.status == data.status, Ticket.status_updated_at),
+                else_=now,
+            )
+        else:
+            values["closed_at"] = None
+            values["status_updated_at"] = case(
+                (Ticket.status != data.status, now),
+                else_=Ticket.status_updated_at,
+            )
+        if data.status != TicketStatus.AUTO_CLOSED.value:
+            values["auto_closed_by_ai"] = False
+    if data.priority is not None:
+        values["priority"] = data.priority
+    if data.request_type is not None:
+        values["request_type"] = data.request_type
+    if data.ai_disabled is not None:
+        values["ai_disabled"] = data.ai_disabled
+    values["updated_at"] = now
+
+    return update(Ticket).where(where).values(**values).execution_options(synchronize_session=False)
+
+
+def _run_bulk_update(db: Session, data: TicketBulkUpdate) -> int:
+    # Список тикетов фиксируем до UPDATE: фильтр может включать изменяемые поля,
+    # а для rollup нужны прежние значения
+    if data.ids is not None:
+        ticket_ids = list(data.ids)
+    else:
+        ticket_ids = list(db.execute(select(Ticket.id).where(and_(*_filter_conditions(data.filter)))).scalars())
+    old_states = ticket_rollup_states(db, ticket_ids)
+
+    updated = db.execute(build_bulk_update(data, datetime.utcnow())).rowcount
+    if data.priority is not None:
+        refresh_sla_deadlines(db, ticket_ids)
+    new_states = ticket_rollup_states(db, ticket_ids)
+    apply_rollup_changes(db, old_states, new_states)
+
+    corrections = []
+    for ticket_id, old in old_states.items():
+        new = new_states.get(ticket_id)
+        if new is None:
+            continue
+        if data.priority is not None:
+            corrections.append((ticket_id, "priority", old.priority, new.priority))
+        if data.request_type is not None:
+            corrections.append((ticket_id, "request_type", old.request_type, new.request_type))
+    record_corrections(db, corrections)
+    return updated
+
+
+def bulk_update_tickets(db: Session, data: TicketBulkUpdate) -> int:
+    return execute_write(db, lambda s: _run_bulk_update(s, data))
+
+
+async def bulk_update_tickets_async(db: AsyncSession, data: TicketBulkUpdate) -> int:
+    return await execute_write_async(db, lambda s: _run_bulk_update(s, data))
+
+
+def _persist_message(db: Session, ticket_id: int, author_type: str, body: str, language: str | None) -> int:
+    msg = Message(ticket_id=ticket_id, author_type=author_type, body=body, language=language)
+    db.add(msg)
+    db.flush()
+    return msg.id
+
+
+def add_ticket_message(db: Session, ticket_id: int, author_type: str, body: str, language: str | None) -> int:
+    """Добавляет сообщение в тикет (через координатор записи, если он включён). Возвращает id."""
+
+    return execute_write(db, lambda s: _persist_message(s, ticket_id, author_type, body, language))
+
+
+async def add_ticket_message_async(
+    db: AsyncSession, ticket_id: int, author_type: str, body: str, language: str | None
+) -> int:
+    return await execute_write_async(
+        db, lambda s: _persist_message(s, ticket_id, author_type, body, language)
+    )
+
+
+def apply_status_update(db: Session, ticket_id: int, data: TicketStatusUpdate) -> int:
+    """Единица записи для ручного изменения статуса/приоритета/типа тикета оператором."""
+
+    ticket: Ticket = db.query(Ticket).get(ticket_id)
+    old_status = ticket.status
+
+    ticket.status = data.status
+
+    if data.status in CLOSED_STATUSES:
+        now = datetime.utcnow()
+        ticket.closed_at = now
+        ticket.status_updated_at = now
+    else:
+        ticket.closed_at = None
+
+    # Ручное изменение — считаем, что это не авто‑закрытие
+    if data.status != TicketStatus.AUTO_CLOSED.value:
+        ticket.auto_closed_by_ai = False
+
+    # Если статус изменился (например, NEW → IN_PROGRESS), фиксируем момент смены
+    if data.status != old_status and data.status not in CLOSED_STATUSES:
+        ticket.status_updated_at = datetime.utcnow()
+
+    # Изменение меток оператором — исправление классификации (матрицы ошибок, калибровка)
+    corrections = []
+    if data.priority is not None:
+        corrections.append((ticket.id, "priority", ticket.priority, data.priority))
+        ticket.priority = data.priority
+
+    if data.request_type is not None:
+        corrections.append((ticket.id, "request_type", ticket.request_type, data.request_type))
+        ticket.request_type = data.request_type
+
+    if data.department_code is not None:
+        old_code = ticket.department.code if ticket.department else None
+        corrections.append((ticket.id, "department", old_code, data.department_code))
+        ticket.department_id = get_department_id(db, data.department_code)
+
+    if data.category_code is not None:
+        corrections.append((ticket.id, "category", ticket.category_code, data.category_code))
+        ticket.category_code = data.category_code
+
+    if data.ai_disabled is not None:
+        ticket.ai_disabled = data.ai_disabled
+    record_corrections(db, corrections)
+    return ticket.id
+
+
+def _after_message(model, cursor: int, descending: bool):
+    """Keyset‑условие «после сообщения cursor» в порядке (created_at, id)."""
+
+    cursor_ts = select(model.created_at).where(model.id == cursor).scalar_subquery()
+    if descending:
+        return or_(
+            model.created_at < cursor_ts,
+            and_(model.created_at == cursor_ts, model.id < cursor),
+        )
+    return or_(
+        model.created_at > cursor_ts,
+        and_(model.created_at == cursor_ts, model.id > cursor),
+    )
+
+
+async def list_ticket_messages_async(
+    db: AsyncSession,
+    ticket_id: int,
+    limit: int,
+    descending: bool = True,
+    cursor: int | None = None,
+    model=Message,
+) -> Tuple[List[Message], bool]:
+    """Страница сообщений тикета. Возвращает (сообщения, есть ли ещё).
+
+    model — Message или ArchivedMessage для тикетов из архива.
+    """
+
+    stmt = select(model).where(model.ticket_id == ticket_id)
+    if cursor is not None:
+        stmt = stmt.where(_after_message(model, cursor, descending))
+    if descending:
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        stmt = stmt.order_by(model.created_at.asc(), model.id.asc())
+
+    result = await db.execute(stmt.limit(limit + 1))
+    messages = list(result.scalars().all())
+    return messages[:limit], len(messages) > limit
+
+
+async def latest_ticket_messages_async(
+    db: AsyncSession, ticket_id: int, limit: int, model=Message
+) -> Tuple[List[Message], bool]:
+    """Последние limit сообщений тикета в хронологическом порядке."""
+
+    if limit <= 0:
+        has_any = await db.execute(select(model.id).where(model.ticket_id == ticket_id).limit(1))
+        return [], has_any.first() is not None
+    messages, has_more = await list_ticket_messages_async(db, ticket_id, limit, descending=True, model=model)
+    messages.reverse()
+    return messages, has_more
+
+
+def latest_ai_message(db: Session, ticket: Ticket) -> Message | None:
+    """AI‑ответ, если он последний в диалоге (например, только что создан при авто‑закрытии).
+
+    Решение принимается по last_message_author_type тикета; сообщение читается,
+    только когда ответ действительно есть.
+    """
+
+    if ticket.last_message_author_type != AuthorType.AI.value:
+        return None
+    return (
+        db.query(Message)
+        .filter(Message.ticket_id == ticket.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .first()
+    )
+
+
+def _conversation_state_subqueries() -> dict:
+    def _for_ticket(*columns):
+        return select(*columns).where(Message.ticket_id == Ticket.id)
+
+    return {
+        Ticket.message_count: _for_ticket(func.count(Message.id)).scalar_subquery(),
+        Ticket.last_message_at: _for_ticket(func.max(Message.created_at)).scalar_subquery(),
+        Ticket.last_message_author_type: _for_ticket(Message.author_type)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+        .scalar_subquery(),
+        Ticket.last_customer_message_at: _for_ticket(func.max(Message.created_at))
+        .where(Message.author_type == AuthorType.CUSTOMER.value)
+        .scalar_subquery(),
+        Ticket.first_agent_response_at: _for_ticket(func.min(Message.created_at))
+        .where(Message.author_type == AuthorType.AGENT.value)
+        .scalar_subquery(),
+    }
+
+
+def backfill_conversation_state(db: Session, recompute_all: bool = False, batch_size: int = 1000) -> int:
+    """Пересчитывает состояние диалога в tickets по таблице messages (set‑based, пачками по id).
+
+    По умолчанию — только тикеты с сообщениями, но без last_message_at (созданные
+    до появления колонок). Тикеты без сообщений (заготовки Telegram) пропускаются:
+    их состояние и так верное, а пересчёт не дал бы им last_message_at, и они
+    попадали бы в выборку при каждом запуске. recompute_all — все тикеты.
+    Возвращает число обработанных тикетов.
+    """
+
+    values = _conversation_state_subqueries()
+    total = 0
+    last_id = 0
+    while True:
+        stmt = select(Ticket.id).where(Ticket.id > last_id).order_by(Ticket.id).limit(batch_size)
+        if not recompute_all:
+            stmt = stmt.where(
+                Ticket.last_message_at.is_(None),
+                select(Message.id).where(Message.ticket_id == Ticket.id).exists(),
+            )
+        ids = list(db.execute(stmt).scalars())
+        if not ids:
+            break
+        db.execute(
+            update(Ticket)
+            .where(Ticket.id.in_(ids))
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += len(ids)
+        last_id = ids[-1]
+    return total
@@ -0,0 +1,116 @@
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.engine import log_engine_settings
+from app.db.session import SessionLocal, engine
+from app.models.job import Job, JobKind
+from app.services.department_registry import warm_department_cache
+from app.services.job_queue import claim_jobs, complete_job, fail_job
+from app.services.routing_service import process_deferred_ticket
+
+logger = logging.getLogger(__name__)
+
+
+def _handle_process_ticket(db: Session, job: Job) -> None:
+    process_deferred_ticket(db, job.ticket_id)
+
+
+JOB_HANDLERS: Dict[str, Callable[[Session, Job], None]] = {
+    JobKind.PROCESS_TICKET.value: _handle_process_ticket,
+}
+
+
+def run_job(db: Session, job: Job) -> None:
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        fail_job(db, job, f"Unknown job kind: {job.kind}")
+        return
+    try:
+        handler(db, job)
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+        db.rollback()
+        fail_job(db, job, repr(exc))
+        return
+    complete_job(db, job)
+
+
+def work_once(worker_id: str, batch_size: int = 1) -> int:
+    """Захватывает и выполняет одну пачку задач. Возвращает число обработанных задач."""
+
+    db = SessionLocal()
+    try:
+        jobs = claim_jobs(db, worker_id, limit=batch_size)
+        for job in jobs:
+            run_job(db, job)
+        return len(jobs)
+    finally:
+        db.close()
+
+
+def _worker_thread(worker_id: str, poll_interval: float, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            processed = work_once(worker_id)
+        except Exception:
+            logger.exception("Error while claiming jobs")
+            processed = 0
+        if not processed:
+            stop.wait(poll_interval)
+
+
+def main_loop(threads: int | None = None) -> None:
+    """Пул воркеров очереди задач.
+
+    Запуск (можно поднимать несколько процессов параллельно):
+        python -m app.workers.job_worker --threads 4
+    """
+
+    settings = get_settings()
+    threads = threads or settings.job_worker_threads
+
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        level=logging.INFO,
+    )
+    log_engine_settings("sync", engine)
+    with SessionLocal() as db:
+        warm_department_cache(db)
+    logger.info("Starting job worker with %s threads", threads)
+
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    pool = [
+        threading.Thread(
+            target=_worker_thread,
+            args=(f"{base_id}:{n}", settings.job_poll_interval_seconds, stop),
+            name=f"job-worker-{n}",
+            daemon=True,
+        )
+        for n in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in pool):
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        logger.info("Stopping job worker")
+        stop.set()
+        for thread in pool:
+            thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HelpDeskAI job worker")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    main_loop(threads=args.threads)
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { useParams } from "react-router-dom";
 import { apiGet, apiPost, apiPut } from "../api.js";
 
@@ -29,6 +29,8 @@ const REQUEST_TYPE_OPTIONS = [
 export default function TicketDetailsPage() {
   const { id } = useParams();
   const [ticket, setTicket] = useState(null);
+  // Актуальный тикет для интервала опроса (замыкание setInterval видит только первый рендер)
+  const ticketRef = useRef(null);
   const [loading, setLoading] = useState(true);
   const [reply, setReply] = useState("");
   const [sending, setSending] = useState(false);
@@ -44,6 +46,10 @@ export default function TicketDetailsPage() {
     loadReplySuggestions();
   }, [id]);
 
+  useEffect(() => {
+    ticketRef.current = ticket;
+  }, [ticket]);
+
   useEffect(() => {
     const intervalId = setInterval(() => {
       loadTicket({ silent: true });
@@ -56,8 +62,26 @@ export default function TicketDetailsPage() {
       setLoading(true);
     }
     try {
-      const data = await apiGet(`/tickets/${id}`);
-      setTicket(data);
+      const current = ticketRef.current;
+      if (silent && current && String(current.id) === String(id)) {
+        // При опросе берём только мета‑данные тикета и новые сообщения
+        const messages = current.messages || [];
+        const lastId = messages.length ? messages[messages.length - 1].id : null;
+        const [meta, page] = await Promise.all([
+          apiGet(`/tickets/${id}?messages_limit=0`),
+          lastId !== null
+            ? apiGet(`/tickets/${id}/messages?after_id=${lastId}&limit=500`)
+            : apiGet(`/tickets/${id}/messages?order=asc&limit=500`),
+        ]);
+        setTicket({
+          ...meta,
+          messages: [...messages, ...page.items],
+          has_more_messages: current.has_more_messages,
+        });
+      } else {
+        const data = await apiGet(`/tickets/${id}`);
+        setTicket(data);
+      }
     } catch (e) {
       console.error(e);
     } finally {